@@ -0,0 +1,51 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_media_objects"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "media_objects",
+        sa.Column("media_id", sa.String(), primary_key=True),
+        sa.Column(
+            "conversation_id",
+            sa.String(),
+            sa.ForeignKey("conversations.conversation_id"),
+            nullable=False,
+        ),
+        sa.Column("uploader_id", sa.String(), nullable=False, index=True),
+        sa.Column("object_key", sa.String(), nullable=False),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("content_type", sa.String(), nullable=False),
+        sa.Column("file_size", sa.BigInteger(), nullable=False),
+        sa.Column("sha256", sa.String(64), nullable=True),
+        sa.Column(
+            "status",
+            sa.Enum("pending", "ready", name="media_status"),
+            nullable=False,
+        ),
+        sa.Column("duration_ms", sa.Integer(), nullable=True),
+        sa.Column("waveform_data", sa.Text(), nullable=True),
+        sa.Column("tenant_id", sa.String(), index=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("upload_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+    )
+
+    op.create_index(
+        "idx_media_conv_created", "media_objects", ["conversation_id", "created_at"]
+    )
+    op.create_index(
+        "idx_media_status_created", "media_objects", ["status", "created_at"]
+    )
+
+
+def downgrade():
+    op.drop_index("idx_media_status_created", table_name="media_objects")
+    op.drop_index("idx_media_conv_created", table_name="media_objects")
+    op.drop_table("media_objects")
+    sa.Enum(name="media_status").drop(op.get_bind(), checkfirst=True)
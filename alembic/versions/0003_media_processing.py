@@ -0,0 +1,19 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_media_processing"
+down_revision = "0002_media_objects"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("media_objects", sa.Column("bitrate", sa.Integer(), nullable=True))
+    op.add_column(
+        "media_objects", sa.Column("processed_at", sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("media_objects", "processed_at")
+    op.drop_column("media_objects", "bitrate")
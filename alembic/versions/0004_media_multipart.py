@@ -0,0 +1,17 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_media_multipart"
+down_revision = "0003_media_processing"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("media_objects", sa.Column("upload_id", sa.String(), nullable=True))
+    op.add_column("media_objects", sa.Column("part_size", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("media_objects", "part_size")
+    op.drop_column("media_objects", "upload_id")
@@ -0,0 +1,33 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_media_blobs"
+down_revision = "0004_media_multipart"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "media_blobs",
+        sa.Column("sha256", sa.String(64), primary_key=True),
+        sa.Column("object_key", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("content_type", sa.String(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    with op.batch_alter_table("media_objects") as batch:
+        batch.add_column(sa.Column("blob_sha256", sa.String(64), nullable=True))
+        batch.create_foreign_key(
+            "fk_media_objects_blob", "media_blobs", ["blob_sha256"], ["sha256"]
+        )
+        batch.create_index("idx_media_blob_sha256", ["blob_sha256"])
+
+
+def downgrade():
+    with op.batch_alter_table("media_objects") as batch:
+        batch.drop_index("idx_media_blob_sha256")
+        batch.drop_constraint("fk_media_objects_blob", type_="foreignkey")
+        batch.drop_column("blob_sha256")
+    op.drop_table("media_blobs")
@@ -0,0 +1,20 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006_media_message_ref"
+down_revision = "0005_media_blobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 历史记录由 0009 按消息内容回填；回收时对 message_id 为空的记录仍按消息内容确认引用
+    op.add_column("media_objects", sa.Column("message_id", sa.String(), nullable=True))
+    op.create_index(
+        "idx_media_unreferenced", "media_objects", ["message_id", "created_at"]
+    )
+
+
+def downgrade():
+    op.drop_index("idx_media_unreferenced", table_name="media_objects")
+    op.drop_column("media_objects", "message_id")
@@ -0,0 +1,139 @@
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0007_call_tables"
+down_revision = "0006_media_message_ref"
+branch_labels = None
+depends_on = None
+
+_ACTIVE_CALL_WHERE = sa.text("status IN ('initiated', 'ringing', 'answered')")
+_OPEN_PARTICIPANT_WHERE = sa.text("leave_time IS NULL")
+
+
+# 离线模式（alembic upgrade --sql）无法检查数据库，按迁移顺序假定表和索引都不存在
+
+
+def _has_table(name: str) -> bool:
+    if context.is_offline_mode():
+        return False
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def _create_index(name: str, table: str, columns, **kw) -> None:
+    if not context.is_offline_mode():
+        existing = {i["name"] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+        if name in existing:
+            return
+    op.create_index(name, table, columns, **kw)
+
+
+def upgrade():
+    # 0001 未创建这三张表；开发环境可能已由 create_all 建表，此时只补充索引
+    if not _has_table("message_receipts"):
+        op.create_table(
+            "message_receipts",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column(
+                "message_id",
+                sa.String(),
+                sa.ForeignKey("im_messages.message_id"),
+                nullable=False,
+                index=True,
+            ),
+            sa.Column(
+                "conversation_id",
+                sa.String(),
+                sa.ForeignKey("conversations.conversation_id"),
+                nullable=False,
+                index=True,
+            ),
+            sa.Column("user_id", sa.String(), nullable=False, index=True),
+            sa.Column("delivered_at", sa.DateTime(), nullable=True),
+            sa.Column("read_at", sa.DateTime(), nullable=True),
+            sa.Column("tenant_id", sa.String(), nullable=True, index=True),
+            sa.UniqueConstraint("message_id", "user_id", name="uq_receipt_msg_user"),
+        )
+
+    if not _has_table("call_logs"):
+        op.create_table(
+            "call_logs",
+            sa.Column("call_id", sa.String(), primary_key=True),
+            sa.Column(
+                "conversation_id",
+                sa.String(),
+                sa.ForeignKey("conversations.conversation_id"),
+                nullable=False,
+                index=True,
+            ),
+            sa.Column("initiator_id", sa.String(), nullable=False, index=True),
+            sa.Column(
+                "status",
+                sa.Enum(
+                    "initiated",
+                    "ringing",
+                    "answered",
+                    "completed",
+                    "missed",
+                    "rejected",
+                    name="call_status_type",
+                ),
+                nullable=False,
+            ),
+            sa.Column("start_time", sa.DateTime(), nullable=True),
+            sa.Column("answer_time", sa.DateTime(), nullable=True),
+            sa.Column("end_time", sa.DateTime(), nullable=True),
+            sa.Column("duration_sec", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True, index=True),
+        )
+
+    if not _has_table("call_participants"):
+        op.create_table(
+            "call_participants",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column(
+                "call_id",
+                sa.String(),
+                sa.ForeignKey("call_logs.call_id"),
+                nullable=False,
+                index=True,
+            ),
+            sa.Column("user_id", sa.String(), nullable=False, index=True),
+            sa.Column("join_time", sa.DateTime(), nullable=True),
+            sa.Column("leave_time", sa.DateTime(), nullable=True),
+        )
+
+    # 通话历史按 (start_time, call_id) 倒序分页
+    _create_index(
+        "idx_calls_conv_start",
+        "call_logs",
+        ["conversation_id", "start_time", "call_id"],
+    )
+    # 同一会话最多一个活跃通话；已存在多个活跃通话的历史数据需先清理
+    _create_index(
+        "uq_calls_conv_active",
+        "call_logs",
+        ["conversation_id"],
+        unique=True,
+        postgresql_where=_ACTIVE_CALL_WHERE,
+        sqlite_where=_ACTIVE_CALL_WHERE,
+    )
+    _create_index(
+        "uq_call_participants_open",
+        "call_participants",
+        ["call_id", "user_id"],
+        unique=True,
+        postgresql_where=_OPEN_PARTICIPANT_WHERE,
+        sqlite_where=_OPEN_PARTICIPANT_WHERE,
+    )
+
+
+def downgrade():
+    op.drop_index("uq_call_participants_open", table_name="call_participants")
+    op.drop_index("uq_calls_conv_active", table_name="call_logs")
+    op.drop_index("idx_calls_conv_start", table_name="call_logs")
+    op.drop_table("call_participants")
+    op.drop_table("call_logs")
+    op.drop_table("message_receipts")
+    sa.Enum(name="call_status_type").drop(
+        op.get_bind(), checkfirst=not context.is_offline_mode()
+    )
@@ -0,0 +1,34 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008_call_counts"
+down_revision = "0007_call_tables"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("conversations") as batch:
+        batch.add_column(
+            sa.Column("call_count", sa.Integer(), nullable=False, server_default="0")
+        )
+    op.execute(
+        "UPDATE conversations SET call_count = ("
+        "SELECT COUNT(*) FROM call_logs"
+        " WHERE call_logs.conversation_id = conversations.conversation_id)"
+    )
+    # 通话历史游标按 (start_time, call_id) 编码，回填历史记录中缺失的 start_time 后设为非空
+    op.execute(
+        "UPDATE call_logs SET start_time = "
+        "COALESCE(created_at, answer_time, end_time, CURRENT_TIMESTAMP)"
+        " WHERE start_time IS NULL"
+    )
+    with op.batch_alter_table("call_logs") as batch:
+        batch.alter_column("start_time", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table("call_logs") as batch:
+        batch.alter_column("start_time", existing_type=sa.DateTime(), nullable=True)
+    with op.batch_alter_table("conversations") as batch:
+        batch.drop_column("call_count")
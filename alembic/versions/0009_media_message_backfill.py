@@ -0,0 +1,66 @@
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0009_media_message_backfill"
+down_revision = "0008_call_counts"
+branch_labels = None
+depends_on = None
+
+_messages = sa.table(
+    "im_messages",
+    sa.column("message_id", sa.String()),
+    sa.column("conversation_id", sa.String()),
+    sa.column("content", sa.JSON()),
+    sa.column("created_at", sa.DateTime()),
+)
+_media = sa.table(
+    "media_objects",
+    sa.column("media_id", sa.String()),
+    sa.column("conversation_id", sa.String()),
+    sa.column("message_id", sa.String()),
+)
+
+
+def upgrade():
+    # 回填 0006 之前的消息引用（按消息内容中的 media_id，取最早的消息），
+    # 孤立媒体回收不必再逐轮按消息内容确认这些记录
+    if context.is_offline_mode():
+        # --sql 生成脚本时无法读取消息内容，需在线执行 upgrade 完成回填
+        return
+    bind = op.get_bind()
+    pending = {
+        (row.conversation_id, row.media_id)
+        for row in bind.execute(
+            sa.select(_media.c.conversation_id, _media.c.media_id).where(
+                _media.c.message_id.is_(None)
+            )
+        )
+    }
+    if not pending:
+        return
+    found = {}
+    rows = bind.execution_options(stream_results=True).execute(
+        sa.select(
+            _messages.c.message_id, _messages.c.conversation_id, _messages.c.content
+        ).order_by(_messages.c.created_at)
+    )
+    for message_id, conversation_id, content in rows:
+        media_id = content.get("media_id") if isinstance(content, dict) else None
+        key = (conversation_id, media_id)
+        if key in pending and key not in found:
+            found[key] = message_id
+    for (conversation_id, media_id), message_id in found.items():
+        bind.execute(
+            _media.update()
+            .where(
+                _media.c.media_id == media_id,
+                _media.c.conversation_id == conversation_id,
+                _media.c.message_id.is_(None),
+            )
+            .values(message_id=message_id)
+        )
+
+
+def downgrade():
+    # 回填的引用与之后正常写入的无法区分，保留
+    pass
@@ -3,6 +3,9 @@
 提供通话控制、ICE配置等功能
 """
 
+from datetime import datetime
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from app.core.database import get_db
@@ -53,8 +56,7 @@ async def initiate_call(
 
         # 创建通话
         try:
-            call = CallManagementService.create_call(
-                db=db,
+            call = await CallManagementService.create_call(
                 conversation_id=conversation_id,
                 initiator_id=user_id,
                 call_type=call_request.get("type", "audio"),
@@ -63,7 +65,9 @@ async def initiate_call(
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
         # 获取ICE配置
-        ice_config = CallManagementService.get_ice_configuration(user_id)
+        ice_config = CallManagementService.get_ice_configuration(
+            user_id, call_request.get("region")
+        )
 
         return {
             "call_id": call.call_id,
@@ -85,6 +89,7 @@ async def initiate_call(
 async def accept_call(
     call_id: str,
     request: Request,
+    region: Optional[str] = None,
     db: Session = Depends(get_db),
 ):
     """接受通话"""
@@ -97,11 +102,7 @@ async def accept_call(
             )
 
         # 验证通话存在
-        call = (
-            db.query(im_model.CallLog)
-            .filter(im_model.CallLog.call_id == call_id)
-            .first()
-        )
+        call = await CallManagementService.get_call(call_id)
         if not call:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Call not found"
@@ -122,29 +123,22 @@ async def accept_call(
                 detail="Not a conversation member",
             )
 
-        # 加入通话
-        success = CallManagementService.join_call(db, call_id, user_id)
-        if not success:
+        # 加入通话（返回转换后的状态，无需再次查询）
+        updated_call = await CallManagementService.join_call(call_id, user_id)
+        if updated_call is None:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="Cannot join call in current state",
             )
 
         # 获取ICE配置
-        ice_config = CallManagementService.get_ice_configuration(user_id)
-
-        # 获取更新后的通话信息
-        updated_call = (
-            db.query(im_model.CallLog)
-            .filter(im_model.CallLog.call_id == call_id)
-            .first()
-        )
+        ice_config = CallManagementService.get_ice_configuration(user_id, region)
 
         return {
             "call_id": call_id,
             "status": updated_call.status,
             "ice_configuration": ice_config,
-            "participants": CallManagementService.get_call_participants(db, call_id),
+            "participants": updated_call.active_participants,
         }
 
     except HTTPException:
@@ -160,7 +154,6 @@ async def accept_call(
 async def reject_call(
     call_id: str,
     request: Request,
-    db: Session = Depends(get_db),
 ):
     """拒绝通话"""
     try:
@@ -172,8 +165,8 @@ async def reject_call(
             )
 
         # 更新通话状态
-        call = CallManagementService.update_call_status(
-            db, call_id, "rejected", user_id
+        call = await CallManagementService.update_call_status(
+            call_id, "rejected", user_id
         )
         if not call:
             raise HTTPException(
@@ -199,7 +192,6 @@ async def reject_call(
 async def hangup_call(
     call_id: str,
     request: Request,
-    db: Session = Depends(get_db),
 ):
     """挂断通话"""
     try:
@@ -211,24 +203,17 @@ async def hangup_call(
             )
 
         # 用户离开通话
-        success = CallManagementService.leave_call(db, call_id, user_id)
-        if not success:
+        call = await CallManagementService.leave_call(call_id, user_id)
+        if call is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not in call or call not found",
             )
 
-        # 获取更新后的通话状态
-        call = (
-            db.query(im_model.CallLog)
-            .filter(im_model.CallLog.call_id == call_id)
-            .first()
-        )
-
         return {
             "call_id": call_id,
-            "status": call.status if call else "completed",
-            "end_time": call.end_time.isoformat() if call and call.end_time else None,
+            "status": call.status,
+            "end_time": call.end_time.isoformat() if call.end_time else None,
         }
 
     except HTTPException:
@@ -255,11 +240,7 @@ async def get_call_status(
                 detail="Authentication required",
             )
 
-        call = (
-            db.query(im_model.CallLog)
-            .filter(im_model.CallLog.call_id == call_id)
-            .first()
-        )
+        call = await CallManagementService.get_call(call_id)
         if not call:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Call not found"
@@ -280,7 +261,7 @@ async def get_call_status(
                 detail="Not authorized to view this call",
             )
 
-        participants = CallManagementService.get_call_participants(db, call_id)
+        participants = call.active_participants
 
         return {
             "call_id": call.call_id,
@@ -308,10 +289,11 @@ async def get_call_history(
     conversation_id: str,
     request: Request,
     limit: int = 20,
+    cursor: Optional[str] = None,
     offset: int = 0,
     db: Session = Depends(get_db),
 ):
-    """获取会话通话历史"""
+    """获取会话通话历史（游标分页：传入上一页返回的 next_cursor）"""
     try:
         user_id = get_current_user_id_from_request(request)
         if not user_id:
@@ -335,9 +317,13 @@ async def get_call_history(
                 detail="Not a conversation member",
             )
 
-        calls = CallManagementService.get_call_history(
-            db, conversation_id, limit, offset
-        )
+        limit = max(1, min(limit, 100))
+        try:
+            calls, next_cursor = CallManagementService.get_call_history(
+                db, conversation_id, limit, cursor=cursor, offset=offset
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
         call_list = []
         for call in calls:
@@ -352,15 +338,31 @@ async def get_call_history(
                     ),
                     "end_time": call.end_time.isoformat() if call.end_time else None,
                     "duration_sec": call.duration_sec,
+                    "participants": [
+                        {
+                            "user_id": p.user_id,
+                            "join_time": (
+                                p.join_time.isoformat() if p.join_time else None
+                            ),
+                            "leave_time": (
+                                p.leave_time.isoformat() if p.leave_time else None
+                            ),
+                        }
+                        for p in sorted(
+                            call.participants,
+                            key=lambda p: p.join_time or datetime.min,
+                        )
+                    ],
                 }
             )
 
         return {
             "conversation_id": conversation_id,
             "calls": call_list,
-            "total": len(call_list),
+            "total": CallManagementService.get_call_count(db, conversation_id),
             "limit": limit,
             "offset": offset,
+            "next_cursor": next_cursor,
         }
 
     except HTTPException:
@@ -61,10 +61,13 @@ async def create_message(
         if req.type == "audio" and isinstance(req.content, dict):
             media_id = req.content.get("media_id")
             if media_id:
-                from app.core.media_storage import media_storage
+                from app.core.media_storage import async_media_storage
+                from app.services import media_service
 
-                # 验证媒体文件是否存在
-                metadata = media_storage.get_file_metadata(
+                # 验证媒体文件是否存在（元数据表中没有时回退到对象存储）
+                metadata = media_service.get_ready_media(
+                    db, media_id, req.conversation_id
+                ) or await async_media_storage.get_file_metadata(
                     media_id, req.conversation_id
                 )
                 if not metadata:
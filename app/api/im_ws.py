@@ -1,14 +1,24 @@
 from __future__ import annotations
 
 import asyncio
-import json
-
+import time
+from typing import Any, Dict, Optional, Tuple
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 from app.core.pubsub import pubsub
+from app.core.database import SessionLocal
+from app.core.events import run_sync
+from app.core.monitoring import WSMetrics
+from app.core.presence import presence
+from app.core.seq import next_seq
+from app.core.serialization import dumps_str
 from app.core.ws_auth import get_user_id_from_websocket
+from app.core.ws_codec import FrameCodec, FrameTooLarge, negotiate_codec
+from app.core.ws_dispatcher import DEFAULT_FRAME_KEY, FrameDispatcher
 from app.services import im_service
+from app.services.call_service import CallManagementService, WebRTCSignalingService
+from app.services.receipts_service import mark_delivered
 from app.models import im as im_model
 from app.core.config import settings
 
@@ -16,454 +26,469 @@ from app.core.config import settings
 router = APIRouter()
 
 
+class GatewayConnection:
+    """单个WebSocket连接的上下文：订阅、心跳与出站写队列"""
+
+    def __init__(self, websocket: WebSocket, user_id: str, codec: FrameCodec):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.codec = codec
+        self.subscriptions: Dict[str, asyncio.Queue] = {}
+        self.forwarders: Dict[str, asyncio.Task] = {}
+        self.last_pong = asyncio.get_event_loop().time()
+        # 所有出站帧经由单一写任务按序编码发送（deflate 压缩上下文要求严格有序）
+        self._outbound: asyncio.Queue = asyncio.Queue(
+            maxsize=settings.WS_OUTBOUND_QUEUE_SIZE
+        )
+        self._writer: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def send(
+        self, frame: Dict[str, Any], published_at: float | None = None
+    ) -> None:
+        await self._outbound.put((frame, published_at))
+        ws_metrics.outbound_enqueued()
+
+    async def _write_loop(self) -> None:
+        while True:
+            frame, published_at = await self._outbound.get()
+            ws_metrics.outbound_dequeued()
+            try:
+                await self.codec.send(self.websocket, frame)
+            except Exception:
+                # 连接已断开，停止写出，由接收循环负责清理
+                return
+            ws_metrics.frame_sent(frame.get("type"), published_at)
+
+    async def register_route(self, last_ping_ts: int = 0) -> None:
+        """在线路由登记/续期（Redis可用时）"""
+        try:
+            info = {
+                "instance_id": settings.INSTANCE_ID,
+                "platform": "ws",
+                "last_ping_ts": last_ping_ts,
+            }
+            if hasattr(pubsub, "set_connection"):
+                await pubsub.set_connection(self.user_id, dumps_str(info), ttl_sec=60)  # type: ignore
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        for task in self.forwarders.values():
+            task.cancel()
+        ws_metrics.unsubscribed(len(self.subscriptions))
+        try:
+            for chan, q in list(self.subscriptions.items()):
+                await pubsub.unsubscribe(chan, q)
+        except Exception:
+            pass
+        if self._writer is not None:
+            self._writer.cancel()
+        pending = self._outbound.qsize()
+        if pending:
+            ws_metrics.outbound_dequeued(pending)
+
+
+async def _forward(conn: GatewayConnection, channel: str, queue: asyncio.Queue):
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        published_at, payload = item
+        await conn.send(
+            {"type": "event", "channel": channel, "data": payload}, published_at
+        )
+
+
+def _is_member(conv_id: str, user_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        member = (
+            db.query(im_model.ConversationMember.user_id)
+            .filter(
+                im_model.ConversationMember.conversation_id == conv_id,
+                im_model.ConversationMember.user_id == user_id,
+            )
+            .first()
+        )
+        return member is not None
+    finally:
+        db.close()
+
+
+async def handle_subscribe(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    conv_id = data.get("conversation_id")
+    if not conv_id:
+        return
+    chan = f"im:conv:{conv_id}"
+    # 成员校验在线程池中执行，不阻塞同一 worker 上的其他连接
+    if not await run_sync(_is_member, conv_id, conn.user_id):
+        ws_metrics.subscribed(False)
+        await conn.send({"type": "error", "message": "forbidden"})
+        return
+    if chan in conn.subscriptions:
+        return
+    q = await pubsub.subscribe(chan)
+    conn.subscriptions[chan] = q
+    ws_metrics.subscribed(True)
+    conn.forwarders[chan] = asyncio.create_task(_forward(conn, chan, q))
+    await conn.send({"type": "subscribed", "conversation_id": conv_id})
+
+
+async def handle_unsubscribe(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    conv_id = data.get("conversation_id")
+    if not conv_id:
+        return
+    chan = f"im:conv:{conv_id}"
+    q = conn.subscriptions.pop(chan, None)
+    if q:
+        ws_metrics.unsubscribed()
+        await pubsub.unsubscribe(chan, q)
+    task = conn.forwarders.pop(chan, None)
+    if task:
+        task.cancel()
+    await conn.send({"type": "unsubscribed", "conversation_id": conv_id})
+
+
+async def handle_pong(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    conn.last_pong = asyncio.get_event_loop().time()
+    # 续期路由信息
+    await conn.register_route(int(conn.last_pong))
+
+
+def _store_message(
+    user_id: str, conv_id: str, data: Dict[str, Any], seq_value: int
+) -> Tuple[str, Optional[int]]:
+    """写入消息（带 client_msg_id 时幂等），返回 (message_id, seq)"""
+    db = SessionLocal()
+    try:
+        if data.get("client_msg_id"):
+            existing = (
+                db.query(im_model.IMMessage)
+                .filter(
+                    im_model.IMMessage.conversation_id == conv_id,
+                    im_model.IMMessage.sender_id == user_id,
+                    im_model.IMMessage.client_msg_id == data.get("client_msg_id"),
+                )
+                .first()
+            )
+            if existing:
+                return existing.message_id, existing.seq
+        req = im_model.MessageCreateRequest(
+            conversation_id=conv_id,
+            type=data.get("msg_type", "text"),
+            content=data.get("content"),
+            reply_to=data.get("reply_to"),
+            client_msg_id=data.get("client_msg_id"),
+            tenant_id=data.get("tenant_id"),
+        )
+        msg = im_service.create_message(db, req, sender_id=user_id, seq_value=seq_value)
+        return msg.message_id, msg.seq
+    finally:
+        db.close()
+
+
+def _store_stream_chunk(
+    user_id: str, conv_id: str, data: Dict[str, Any], seq_value: int
+) -> Tuple[str, Optional[int]]:
+    db = SessionLocal()
+    try:
+        msg = im_service.create_stream_chunk(
+            db,
+            conversation_id=conv_id,
+            sender_id=user_id,
+            content=str(data.get("chunk")),
+            client_msg_id=data.get("client_msg_id"),
+            stream_end=bool(data.get("stream_end", False)),
+            tenant_id=data.get("tenant_id"),
+            seq_value=seq_value,
+        )
+        return msg.message_id, msg.seq
+    finally:
+        db.close()
+
+
+def _mark_delivered(conv_id: str, message_id: str, user_id: str) -> None:
+    db = SessionLocal()
+    try:
+        # per-user delivered（校验成员在 service 内/或下层 API 负责）
+        mark_delivered(db, conv_id, message_id, user_id)
+    finally:
+        db.close()
+
+
+async def handle_send_msg(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    """支持 send_msg（直接通过 WS 发送并入库）"""
+    conv_id = data.get("conversation_id")
+    if not conv_id or not data.get("content"):
+        await conn.send({"type": "error", "message": "invalid payload"})
+        return
+    try:
+        # 先生成 seq（在事件循环中），入库在线程池中执行
+        seq_value = await next_seq(conv_id)
+        message_id, seq = await run_sync(
+            _store_message, conn.user_id, conv_id, data, seq_value
+        )
+        await conn.send(
+            {
+                "type": "ack",
+                "event": "message.sent",
+                "message_id": message_id,
+                "seq": seq,
+                "client_msg_id": data.get("client_msg_id"),
+            }
+        )
+    except Exception as e:
+        await conn.send({"type": "error", "message": str(e)})
+
+
+async def handle_stream_chunk(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    conv_id = data.get("conversation_id")
+    if not conv_id or data.get("chunk") is None:
+        await conn.send({"type": "error", "message": "invalid payload"})
+        return
+    try:
+        seq_value = await next_seq(conv_id)
+        message_id, seq = await run_sync(
+            _store_stream_chunk, conn.user_id, conv_id, data, seq_value
+        )
+        await conn.send(
+            {
+                "type": "ack",
+                "event": "stream.sent",
+                "message_id": message_id,
+                "seq": seq,
+                "client_msg_id": data.get("client_msg_id"),
+                "stream_end": bool(data.get("stream_end", False)),
+            }
+        )
+    except Exception as e:
+        await conn.send({"type": "error", "message": str(e)})
+
+
+async def handle_delivered(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    conv_id = data.get("conversation_id")
+    message_id = data.get("message_id")
+    if not conv_id or not message_id:
+        return
+    await run_sync(_mark_delivered, conv_id, message_id, conn.user_id)
+
+
+# WebRTC信令处理
+async def handle_call_initiate(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    to_user_id = data.get("to_user_id")
+    conv_id = data.get("conversation_id")
+    if not conv_id or not to_user_id:
+        return
+    try:
+        # 创建通话
+        call = await CallManagementService.create_call(
+            conversation_id=conv_id, initiator_id=conn.user_id
+        )
+
+        # 获取ICE配置
+        ice_config = CallManagementService.get_ice_configuration(
+            conn.user_id, data.get("region")
+        )
+
+        # 向发起者发送确认
+        await conn.send(
+            {
+                "type": "call.initiated",
+                "call_id": call.call_id,
+                "ice_configuration": ice_config,
+            }
+        )
+
+        # 向目标用户发送邀请
+        invite_data = {
+            "type": "call.incoming",
+            "call_id": call.call_id,
+            "from_user_id": conn.user_id,
+            "conversation_id": conv_id,
+            "ice_configuration": CallManagementService.get_ice_configuration(
+                to_user_id
+            ),
+        }
+        await pubsub.publish(f"im:conv:{conv_id}", invite_data)
+    except Exception as e:
+        await conn.send(
+            {"type": "error", "message": f"Failed to initiate call: {str(e)}"}
+        )
+
+
+async def handle_call_accept(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    call_id = data.get("call_id")
+    if not call_id:
+        return
+    try:
+        call = await CallManagementService.join_call(call_id, conn.user_id)
+        if call is not None:
+            # 向会话广播接听事件
+            accept_data = {
+                "type": "call.accepted",
+                "call_id": call_id,
+                "user_id": conn.user_id,
+                "conversation_id": call.conversation_id,
+            }
+            await pubsub.publish(
+                f"im:conv:{call.conversation_id}",
+                accept_data,
+            )
+        else:
+            await conn.send({"type": "error", "message": "Failed to accept call"})
+    except Exception as e:
+        await conn.send(
+            {"type": "error", "message": f"Failed to accept call: {str(e)}"}
+        )
+
+
+async def handle_call_hangup(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    call_id = data.get("call_id")
+    if not call_id:
+        return
+    try:
+        await CallManagementService.leave_call(call_id, conn.user_id)
+        # 广播事件会由service层处理
+    except Exception as e:
+        await conn.send(
+            {"type": "error", "message": f"Failed to hangup call: {str(e)}"}
+        )
+
+
+async def handle_webrtc_signal(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    call_id = data.get("call_id")
+    to_user_id = data.get("to_user_id")
+    payload = data.get("payload")
+    if not call_id or not to_user_id or not payload:
+        return
+    try:
+        # 验证信令格式
+        sanitized_payload = WebRTCSignalingService.sanitize_webrtc_signal(payload)
+        if not sanitized_payload:
+            await conn.send(
+                {"type": "error", "message": "Invalid WebRTC signal format"}
+            )
+            return
+        # 转发信令给目标用户
+        signal_data = {
+            "type": "call.webrtc.signal",
+            "call_id": call_id,
+            "from_user_id": conn.user_id,
+            "payload": sanitized_payload,
+        }
+
+        # 这里可以直接向特定用户发送，或通过会话频道广播
+        # 为简化实现，通过会话频道广播，客户端根据to_user_id过滤
+        call = await CallManagementService.get_call(call_id)
+        if call:
+            signal_data["to_user_id"] = to_user_id
+            await pubsub.publish(
+                f"im:conv:{call.conversation_id}",
+                signal_data,
+            )
+    except Exception as e:
+        await conn.send(
+            {"type": "error", "message": f"Failed to relay WebRTC signal: {str(e)}"}
+        )
+
+
+async def handle_invalid_type(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    """type 不是字符串（列表、对象等）的帧"""
+    await conn.send({"type": "error", "message": "unknown frame type"})
+
+
+async def handle_relay(conn: GatewayConnection, data: Dict[str, Any]) -> None:
+    """未登记的帧类型：按 conversation_id 原样转发到会话频道"""
+    conv_id = data.get("conversation_id")
+    if conv_id:
+        await pubsub.publish(f"im:conv:{conv_id}", data)
+
+
+FRAME_HANDLERS = {
+    "subscribe": handle_subscribe,
+    "unsubscribe": handle_unsubscribe,
+    "pong": handle_pong,
+    "send_msg": handle_send_msg,
+    "stream_chunk": handle_stream_chunk,
+    "delivered": handle_delivered,
+    "call.initiate": handle_call_initiate,
+    "call.accept": handle_call_accept,
+    "call.hangup": handle_call_hangup,
+    "call.webrtc.signal": handle_webrtc_signal,
+}
+# 心跳直接在读循环内处理，不受并发槽位影响
+INLINE_FRAME_TYPES = ("pong",)
+# 同一会话内按到达顺序串行处理
+ORDERED_FRAME_TYPES = ("subscribe", "unsubscribe", "send_msg", "stream_chunk")
+# 服务端下发的帧类型（用于预绑定发送计数）
+SENT_FRAME_TYPES = (
+    "event",
+    "ack",
+    "error",
+    "ping",
+    "subscribed",
+    "unsubscribed",
+    "call.initiated",
+)
+
+ws_metrics = WSMetrics(FRAME_HANDLERS.keys(), SENT_FRAME_TYPES, DEFAULT_FRAME_KEY)
+
+
 @router.websocket("/ws")
 async def im_gateway(websocket: WebSocket):
     # 最小鉴权：token -> user_id
     user_id = get_user_id_from_websocket(websocket)
     if not user_id:
+        ws_metrics.rejected(4401)
         await websocket.close(code=4401)
         return
-    await websocket.accept()
-    # 在线路由登记（Redis可用时）
-    try:
-        info = {
-            "instance_id": settings.INSTANCE_ID,
-            "platform": "ws",
-            "last_ping_ts": 0,
-        }
-        if hasattr(pubsub, "set_connection"):
-            await pubsub.set_connection(user_id, json.dumps(info), ttl_sec=60)  # type: ignore
-    except Exception:
-        pass
-    subscriptions: dict[str, asyncio.Queue] = {}
-    last_pong = asyncio.get_event_loop().time()
+    # 帧编码协商（?encoding=json|msgpack|deflate），结果通过响应头告知客户端
+    codec = negotiate_codec(websocket)
+    await websocket.accept(headers=[(b"x-aiim-encoding", codec.name.encode())])
+    conn = GatewayConnection(websocket, user_id, codec)
+    conn.start()
+    opened_at = time.monotonic()
+    close_code: int | None = None
+    ws_metrics.connection_opened()
+    presence.connected(user_id)
+    await conn.register_route()
+    dispatcher = FrameDispatcher(
+        FRAME_HANDLERS,
+        default_handler=handle_relay,
+        invalid_handler=handle_invalid_type,
+        inline_types=INLINE_FRAME_TYPES,
+        ordered_types=ORDERED_FRAME_TYPES,
+        max_inflight=settings.WS_MAX_INFLIGHT_FRAMES,
+        on_timing=ws_metrics.frame_handled,
+        on_received=ws_metrics.frame_received,
+    )
     try:
         while True:
             try:
-                msg = await asyncio.wait_for(websocket.receive_text(), timeout=20)
-                data = json.loads(msg)
+                data = await asyncio.wait_for(codec.receive(websocket), timeout=20)
             except asyncio.TimeoutError:
                 now = asyncio.get_event_loop().time()
-                if now - last_pong > 20:
-                    await websocket.send_text(json.dumps({"type": "ping"}))
+                if now - conn.last_pong > 20:
+                    await conn.send({"type": "ping"})
                 continue
+            except WebSocketDisconnect:
+                raise
+            except FrameTooLarge:
+                close_code = 1009
+                await websocket.close(code=close_code)
+                break
             except Exception:
                 continue
-
-            t = data.get("type")
-            if t == "subscribe":
-                conv_id = data.get("conversation_id")
-                if not conv_id:
-                    continue
-                chan = f"im:conv:{conv_id}"
-                # 成员校验（最小实现，非持久连接上下文中创建 session）
-                try:
-                    from app.core.database import SessionLocal
-
-                    db = SessionLocal()
-                    member = (
-                        db.query(im_model.ConversationMember)
-                        .filter(
-                            im_model.ConversationMember.conversation_id == conv_id,
-                            im_model.ConversationMember.user_id == user_id,
-                        )
-                        .first()
-                    )
-                    if not member:
-                        await websocket.send_text(
-                            json.dumps({"type": "error", "message": "forbidden"})
-                        )
-                        continue
-                finally:
-                    try:
-                        db.close()
-                    except Exception:
-                        pass
-                if chan in subscriptions:
-                    continue
-                q = await pubsub.subscribe(chan)
-
-                async def forwarder(channel: str, queue: asyncio.Queue):
-                    while True:
-                        payload = await queue.get()
-                        if payload is None:
-                            break
-                        await websocket.send_text(
-                            json.dumps(
-                                {"type": "event", "channel": channel, "data": payload}
-                            )
-                        )
-
-                subscriptions[chan] = q
-                asyncio.create_task(forwarder(chan, q))
-                await websocket.send_text(
-                    json.dumps({"type": "subscribed", "conversation_id": conv_id})
-                )
-
-            elif t == "unsubscribe":
-                conv_id = data.get("conversation_id")
-                if not conv_id:
-                    continue
-                chan = f"im:conv:{conv_id}"
-                q = subscriptions.pop(chan, None)
-                if q:
-                    await pubsub.unsubscribe(chan, q)
-                await websocket.send_text(
-                    json.dumps({"type": "unsubscribed", "conversation_id": conv_id})
-                )
-
-            elif t == "pong":
-                last_pong = asyncio.get_event_loop().time()
-                # 续期路由信息
-                try:
-                    info = {
-                        "instance_id": settings.INSTANCE_ID,
-                        "platform": "ws",
-                        "last_ping_ts": int(last_pong),
-                    }
-                    if hasattr(pubsub, "set_connection"):
-                        await pubsub.set_connection(user_id, json.dumps(info), ttl_sec=60)  # type: ignore
-                except Exception:
-                    pass
-
-            else:
-                # 支持 send_msg（直接通过 WS 发送并入库）
-                if t == "send_msg":
-                    conv_id = data.get("conversation_id")
-                    content = data.get("content")
-                    msg_type = data.get("msg_type", "text")
-                    if not conv_id or not content:
-                        await websocket.send_text(
-                            json.dumps({"type": "error", "message": "invalid payload"})
-                        )
-                        continue
-                    try:
-                        from app.core.database import SessionLocal
-                        from app.core.seq import next_seq
-
-                        db = SessionLocal()
-                        # 先生成 seq（在事件循环中）
-                        seq_value = await next_seq(conv_id)
-                        # 幂等：如带 client_msg_id 则先查
-                        existing = None
-                        if data.get("client_msg_id"):
-                            existing = (
-                                db.query(im_model.IMMessage)
-                                .filter(
-                                    im_model.IMMessage.conversation_id == conv_id,
-                                    im_model.IMMessage.sender_id == user_id,
-                                    im_model.IMMessage.client_msg_id
-                                    == data.get("client_msg_id"),
-                                )
-                                .first()
-                            )
-                        if existing:
-                            await websocket.send_text(
-                                json.dumps(
-                                    {
-                                        "type": "ack",
-                                        "event": "message.sent",
-                                        "message_id": existing.message_id,
-                                        "seq": existing.seq,
-                                    }
-                                )
-                            )
-                            continue
-                        req = im_model.MessageCreateRequest(
-                            conversation_id=conv_id,
-                            type=msg_type,
-                            content=content,
-                            reply_to=data.get("reply_to"),
-                            client_msg_id=data.get("client_msg_id"),
-                            tenant_id=data.get("tenant_id"),
-                        )
-                        msg = im_service.create_message(
-                            db, req, sender_id=user_id, seq_value=seq_value
-                        )
-                        await websocket.send_text(
-                            json.dumps(
-                                {
-                                    "type": "ack",
-                                    "event": "message.sent",
-                                    "message_id": msg.message_id,
-                                    "seq": msg.seq,
-                                }
-                            )
-                        )
-                    except Exception as e:
-                        await websocket.send_text(
-                            json.dumps({"type": "error", "message": str(e)})
-                        )
-                    finally:
-                        try:
-                            db.close()
-                        except Exception:
-                            pass
-                elif t == "stream_chunk":
-                    conv_id = data.get("conversation_id")
-                    chunk = data.get("chunk")
-                    stream_end = bool(data.get("stream_end", False))
-                    if not conv_id or chunk is None:
-                        await websocket.send_text(
-                            json.dumps({"type": "error", "message": "invalid payload"})
-                        )
-                        continue
-                    try:
-                        from app.core.database import SessionLocal
-                        from app.core.seq import next_seq
-
-                        db = SessionLocal()
-                        seq_value = await next_seq(conv_id)
-                        msg = im_service.create_stream_chunk(
-                            db,
-                            conversation_id=conv_id,
-                            sender_id=user_id,
-                            content=str(chunk),
-                            client_msg_id=data.get("client_msg_id"),
-                            stream_end=stream_end,
-                            tenant_id=data.get("tenant_id"),
-                            seq_value=seq_value,
-                        )
-                        await websocket.send_text(
-                            json.dumps(
-                                {
-                                    "type": "ack",
-                                    "event": "stream.sent",
-                                    "message_id": msg.message_id,
-                                    "seq": msg.seq,
-                                    "stream_end": stream_end,
-                                }
-                            )
-                        )
-                    except Exception as e:
-                        await websocket.send_text(
-                            json.dumps({"type": "error", "message": str(e)})
-                        )
-                    finally:
-                        try:
-                            db.close()
-                        except Exception:
-                            pass
-                elif t == "delivered":
-                    conv_id = data.get("conversation_id")
-                    message_id = data.get("message_id")
-                    if conv_id and message_id:
-                        from app.core.database import SessionLocal
-                        from app.services.receipts_service import mark_delivered
-
-                        db = SessionLocal()
-                        try:
-                            # per-user delivered（校验成员在 service 内/或下层 API 负责）
-                            mark_delivered(db, conv_id, message_id, user_id)
-                        finally:
-                            try:
-                                db.close()
-                            except Exception:
-                                pass
-                # WebRTC信令处理
-                elif t == "call.initiate":
-                    to_user_id = data.get("to_user_id")
-                    conv_id = data.get("conversation_id")
-                    if conv_id and to_user_id:
-                        try:
-                            from app.core.database import SessionLocal
-                            from app.services.call_service import CallManagementService
-
-                            db = SessionLocal()
-                            try:
-                                # 创建通话
-                                call = CallManagementService.create_call(
-                                    db=db, conversation_id=conv_id, initiator_id=user_id
-                                )
-
-                                # 获取ICE配置
-                                ice_config = (
-                                    CallManagementService.get_ice_configuration(user_id)
-                                )
-
-                                # 向发起者发送确认
-                                await websocket.send_text(
-                                    json.dumps(
-                                        {
-                                            "type": "call.initiated",
-                                            "call_id": call.call_id,
-                                            "ice_configuration": ice_config,
-                                        }
-                                    )
-                                )
-
-                                # 向目标用户发送邀请
-                                invite_data = {
-                                    "type": "call.incoming",
-                                    "call_id": call.call_id,
-                                    "from_user_id": user_id,
-                                    "conversation_id": conv_id,
-                                    "ice_configuration": CallManagementService.get_ice_configuration(
-                                        to_user_id
-                                    ),
-                                }
-                                await pubsub.publish(f"im:conv:{conv_id}", invite_data)
-
-                            finally:
-                                db.close()
-                        except Exception as e:
-                            await websocket.send_text(
-                                json.dumps(
-                                    {
-                                        "type": "error",
-                                        "message": f"Failed to initiate call: {str(e)}",
-                                    }
-                                )
-                            )
-
-                elif t == "call.accept":
-                    call_id = data.get("call_id")
-                    if call_id:
-                        try:
-                            from app.core.database import SessionLocal
-                            from app.services.call_service import CallManagementService
-
-                            db = SessionLocal()
-                            try:
-                                success = CallManagementService.join_call(
-                                    db, call_id, user_id
-                                )
-                                if success:
-                                    # 获取通话信息
-                                    from app.models import im as im_model
-
-                                    call = (
-                                        db.query(im_model.CallLog)
-                                        .filter(im_model.CallLog.call_id == call_id)
-                                        .first()
-                                    )
-
-                                    if call:
-                                        # 向会话广播接听事件
-                                        accept_data = {
-                                            "type": "call.accepted",
-                                            "call_id": call_id,
-                                            "user_id": user_id,
-                                            "conversation_id": call.conversation_id,
-                                        }
-                                        await pubsub.publish(
-                                            f"im:conv:{call.conversation_id}",
-                                            accept_data,
-                                        )
-                                else:
-                                    await websocket.send_text(
-                                        json.dumps(
-                                            {
-                                                "type": "error",
-                                                "message": "Failed to accept call",
-                                            }
-                                        )
-                                    )
-                            finally:
-                                db.close()
-                        except Exception as e:
-                            await websocket.send_text(
-                                json.dumps(
-                                    {
-                                        "type": "error",
-                                        "message": f"Failed to accept call: {str(e)}",
-                                    }
-                                )
-                            )
-
-                elif t == "call.hangup":
-                    call_id = data.get("call_id")
-                    if call_id:
-                        try:
-                            from app.core.database import SessionLocal
-                            from app.services.call_service import CallManagementService
-
-                            db = SessionLocal()
-                            try:
-                                CallManagementService.leave_call(db, call_id, user_id)
-                                # 广播事件会由service层处理
-                            finally:
-                                db.close()
-                        except Exception as e:
-                            await websocket.send_text(
-                                json.dumps(
-                                    {
-                                        "type": "error",
-                                        "message": f"Failed to hangup call: {str(e)}",
-                                    }
-                                )
-                            )
-
-                elif t == "call.webrtc.signal":
-                    call_id = data.get("call_id")
-                    to_user_id = data.get("to_user_id")
-                    payload = data.get("payload")
-
-                    if call_id and to_user_id and payload:
-                        try:
-                            from app.services.call_service import WebRTCSignalingService
-
-                            # 验证信令格式
-                            sanitized_payload = (
-                                WebRTCSignalingService.sanitize_webrtc_signal(payload)
-                            )
-                            if sanitized_payload:
-                                # 转发信令给目标用户
-                                signal_data = {
-                                    "type": "call.webrtc.signal",
-                                    "call_id": call_id,
-                                    "from_user_id": user_id,
-                                    "payload": sanitized_payload,
-                                }
-
-                                # 这里可以直接向特定用户发送，或通过会话频道广播
-                                # 为简化实现，通过会话频道广播，客户端根据to_user_id过滤
-                                from app.core.database import SessionLocal
-                                from app.models import im as im_model
-
-                                db = SessionLocal()
-                                try:
-                                    call = (
-                                        db.query(im_model.CallLog)
-                                        .filter(im_model.CallLog.call_id == call_id)
-                                        .first()
-                                    )
-                                    if call:
-                                        signal_data["to_user_id"] = to_user_id
-                                        await pubsub.publish(
-                                            f"im:conv:{call.conversation_id}",
-                                            signal_data,
-                                        )
-                                finally:
-                                    db.close()
-                            else:
-                                await websocket.send_text(
-                                    json.dumps(
-                                        {
-                                            "type": "error",
-                                            "message": "Invalid WebRTC signal format",
-                                        }
-                                    )
-                                )
-                        except Exception as e:
-                            await websocket.send_text(
-                                json.dumps(
-                                    {
-                                        "type": "error",
-                                        "message": f"Failed to relay WebRTC signal: {str(e)}",
-                                    }
-                                )
-                            )
-
-                else:
-                    conv_id = data.get("conversation_id")
-                    if conv_id:
-                        await pubsub.publish(f"im:conv:{conv_id}", data)
-    except WebSocketDisconnect:
-        pass
+            if not isinstance(data, dict):
+                continue
+            await dispatcher.dispatch(conn, data)
+    except WebSocketDisconnect as e:
+        close_code = e.code
     finally:
-        try:
-            for chan, q in list(subscriptions.items()):
-                await pubsub.unsubscribe(chan, q)
-        except Exception:
-            pass
+        presence.disconnected(user_id)
+        await dispatcher.aclose()
+        await conn.close()
+        ws_metrics.connection_closed(close_code, time.monotonic() - opened_at)
@@ -3,16 +3,32 @@
 提供文件上传、下载、管理等功能
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.database import get_db
-from app.core.media_storage import media_storage, MediaStorageError
+from app.core.media_storage import (
+    async_media_storage,
+    media_storage,
+    MediaStorageError,
+)
+from app.services import media_service
+from app.services.media_processing import media_processor
 from app.core.ws_auth import get_current_user_id_from_request
 from app.models import im as im_model
 
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+_SHA256_RE = re.compile(r"^[0-9a-fA-F]{64}$")
 
 
 @router.post("/upload_token", response_model=im_model.UploadTokenResponse)
@@ -47,16 +63,31 @@ async def get_upload_token(
 
         # 生成上传令牌
         try:
-            token_data = media_storage.generate_upload_token(
+            token_data = await async_media_storage.generate_upload_token(
                 conversation_id=req.conversation_id,
                 filename=req.filename,
                 content_type=req.content_type,
                 file_size=req.file_size,
                 user_id=user_id,
+                file_hash=req.file_hash,
             )
         except MediaStorageError as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+        media_service.create_pending_media(
+            db,
+            media_id=token_data["media_id"],
+            conversation_id=req.conversation_id,
+            uploader_id=user_id,
+            object_key=token_data["object_key"],
+            filename=req.filename,
+            content_type=req.content_type,
+            file_size=req.file_size,
+            file_hash=req.file_hash,
+            tenant_id=member.tenant_id,
+            upload_expires_at=datetime.fromisoformat(token_data["expires_at"]),
+        )
+
         return im_model.UploadTokenResponse(
             media_id=token_data["media_id"],
             upload_url=token_data["upload_url"],
@@ -102,22 +133,87 @@ async def upload_complete(
                 detail="Not a conversation member",
             )
 
+        media = media_service.get_media(db, req.media_id, req.conversation_id)
+        if media is not None and media.uploader_id != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only the uploader can complete the upload",
+            )
+        # 重试的完成通知直接返回（内容寻址时上传副本已移除，不能再次校验或引用）
+        if media is not None and media.status == "ready":
+            return {"status": "success", "media_id": req.media_id}
+
         # 验证文件完整性
-        is_valid, error_msg = media_storage.verify_upload_integrity(
+        is_valid, error_msg = await async_media_storage.verify_upload_integrity(
             media_id=req.media_id,
             conversation_id=req.conversation_id,
             expected_hash=req.file_hash,
             expected_size=req.file_size,
+            expected_md5=req.file_md5,
         )
 
         if not is_valid:
             # 删除无效文件
-            media_storage.delete_file(req.media_id, req.conversation_id)
+            await _discard_upload(db, media, req.media_id, req.conversation_id)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"File validation failed: {error_msg}",
             )
 
+        if settings.MEDIA_VALIDATE_CONTENT and media is not None:
+            # 文件头类型检测 + Range 读取解析音频元数据，不下载整个对象
+            content_ok, content_info = (
+                await async_media_storage.validate_object_content(
+                    req.media_id, req.conversation_id, media.content_type
+                )
+            )
+            if not content_ok:
+                await _discard_upload(db, media, req.media_id, req.conversation_id)
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"File content validation failed: "
+                    f"{'; '.join(content_info.get('issues', []))}",
+                )
+
+        if media is None:
+            # 兼容未登记的历史上传令牌：按对象存储中的信息补录
+            stored = await async_media_storage.get_file_metadata(
+                req.media_id, req.conversation_id
+            )
+            media = media_service.create_pending_media(
+                db,
+                media_id=req.media_id,
+                conversation_id=req.conversation_id,
+                uploader_id=user_id,
+                object_key=media_storage.build_object_key(
+                    req.conversation_id, req.media_id
+                ),
+                filename=req.media_id,
+                content_type=(stored or {}).get(
+                    "content_type", "application/octet-stream"
+                ),
+                file_size=req.file_size,
+                tenant_id=member.tenant_id,
+            )
+        media_service.complete_media(
+            db,
+            media,
+            file_hash=req.file_hash,
+            file_size=req.file_size,
+            duration_ms=req.duration_ms,
+            waveform_data=req.waveform_data,
+        )
+        if settings.MEDIA_CONTENT_ADDRESSED:
+            await _store_as_blob(db, media)
+        # 异步提取时长与波形，完成后推送 media.processed 事件
+        if media.processed_at is None:
+            media_processor.submit(
+                media.media_id,
+                media.conversation_id,
+                media.object_key,
+                media.content_type,
+            )
+
         return {"status": "success", "media_id": req.media_id}
 
     except HTTPException:
@@ -129,6 +225,534 @@ async def upload_complete(
         )
 
 
+async def _discard_upload(
+    db: Session,
+    media: Optional[im_model.MediaObject],
+    media_id: str,
+    conversation_id: str,
+) -> None:
+    """丢弃校验失败的上传；已引用共享对象的只释放引用，最后一个引用时才移除对象"""
+    if media is not None and media.blob_sha256:
+        await async_media_storage.invalidate(media_id, conversation_id)
+        blob_key = media_service.release_blob(db, media)
+        if blob_key:
+            await async_media_storage.remove_object(blob_key)
+        return
+    await async_media_storage.delete_file(media_id, conversation_id)
+    if media is not None:
+        media_service.delete_media(db, media)
+
+
+def _require_member(request: Request, db: Session, conversation_id: str):
+    """认证并校验会话成员身份，返回 (user_id, member)"""
+    user_id = get_current_user_id_from_request(request)
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required",
+        )
+    member = (
+        db.query(im_model.ConversationMember)
+        .filter(
+            im_model.ConversationMember.conversation_id == conversation_id,
+            im_model.ConversationMember.user_id == user_id,
+        )
+        .first()
+    )
+    if not member:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not a conversation member",
+        )
+    return user_id, member
+
+
+def _get_multipart_media(
+    db: Session, media_id: str, conversation_id: str, user_id: str
+) -> im_model.MediaObject:
+    """获取进行中的分段上传（仅上传者可操作）"""
+    media = media_service.get_media(db, media_id, conversation_id)
+    if media is None or media.status != "pending" or not media.upload_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Multipart upload not found",
+        )
+    if media.uploader_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the uploader can access the upload",
+        )
+    return media
+
+
+async def _store_as_blob(
+    db: Session, media: im_model.MediaObject, hash_verified: bool = False
+) -> None:
+    """
+    内容寻址：将刚上传的对象并入按 SHA256 命名的共享对象并删除上传副本
+    并入前需确认 SHA256（MD5 校验不足以证明内容）：否则可以声明他人内容的哈希
+    引用已有的共享对象，或以错误内容占用哈希；
+    调用方已确认过的（hash_verified）不再重复计算；
+    任一步失败时媒体保留在原上传位置，不影响本次上传
+    """
+    upload_key = media.object_key
+    try:
+        if not hash_verified and not await async_media_storage.verify_content_hash(
+            upload_key, media.sha256
+        ):
+            logger.warning(f"Content hash not confirmed, skip dedup: {media.media_id}")
+            return
+        blob = media_service.get_blob(db, media.sha256)
+        if blob is None:
+            blob_key = media_storage.build_blob_key(media.sha256)
+            await async_media_storage.copy_object(upload_key, blob_key)
+            blob = media_service.create_blob(
+                db, media.sha256, blob_key, media.file_size, media.content_type
+            )
+        if not media_service.attach_blob(db, media, blob):
+            return
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Content-addressed store failed: {media.media_id}: {e}")
+        return
+    if upload_key != media.object_key:
+        # 已缓存的元数据与下载URL指向上传副本，移除前先失效（含其他 worker）
+        await async_media_storage.invalidate(media.media_id, media.conversation_id)
+        await async_media_storage.remove_object(upload_key)
+
+
+def _require_blob(sha256: str) -> str:
+    if not settings.MEDIA_CONTENT_ADDRESSED or not _SHA256_RE.match(sha256):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Content not found"
+        )
+    return sha256.lower()
+
+
+@router.head("/by-hash/{sha256}")
+async def head_media_by_hash(
+    sha256: str,
+    conversation_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """
+    上传前检查调用者可见的会话中是否已存储该内容；存在时客户端可调用 attach 跳过上传，
+    否则按正常流程上传
+    """
+    sha256 = _require_blob(sha256)
+    user_id, member = _require_member(request, db, conversation_id)
+    blob = media_service.get_visible_blob(db, sha256, user_id, member.tenant_id)
+    if blob is None or blob.ref_count <= 0:
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    return Response(
+        status_code=status.HTTP_200_OK,
+        headers={
+            "X-Media-Size": str(blob.size),
+            "X-Media-Content-Type": blob.content_type,
+        },
+    )
+
+
+@router.post("/by-hash/{sha256}/attach")
+async def attach_media_by_hash(
+    sha256: str,
+    req: im_model.MediaAttachRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """引用已存储的内容在会话内创建媒体（转发、重复分享无需重新上传）"""
+    try:
+        sha256 = _require_blob(sha256)
+        user_id, member = _require_member(request, db, req.conversation_id)
+
+        blob = media_service.get_visible_blob(db, sha256, user_id, member.tenant_id)
+        media = None
+        if blob is not None:
+            media = media_service.attach_media_from_blob(
+                db,
+                media_id=media_storage.generate_media_id(),
+                conversation_id=req.conversation_id,
+                uploader_id=user_id,
+                filename=req.filename,
+                blob=blob,
+                tenant_id=member.tenant_id,
+            )
+        if media is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Content not found"
+            )
+        if media.processed_at is None:
+            media_processor.submit(
+                media.media_id,
+                media.conversation_id,
+                media.object_key,
+                media.content_type,
+            )
+
+        return {
+            "status": "success",
+            "media_id": media.media_id,
+            "file_size": media.file_size,
+            "content_type": media.content_type,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to attach media: {str(e)}",
+        )
+
+
+@router.post("/multipart/initiate", response_model=im_model.MultipartInitiateResponse)
+async def initiate_multipart_upload(
+    req: im_model.MultipartInitiateRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """创建分段上传（大文件、可断点续传）"""
+    try:
+        user_id, member = _require_member(request, db, req.conversation_id)
+
+        try:
+            upload = await async_media_storage.initiate_multipart_upload(
+                conversation_id=req.conversation_id,
+                filename=req.filename,
+                content_type=req.content_type,
+                file_size=req.file_size,
+            )
+        except MediaStorageError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        media_service.create_pending_media(
+            db,
+            media_id=upload["media_id"],
+            conversation_id=req.conversation_id,
+            uploader_id=user_id,
+            object_key=upload["object_key"],
+            filename=req.filename,
+            content_type=req.content_type,
+            file_size=req.file_size,
+            tenant_id=member.tenant_id,
+            upload_expires_at=datetime.fromisoformat(upload["expires_at"]),
+            upload_id=upload["upload_id"],
+            part_size=upload["part_size"],
+        )
+
+        return im_model.MultipartInitiateResponse(
+            media_id=upload["media_id"],
+            part_size=upload["part_size"],
+            part_count=upload["part_count"],
+            expires_at=upload["expires_at"],
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to initiate multipart upload: {str(e)}",
+        )
+
+
+@router.post(
+    "/multipart/{media_id}/part_urls",
+    response_model=im_model.MultipartPartURLsResponse,
+)
+async def get_multipart_part_urls(
+    media_id: str,
+    req: im_model.MultipartPartURLsRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """获取分段上传URL（可一次获取多段，客户端并行上传）"""
+    try:
+        user_id, _ = _require_member(request, db, req.conversation_id)
+        media = _get_multipart_media(db, media_id, req.conversation_id, user_id)
+
+        part_count = max(1, -(-media.file_size // media.part_size))
+        invalid = [n for n in req.part_numbers if not 1 <= n <= part_count]
+        if invalid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid part numbers {invalid}, expected 1..{part_count}",
+            )
+
+        try:
+            urls = await async_media_storage.generate_part_urls(
+                media.object_key,
+                media.upload_id,
+                sorted(set(req.part_numbers)),
+                req.part_sha256,
+            )
+        except MediaStorageError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        expires_at = (
+            datetime.utcnow() + timedelta(seconds=settings.MEDIA_URL_EXPIRE_SECONDS)
+        ).isoformat()
+        return im_model.MultipartPartURLsResponse(
+            media_id=media_id,
+            parts=[
+                im_model.MultipartPartURL(part_number=n, url=url)
+                for n, url in urls.items()
+            ],
+            expires_at=expires_at,
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to generate part URLs: {str(e)}",
+        )
+
+
+@router.get(
+    "/multipart/{media_id}/parts", response_model=im_model.MultipartPartsResponse
+)
+async def list_multipart_parts(
+    media_id: str,
+    conversation_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """列出已上传的分段，用于断点续传"""
+    try:
+        user_id, _ = _require_member(request, db, conversation_id)
+        media = _get_multipart_media(db, media_id, conversation_id, user_id)
+
+        try:
+            parts = await async_media_storage.list_uploaded_parts(
+                media.object_key, media.upload_id
+            )
+        except MediaStorageError as e:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
+
+        return im_model.MultipartPartsResponse(
+            media_id=media_id,
+            part_size=media.part_size,
+            part_count=max(1, -(-media.file_size // media.part_size)),
+            parts=[im_model.MultipartPartInfo(**p) for p in parts],
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to list parts: {str(e)}",
+        )
+
+
+@router.post("/multipart/{media_id}/complete")
+async def complete_multipart_upload(
+    media_id: str,
+    req: im_model.MultipartCompleteRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """完成分段上传：按分段 ETag 校验各段 MD5，内容寻址时合并后确认整个对象的 SHA256"""
+    try:
+        user_id, _ = _require_member(request, db, req.conversation_id)
+        media = _get_multipart_media(db, media_id, req.conversation_id, user_id)
+
+        try:
+            uploaded = await async_media_storage.list_uploaded_parts(
+                media.object_key, media.upload_id
+            )
+        except MediaStorageError as e:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
+
+        # 校验失败时保留上传会话，客户端可重传出错的分段后再次完成
+        error_msg = media_service.check_multipart_parts(
+            media, uploaded, {p.part_number: p.md5 for p in req.parts}
+        )
+        if error_msg:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File validation failed: {error_msg}",
+            )
+
+        try:
+            await async_media_storage.complete_multipart_upload(
+                media.object_key, media.upload_id, uploaded
+            )
+        except MediaStorageError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        # 分段 MD5 只能保证各段传输无误；SHA256 不能由分段摘要组合得出
+        # （存储端的组合校验和是各段摘要的摘要），确认声明的值需要读取整个对象。
+        # 只有内容寻址去重依赖可信的 SHA256，其余情况不做整对象计算
+        if (
+            settings.MEDIA_CONTENT_ADDRESSED
+            and not await async_media_storage.verify_content_hash(
+                media.object_key, req.file_hash
+            )
+        ):
+            await _discard_upload(db, media, media_id, req.conversation_id)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File validation failed: Hash mismatch",
+            )
+
+        if settings.MEDIA_VALIDATE_CONTENT:
+            content_ok, content_info = (
+                await async_media_storage.validate_object_content(
+                    media_id, req.conversation_id, media.content_type
+                )
+            )
+            if not content_ok:
+                await _discard_upload(db, media, media_id, req.conversation_id)
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"File content validation failed: "
+                    f"{'; '.join(content_info.get('issues', []))}",
+                )
+
+        media_service.complete_media(
+            db,
+            media,
+            file_hash=req.file_hash,
+            file_size=media.file_size,
+            duration_ms=req.duration_ms,
+            waveform_data=req.waveform_data,
+        )
+        if settings.MEDIA_CONTENT_ADDRESSED:
+            await _store_as_blob(db, media, hash_verified=True)
+        if media.processed_at is None:
+            media_processor.submit(
+                media.media_id,
+                media.conversation_id,
+                media.object_key,
+                media.content_type,
+            )
+
+        return {"status": "success", "media_id": media_id}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Multipart upload completion failed: {str(e)}",
+        )
+
+
+@router.delete("/multipart/{media_id}")
+async def abort_multipart_upload(
+    media_id: str,
+    conversation_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """放弃分段上传，释放已上传的分段"""
+    try:
+        user_id, _ = _require_member(request, db, conversation_id)
+        media = _get_multipart_media(db, media_id, conversation_id, user_id)
+
+        await async_media_storage.abort_multipart_upload(
+            media.object_key, media.upload_id
+        )
+        media_service.delete_media(db, media)
+        return {"status": "aborted", "media_id": media_id}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to abort multipart upload: {str(e)}",
+        )
+
+
+@router.post("/batch", response_model=im_model.MediaBatchResponse)
+async def batch_media(
+    req: im_model.MediaBatchRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+):
+    """批量获取同一会话内媒体文件的元数据与下载URL"""
+    try:
+        user_id = get_current_user_id_from_request(request)
+        if not user_id:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Authentication required",
+            )
+
+        # 验证用户权限（整批只校验一次）
+        member = (
+            db.query(im_model.ConversationMember)
+            .filter(
+                im_model.ConversationMember.conversation_id == req.conversation_id,
+                im_model.ConversationMember.user_id == user_id,
+            )
+            .first()
+        )
+        if not member:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not a conversation member",
+            )
+
+        media_ids = list(dict.fromkeys(req.media_ids))
+        rows = media_service.get_ready_media_bulk(db, req.conversation_id, media_ids)
+        slots = asyncio.Semaphore(max(1, settings.MEDIA_BATCH_CONCURRENCY))
+
+        async def resolve(media_id: str) -> im_model.MediaBatchItem:
+            media = rows.get(media_id)
+            async with slots:
+                if media is not None:
+                    metadata = media_service.media_metadata(media)
+                else:
+                    metadata = await async_media_storage.get_file_metadata(
+                        media_id, req.conversation_id
+                    )
+                if not metadata:
+                    return im_model.MediaBatchItem(media_id=media_id, found=False)
+                download = await async_media_storage.get_download_url(
+                    media_id,
+                    req.conversation_id,
+                    media.object_key if media is not None else None,
+                )
+            return im_model.MediaBatchItem(
+                media_id=media_id,
+                download_url=download["download_url"],
+                content_type=metadata.get("content_type"),
+                filename=metadata.get("metadata", {}).get(
+                    "original_filename", media_id
+                ),
+                file_size=metadata.get("size"),
+                duration_ms=metadata.get("duration_ms"),
+                waveform_data=metadata.get("waveform_data"),
+                expires_at=download["expires_at"],
+            )
+
+        try:
+            items = await asyncio.gather(*(resolve(m) for m in media_ids))
+        except MediaStorageError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to generate download URL: {str(e)}",
+            )
+
+        return im_model.MediaBatchResponse(
+            conversation_id=req.conversation_id, items=items
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get media batch: {str(e)}",
+        )
+
+
 @router.get("/{media_id}/download", response_model=im_model.MediaDownloadResponse)
 async def download_media(
     media_id: str,
@@ -160,17 +784,25 @@ async def download_media(
                 detail="Not a conversation member",
             )
 
-        # 获取文件元数据
-        metadata = media_storage.get_file_metadata(media_id, conversation_id)
+        # 获取文件元数据（优先读取元数据表，历史对象回退到对象存储）
+        media = media_service.get_ready_media(db, media_id, conversation_id)
+        if media is not None:
+            metadata = media_service.media_metadata(media)
+        else:
+            metadata = await async_media_storage.get_file_metadata(
+                media_id, conversation_id
+            )
         if not metadata:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Media file not found"
             )
 
-        # 生成下载URL
+        # 生成下载URL（缓存命中时直接复用）
         try:
-            download_url = media_storage.generate_download_url(
-                media_id, conversation_id
+            download = await async_media_storage.get_download_url(
+                media_id,
+                conversation_id,
+                media.object_key if media is not None else None,
             )
         except MediaStorageError as e:
             raise HTTPException(
@@ -178,21 +810,14 @@ async def download_media(
                 detail=f"Failed to generate download URL: {str(e)}",
             )
 
-        from datetime import datetime, timedelta
-        from app.core.config import settings
-
-        expires_at = (
-            datetime.utcnow() + timedelta(seconds=settings.MEDIA_URL_EXPIRE_SECONDS)
-        ).isoformat()
-
         return im_model.MediaDownloadResponse(
-            download_url=download_url,
+            download_url=download["download_url"],
             content_type=metadata.get("content_type", "application/octet-stream"),
             filename=metadata.get("metadata", {}).get(
                 "original_filename", f"{media_id}"
             ),
             file_size=metadata.get("size", 0),
-            expires_at=expires_at,
+            expires_at=download["expires_at"],
         )
 
     except HTTPException:
@@ -235,8 +860,14 @@ async def get_media_metadata(
                 detail="Not a conversation member",
             )
 
-        # 获取文件元数据
-        metadata = media_storage.get_file_metadata(media_id, conversation_id)
+        # 获取文件元数据（优先读取元数据表，历史对象回退到对象存储）
+        media = media_service.get_ready_media(db, media_id, conversation_id)
+        if media is not None:
+            metadata = media_service.media_metadata(media)
+        else:
+            metadata = await async_media_storage.get_file_metadata(
+                media_id, conversation_id
+            )
         if not metadata:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Media file not found"
@@ -284,16 +915,31 @@ async def delete_media(
                 detail="Not a conversation member",
             )
 
-        # 检查是否有权限删除（可以扩展为检查文件上传者）
-        # TODO: 添加文件所有权验证
+        # 只有上传者或会话 owner 可以删除
+        media = media_service.get_media(db, media_id, conversation_id)
+        if media is not None and not media_service.can_delete_media(db, media, user_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only the uploader or conversation owner can delete media",
+            )
+
+        if media is not None and media.blob_sha256:
+            # 内容寻址：仅在最后一个引用删除时移除共享对象
+            await async_media_storage.invalidate(media_id, conversation_id)
+            blob_key = media_service.release_blob(db, media)
+            if blob_key:
+                await async_media_storage.remove_object(blob_key)
+            return {"status": "deleted", "media_id": media_id}
 
         # 删除文件
-        success = media_storage.delete_file(media_id, conversation_id)
+        success = await async_media_storage.delete_file(media_id, conversation_id)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Media file not found or already deleted",
             )
+        if media is not None:
+            media_service.delete_media(db, media)
 
         return {"status": "deleted", "media_id": media_id}
 
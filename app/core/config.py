@@ -5,6 +5,9 @@ class Settings(BaseSettings):
     # 基础配置
     DATABASE_URL: str = "sqlite:///./im.db"
     REDIS_URL: str | None = None
+    # Redis pub/sub 消息带发布时间信封（{"v","ts","data"}）；订阅端两种格式都接受，
+    # 滚动升级时先全部部署新版本再开启，避免旧实例收到信封
+    PUBSUB_ENVELOPE: bool = False
     TENANT_ID: str | None = None
 
     # 认证配置
@@ -15,6 +18,13 @@ class Settings(BaseSettings):
     # 服务配置
     INSTANCE_ID: str = "im-instance-1"
     RATE_LIMIT_PER_SEC: int = 10
+    # 限流（GCRA）：突发量（0 为每秒速率）、按路由计费（[METHOD ]/path/prefix=cost，逗号分隔）、
+    # 本地用量低于 突发量×比例 时不访问 Redis（0 关闭）、本地状态键上限、待计费量批量扣除间隔
+    RATE_LIMIT_BURST: int = 0
+    RATE_LIMIT_ROUTE_COSTS: str = ""
+    RATE_LIMIT_LOCAL_RATIO: float = 0.5
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = 10000
+    RATE_LIMIT_FLUSH_INTERVAL_SECONDS: float = 1.0
     REQUIRE_REDIS: bool = True
     DEV_AUTO_CREATE_TABLES: bool = False
 
@@ -23,6 +33,16 @@ class Settings(BaseSettings):
     CONNECTION_POOL_SIZE: int = 10
     QUERY_TIMEOUT: int = 30
 
+    # WebSocket配置
+    WS_ALLOWED_ENCODINGS: str = "json,msgpack,deflate"
+    WS_DEFLATE_WINDOW_BITS: int = 11  # 2KB窗口，控制每连接内存
+    WS_DEFLATE_MEM_LEVEL: int = 4
+    WS_DEFLATE_LEVEL: int = 6
+    WS_MAX_FRAME_BYTES: int = 1024 * 1024  # 解压后单帧大小上限
+    WS_MAX_INFLIGHT_FRAMES: int = 8  # 单连接并发处理的帧数上限
+    WS_OUTBOUND_QUEUE_SIZE: int = 256  # 单连接出站写队列长度
+    WS_SLOW_FRAME_SECONDS: float = 1.0  # 超过该耗时的帧处理记录告警日志
+
     # 安全配置
     API_KEY: str | None = None
     ENABLE_CORS: bool = False
@@ -32,6 +52,9 @@ class Settings(BaseSettings):
     # 监控配置
     ENABLE_METRICS: bool = True
     METRICS_PATH: str = "/metrics"
+    # 健康检查后台采样周期与单项探测超时；/health、/ready 返回最近一次快照
+    HEALTH_SAMPLE_INTERVAL_SECONDS: float = 5.0
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 2.0
     LOG_LEVEL: str = "INFO"
 
     # 应用版本
@@ -43,11 +66,61 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = "minioadmin"
     MINIO_BUCKET_NAME: str = "aiim-media"
     MINIO_SECURE: bool = False
+    # 对象存储区域；留空时由客户端查询桶所在区域，设置后生成预签名URL无需网络请求
+    MINIO_REGION: str = ""
     MEDIA_MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
     MEDIA_ALLOWED_TYPES: str = (
         "audio/mpeg,audio/wav,audio/ogg,audio/mp4,audio/webm,audio/aac"
     )
     MEDIA_URL_EXPIRE_SECONDS: int = 3600  # 1 hour
+    # 分段上传：分段大小（S3 要求除最后一段外不小于 5MB）与上传会话有效期
+    MEDIA_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024
+    MEDIA_MULTIPART_EXPIRE_SECONDS: int = 24 * 3600
+    # 内容寻址存储：按 SHA256 去重，相同内容只保存一份（blobs/<sha[:2]>/<sha>）
+    MEDIA_CONTENT_ADDRESSED: bool = False
+    # 孤立媒体回收：超过宽限期未被消息引用的对象、非当前版本；分批删除并限速
+    # 删除不可恢复，默认关闭；开启前需完成 0009 迁移（回填历史消息引用）
+    MEDIA_GC_ENABLED: bool = False
+    MEDIA_GC_INTERVAL_SECONDS: int = 3600
+    MEDIA_GC_GRACE_SECONDS: int = 2 * 24 * 3600
+    MEDIA_GC_BATCH_SIZE: int = 500
+    MEDIA_GC_BATCH_INTERVAL_SECONDS: float = 1.0
+    # 对象存储调用在独立线程池中执行，避免阻塞事件循环
+    MEDIA_STORAGE_MAX_WORKERS: int = 16
+    MEDIA_STORAGE_TIMEOUT_SECONDS: float = 10.0
+    # 完整性校验需下载整个对象，单独设置超时
+    MEDIA_STORAGE_VERIFY_TIMEOUT_SECONDS: float = 120.0
+    # 流式完整性校验：分块大小与并发上限
+    MEDIA_VERIFY_CHUNK_SIZE: int = 256 * 1024
+    MEDIA_VERIFY_MAX_CONCURRENT: int = 2
+    # 内容校验：类型检测读取的文件头字节数、Range 读取窗口；上传完成时是否校验内容（默认关闭）
+    MEDIA_SNIFF_BYTES: int = 8192
+    MEDIA_RANGED_READ_WINDOW: int = 64 * 1024
+    MEDIA_VALIDATE_CONTENT: bool = False
+    # 下载URL缓存：URL 提前于签名过期前 MARGIN 秒失效；元数据单独缓存
+    MEDIA_URL_CACHE_SIZE: int = 10000
+    MEDIA_URL_CACHE_MARGIN_SECONDS: int = 300
+    MEDIA_METADATA_CACHE_TTL_SECONDS: int = 3600
+    MEDIA_URL_CACHE_REDIS: bool = True
+    # 批量接口对象存储回源并发上限
+    MEDIA_BATCH_CONCURRENCY: int = 8
+    # 音频后处理（时长/码率/波形），在独立进程池中执行
+    MEDIA_PROCESSING_ENABLED: bool = True
+    MEDIA_PROCESSING_WORKERS: int = 2
+    MEDIA_PROCESSING_TIMEOUT_SECONDS: float = 120.0
+    MEDIA_WAVEFORM_POINTS: int = 64
+
+    # 通话状态（配置 REDIS_URL 时保存在 Redis）：活跃通话最长保留时间、结束后保留时间
+    # （结束后的保留时间从写入 call_logs 成功时开始计算，写入前不过期）
+    CALL_STATE_TTL_SECONDS: int = 6 * 3600
+    CALL_STATE_ENDED_TTL_SECONDS: int = 300
+    # 结束的通话写入 call_logs 失败（或进程退出未写入）时，由超时调度按该间隔重试
+    CALL_PERSIST_RETRY_SECONDS: int = 30
+    # 通话超时调度：振铃超时置为 missed；按周期检查参与者在线状态，全部断线则结束（0 关闭）
+    CALL_RING_TIMEOUT_SECONDS: int = 45
+    CALL_PRESENCE_CHECK_SECONDS: int = 30
+    CALL_SWEEP_INTERVAL_SECONDS: float = 1.0
+    CALL_SWEEP_BATCH_SIZE: int = 100
 
     # STUN/TURN Settings
     STUN_SERVERS: str = "stun:stun.l.google.com:19302"
@@ -55,6 +128,9 @@ class Settings(BaseSettings):
     TURN_USERNAME: str | None = None
     TURN_PASSWORD: str | None = None
     TURN_CREDENTIAL_TTL: int = 300  # 5 minutes
+    # 多个TURN服务器，逗号分隔，每项 host:port|region|weight（配置后忽略 TURN_SERVER）
+    TURN_SERVERS: str = ""
+    TURN_CREDENTIAL_CACHE_SIZE: int = 10000
 
     class Config:
         env_file = ".env"
@@ -1,10 +1,18 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any
+import contextvars
+from typing import Any, Callable, TypeVar
 
 from .pubsub import pubsub
 
+T = TypeVar("T")
+
+# run_sync 调用方所在的事件循环（asyncio.to_thread 会把上下文复制到工作线程）
+_caller_loop: contextvars.ContextVar[asyncio.AbstractEventLoop | None] = (
+    contextvars.ContextVar("caller_loop", default=None)
+)
+
 
 async def publish_event(channel: str, payload: Any) -> None:
     await pubsub.publish(channel, payload)
@@ -14,5 +22,22 @@ def publish_event_async(channel: str, payload: Any) -> None:
     try:
         loop = asyncio.get_running_loop()
         loop.create_task(pubsub.publish(channel, payload))
+        return
     except RuntimeError:
+        pass
+    loop = _caller_loop.get()
+    if loop is not None and loop.is_running():
+        # 工作线程中：交回调用方的事件循环发布（pubsub 连接与队列属于该循环）
+        asyncio.run_coroutine_threadsafe(pubsub.publish(channel, payload), loop)
+    else:
         asyncio.run(pubsub.publish(channel, payload))
+
+
+async def run_sync(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在线程池中执行同步数据库操作，避免阻塞事件循环；
+    其间 publish_event_async 发布的事件回到当前事件循环发送"""
+    token = _caller_loop.set(asyncio.get_running_loop())
+    try:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    finally:
+        _caller_loop.reset(token)
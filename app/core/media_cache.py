@@ -0,0 +1,192 @@
+"""
+媒体下载URL缓存
+缓存 (会话, media_id) -> 对象元数据 与 预签名下载URL：
+- 进程内 LRU 为一级缓存，配置 REDIS_URL 时 Redis 为共享的二级缓存
+- URL 的缓存时长略短于其签名有效期，保证返回给客户端的 URL 仍有足够剩余时间
+- 元数据单独缓存，URL 过期后重新签名无需再次 stat 对象
+- 失效通过 pub/sub 广播，各 worker 同时清除进程内缓存
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .config import settings
+from .pubsub import pubsub
+from .serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+_redis_client = None
+if settings.REDIS_URL and settings.MEDIA_URL_CACHE_REDIS:
+    try:
+        from redis import asyncio as aioredis  # type: ignore
+
+        _redis_client = aioredis.from_url(settings.REDIS_URL)
+    except Exception:  # pragma: no cover
+        _redis_client = None
+
+_INVALIDATE_CHANNEL = "media:cache:invalidate"
+
+
+class _LRU:
+    """带过期时间的定长 LRU"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.time():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+
+
+class MediaURLCache:
+    """媒体元数据与下载URL的两级缓存"""
+
+    def __init__(
+        self,
+        max_entries: int = settings.MEDIA_URL_CACHE_SIZE,
+        url_ttl: int = settings.MEDIA_URL_EXPIRE_SECONDS
+        - settings.MEDIA_URL_CACHE_MARGIN_SECONDS,
+        metadata_ttl: int = settings.MEDIA_METADATA_CACHE_TTL_SECONDS,
+        redis_client=_redis_client,
+    ):
+        self.url_ttl = max(0, url_ttl)
+        self.metadata_ttl = max(0, metadata_ttl)
+        self._local = _LRU(max_entries)
+        self._redis = redis_client
+        self._listener: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(kind: str, conversation_id: str, media_id: str) -> str:
+        return f"media:{kind}:{conversation_id}:{media_id}"
+
+    async def _get(self, key: str) -> Optional[Any]:
+        value = self._local.get(key)
+        if value is not None or self._redis is None:
+            return value
+        try:
+            raw = await self._redis.get(key)
+            if raw is None:
+                return None
+            expires_at, value = loads(raw)
+        except Exception as e:
+            logger.debug(f"Media cache redis get failed: {e}")
+            return None
+        # 回填本地缓存，保持与 Redis 相同的过期时间
+        self._local.set(key, value, expires_at)
+        return value
+
+    async def _set(self, key: str, value: Any, ttl: int) -> None:
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self._local.set(key, value, expires_at)
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(key, dumps([expires_at, value]), ex=ttl)
+        except Exception as e:
+            logger.debug(f"Media cache redis set failed: {e}")
+
+    async def get_metadata(
+        self, conversation_id: str, media_id: str
+    ) -> Optional[Dict[str, Any]]:
+        return await self._get(self._key("meta", conversation_id, media_id))
+
+    async def set_metadata(
+        self, conversation_id: str, media_id: str, metadata: Dict[str, Any]
+    ) -> None:
+        await self._set(
+            self._key("meta", conversation_id, media_id), metadata, self.metadata_ttl
+        )
+
+    async def get_download(
+        self, conversation_id: str, media_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """返回 {"download_url", "expires_at"}"""
+        return await self._get(self._key("url", conversation_id, media_id))
+
+    async def set_download(
+        self, conversation_id: str, media_id: str, download_url: str, expires_at: str
+    ) -> None:
+        await self._set(
+            self._key("url", conversation_id, media_id),
+            {"download_url": download_url, "expires_at": expires_at},
+            self.url_ttl,
+        )
+
+    def _drop_local(self, conversation_id: str, media_id: str) -> list[str]:
+        keys = [self._key(kind, conversation_id, media_id) for kind in ("meta", "url")]
+        for key in keys:
+            self._local.pop(key)
+        return keys
+
+    async def invalidate(self, conversation_id: str, media_id: str) -> None:
+        keys = self._drop_local(conversation_id, media_id)
+        if self._redis is not None:
+            try:
+                await self._redis.delete(*keys)
+            except Exception as e:
+                logger.debug(f"Media cache redis delete failed: {e}")
+        # 其他 worker 的进程内缓存由各自的监听任务清除
+        try:
+            await pubsub.publish(
+                _INVALIDATE_CHANNEL,
+                {"conversation_id": conversation_id, "media_id": media_id},
+            )
+        except Exception as e:
+            logger.warning(f"Media cache invalidation publish failed: {e}")
+
+    async def _listen(self) -> None:
+        queue = await pubsub.subscribe(_INVALIDATE_CHANNEL)
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                _, data = item
+                if isinstance(data, dict):
+                    self._drop_local(
+                        str(data.get("conversation_id")), str(data.get("media_id"))
+                    )
+        finally:
+            await pubsub.unsubscribe(_INVALIDATE_CHANNEL, queue)
+
+    def start(self) -> None:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+
+# 全局媒体URL缓存实例
+media_url_cache = MediaURLCache()
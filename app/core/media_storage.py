@@ -5,21 +5,32 @@
 
 from __future__ import annotations
 
+import asyncio
+import base64
+import functools
 import hashlib
+import io
 import mimetypes
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, Callable, TypeVar
 
+import urllib3
 from minio import Minio
 from minio.error import S3Error
-from minio.commonconfig import ENABLED
+from minio.commonconfig import ENABLED, CopySource
+from minio.datatypes import Part
 from minio.versioningconfig import VersioningConfig
 
 from .config import settings
+from .media_cache import MediaURLCache, media_url_cache
+from .security import media_family
 
 import magic
 
+T = TypeVar("T")
+
 
 class MediaStorageError(Exception):
     """媒体存储相关异常"""
@@ -27,6 +38,65 @@ class MediaStorageError(Exception):
     pass
 
 
+class RangedObjectReader(io.RawIOBase):
+    """
+    基于 Range 请求的只读文件对象
+    fetch(offset, length) 返回对象对应区间的字节；内部只保留一个读窗口，
+    供 mutagen 等按需 seek/read 的解析器使用，内存占用与对象大小无关
+    """
+
+    def __init__(self, fetch: Callable[[int, int], bytes], size: int, window: int):
+        self._fetch = fetch
+        self._size = size
+        self._window = max(1, window)
+        self._pos = 0
+        self._buf_start = 0
+        self._buf = b""
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b) -> int:
+        want = min(len(b), self._size - self._pos)
+        if want <= 0:
+            return 0
+        buf_end = self._buf_start + len(self._buf)
+        if not (self._buf_start <= self._pos and self._pos + want <= buf_end):
+            length = min(max(want, self._window), self._size - self._pos)
+            self._buf = self._fetch(self._pos, length)
+            self._buf_start = self._pos
+            self.requests += 1
+            self.bytes_fetched += len(self._buf)
+        start = self._pos - self._buf_start
+        chunk = self._buf[start : start + want]
+        n = len(chunk)
+        b[:n] = chunk
+        self._pos += n
+        return n
+
+
 class MediaStorageService:
     """媒体文件存储服务"""
 
@@ -40,6 +110,9 @@ class MediaStorageService:
                 access_key=settings.MINIO_ACCESS_KEY,
                 secret_key=settings.MINIO_SECRET_KEY,
                 secure=settings.MINIO_SECURE,
+                # 指定区域后预签名为纯本地计算，无需查询桶所在区域
+                region=settings.MINIO_REGION or None,
+                http_client=self._build_http_client(),
             )
             self._ensure_bucket_exists()
             self.enabled = True
@@ -47,6 +120,18 @@ class MediaStorageService:
             print(f"Warning: MinIO connection failed: {e}")
             print("Media storage will be disabled.")
 
+    @staticmethod
+    def _build_http_client() -> urllib3.PoolManager:
+        """连接池与线程池大小一致，并设置套接字超时（默认客户端读超时为 5 分钟）"""
+        timeout = settings.MEDIA_STORAGE_TIMEOUT_SECONDS
+        return urllib3.PoolManager(
+            maxsize=settings.MEDIA_STORAGE_MAX_WORKERS,
+            timeout=urllib3.Timeout(connect=timeout, read=timeout),
+            retries=urllib3.Retry(
+                total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]
+            ),
+        )
+
     def _ensure_bucket_exists(self):
         """确保存储桶存在"""
         if not self.client:
@@ -76,35 +161,24 @@ class MediaStorageService:
 
         return True
 
+    @staticmethod
     def validate_file_content(
-        self, file_data: bytes, expected_content_type: str
+        file_data: bytes, expected_content_type: str
     ) -> Tuple[bool, str]:
-        """验证文件内容实际类型"""
+        """验证文件内容实际类型（只需文件头，传入完整内容时也只检测头部）"""
         try:
             # 使用python-magic检测真实文件类型
-            actual_mime = magic.from_buffer(file_data, mime=True)
+            actual_mime = magic.from_buffer(
+                file_data[: settings.MEDIA_SNIFF_BYTES], mime=True
+            )
 
-            # 检查是否匹配声明的类型
-            if not actual_mime.startswith("audio/"):
+            # 按容器族比较声明类型与检测类型（WebM 可能被识别为 video/webm）
+            actual_family = media_family(actual_mime)
+            if actual_family is None and not actual_mime.startswith("audio/"):
                 return False, f"File content is not audio, detected: {actual_mime}"
 
-            # 允许的音频格式映射
-            audio_formats = {
-                "audio/mpeg": ["audio/mpeg"],
-                "audio/wav": ["audio/wav", "audio/x-wav"],
-                "audio/ogg": ["audio/ogg"],
-                "audio/mp4": ["audio/mp4", "audio/x-m4a"],
-                "audio/webm": ["audio/webm"],
-                "audio/aac": ["audio/aac", "audio/x-aac"],
-            }
-
-            # 检查实际类型是否在允许范围内
-            for declared_type, allowed_actuals in audio_formats.items():
-                if (
-                    expected_content_type == declared_type
-                    and actual_mime in allowed_actuals
-                ):
-                    return True, actual_mime
+            if actual_family and actual_family == media_family(expected_content_type):
+                return True, actual_mime
 
             return (
                 False,
@@ -114,20 +188,69 @@ class MediaStorageService:
         except Exception as e:
             return False, f"Failed to validate file content: {e}"
 
+    def _fetch_range(self, object_key: str, offset: int, length: int) -> bytes:
+        response = self.client.get_object(
+            self.bucket_name, object_key, offset=offset, length=length
+        )
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def open_ranged(self, object_key: str, size: int) -> RangedObjectReader:
+        """以 Range 请求方式打开对象"""
+        return RangedObjectReader(
+            functools.partial(self._fetch_range, object_key),
+            size,
+            settings.MEDIA_RANGED_READ_WINDOW,
+        )
+
+    def validate_object_content(
+        self, media_id: str, conversation_id: str, expected_content_type: str
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """
+        校验已上传对象的实际内容：文件头做类型检测，音频元数据通过 Range 读取解析，
+        不下载整个对象
+        """
+        from .security import ContentValidation
+
+        object_key = self.build_object_key(conversation_id, media_id)
+        try:
+            stat = self.client.stat_object(self.bucket_name, object_key)
+            reader = self.open_ranged(object_key, stat.size)
+            result = ContentValidation.validate_media_stream(
+                reader, stat.size, expected_content_type
+            )
+        except S3Error as e:
+            return False, {"issues": [f"Failed to read object: {e}"]}
+
+        ok, detail = self.validate_file_content(
+            result.pop("header", b""), expected_content_type
+        )
+        if not ok:
+            result["valid"] = False
+            result["issues"].append(detail)
+        return result["valid"] and not result["issues"], result
+
+    @staticmethod
+    def build_object_key(conversation_id: str, media_id: str) -> str:
+        """媒体对象在存储桶中的键"""
+        return f"conversations/{conversation_id}/media/{media_id}"
+
+    @staticmethod
+    def build_blob_key(sha256: str) -> str:
+        """内容寻址存储中按 SHA256 命名的对象键"""
+        sha256 = sha256.lower()
+        return f"blobs/{sha256[:2]}/{sha256}"
+
     def generate_media_id(self) -> str:
         """生成媒体文件ID"""
         return f"media_{uuid.uuid4().hex}"
 
-    def generate_upload_token(
-        self,
-        conversation_id: str,
-        filename: str,
-        content_type: str,
-        file_size: int,
-        user_id: str,
-    ) -> Dict[str, Any]:
-        """生成文件上传令牌和预签名URL"""
-
+    def _check_upload_allowed(
+        self, content_type: str, filename: str, file_size: int
+    ) -> None:
         if not self.enabled or not self.client:
             raise MediaStorageError("Media storage is not available")
 
@@ -141,16 +264,39 @@ class MediaStorageService:
                 f"File size {file_size} exceeds limit {settings.MEDIA_MAX_FILE_SIZE}"
             )
 
+    def generate_upload_token(
+        self,
+        conversation_id: str,
+        filename: str,
+        content_type: str,
+        file_size: int,
+        user_id: str,
+        file_hash: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        生成文件上传令牌和预签名URL
+        file_hash 为客户端声明的 SHA256（hex），会签入上传URL，由对象存储在写入时校验
+        """
+
+        self._check_upload_allowed(content_type, filename, file_size)
+
         # 生成媒体ID和对象键
         media_id = self.generate_media_id()
-        object_key = f"conversations/{conversation_id}/media/{media_id}"
+        object_key = self.build_object_key(conversation_id, media_id)
 
         # 生成预签名上传URL
+        extra_query_params = None
+        if file_hash:
+            extra_query_params = {
+                "x-amz-checksum-sha256": self._sha256_hex_to_b64(file_hash)
+            }
         try:
-            upload_url = self.client.presigned_put_object(
-                bucket_name=self.bucket_name,
-                object_name=object_key,
+            upload_url = self.client.get_presigned_url(
+                "PUT",
+                self.bucket_name,
+                object_key,
                 expires=timedelta(seconds=settings.MEDIA_URL_EXPIRE_SECONDS),
+                extra_query_params=extra_query_params,
             )
         except S3Error as e:
             raise MediaStorageError(f"Failed to generate upload URL: {e}")
@@ -177,9 +323,125 @@ class MediaStorageService:
             ).isoformat(),
         }
 
-    def generate_download_url(self, media_id: str, conversation_id: str) -> str:
-        """生成文件下载URL"""
-        object_key = f"conversations/{conversation_id}/media/{media_id}"
+    # --- 分段上传 ---
+    # minio 7.2 未公开分段上传接口，这里使用其内部方法（与 put_object 内部实现一致）
+
+    def initiate_multipart_upload(
+        self,
+        conversation_id: str,
+        filename: str,
+        content_type: str,
+        file_size: int,
+    ) -> Dict[str, Any]:
+        """创建分段上传，返回 media_id / object_key / upload_id / 分段信息"""
+        self._check_upload_allowed(content_type, filename, file_size)
+
+        part_size = max(settings.MEDIA_MULTIPART_PART_SIZE, 5 * 1024 * 1024)
+        media_id = self.generate_media_id()
+        object_key = self.build_object_key(conversation_id, media_id)
+        try:
+            upload_id = self.client._create_multipart_upload(
+                self.bucket_name, object_key, {"Content-Type": content_type}
+            )
+        except S3Error as e:
+            raise MediaStorageError(f"Failed to initiate multipart upload: {e}")
+
+        return {
+            "media_id": media_id,
+            "object_key": object_key,
+            "upload_id": upload_id,
+            "part_size": part_size,
+            "part_count": max(1, -(-file_size // part_size)),
+            "expires_at": (
+                datetime.utcnow()
+                + timedelta(seconds=settings.MEDIA_MULTIPART_EXPIRE_SECONDS)
+            ).isoformat(),
+        }
+
+    def generate_part_urls(
+        self,
+        object_key: str,
+        upload_id: str,
+        part_numbers: list[int],
+        part_sha256: Optional[Dict[int, str]] = None,
+    ) -> Dict[int, str]:
+        """为指定分段生成预签名PUT URL；提供分段SHA256时签入URL由存储端校验"""
+        urls = {}
+        expires = timedelta(seconds=settings.MEDIA_URL_EXPIRE_SECONDS)
+        for part_number in part_numbers:
+            params = {"uploadId": upload_id, "partNumber": str(part_number)}
+            if part_sha256 and part_sha256.get(part_number):
+                params["x-amz-checksum-sha256"] = self._sha256_hex_to_b64(
+                    part_sha256[part_number]
+                )
+            try:
+                urls[part_number] = self.client.get_presigned_url(
+                    "PUT",
+                    self.bucket_name,
+                    object_key,
+                    expires=expires,
+                    extra_query_params=params,
+                )
+            except S3Error as e:
+                raise MediaStorageError(f"Failed to generate part URL: {e}")
+        return urls
+
+    def list_uploaded_parts(
+        self, object_key: str, upload_id: str
+    ) -> list[Dict[str, Any]]:
+        """列出已上传分段（断点续传）"""
+        parts = []
+        marker = None
+        try:
+            while True:
+                result = self.client._list_parts(
+                    self.bucket_name,
+                    object_key,
+                    upload_id,
+                    max_parts=1000,
+                    part_number_marker=marker,
+                )
+                parts.extend(
+                    {
+                        # minio 解析的 ListParts 结果中数值字段为字符串
+                        "part_number": int(p.part_number),
+                        "etag": (p.etag or "").strip('"'),
+                        "size": int(p.size or 0),
+                    }
+                    for p in result.parts
+                )
+                if not result.is_truncated:
+                    break
+                marker = result.next_part_number_marker
+        except S3Error as e:
+            raise MediaStorageError(f"Failed to list parts: {e}")
+        return parts
+
+    def complete_multipart_upload(
+        self, object_key: str, upload_id: str, parts: list[Dict[str, Any]]
+    ) -> None:
+        try:
+            self.client._complete_multipart_upload(
+                self.bucket_name,
+                object_key,
+                upload_id,
+                [Part(p["part_number"], p["etag"]) for p in parts],
+            )
+        except S3Error as e:
+            raise MediaStorageError(f"Failed to complete multipart upload: {e}")
+
+    def abort_multipart_upload(self, object_key: str, upload_id: str) -> bool:
+        try:
+            self.client._abort_multipart_upload(self.bucket_name, object_key, upload_id)
+            return True
+        except S3Error:
+            return False
+
+    def generate_download_url(
+        self, media_id: str, conversation_id: str, object_key: Optional[str] = None
+    ) -> str:
+        """生成文件下载URL（内容寻址的媒体传入其实际对象键）"""
+        object_key = object_key or self.build_object_key(conversation_id, media_id)
 
         try:
             download_url = self.client.presigned_get_object(
@@ -195,7 +457,7 @@ class MediaStorageService:
         self, media_id: str, conversation_id: str
     ) -> Optional[Dict[str, Any]]:
         """获取文件元数据"""
-        object_key = f"conversations/{conversation_id}/media/{media_id}"
+        object_key = self.build_object_key(conversation_id, media_id)
 
         try:
             stat = self.client.stat_object(self.bucket_name, object_key)
@@ -207,30 +469,96 @@ class MediaStorageService:
                     stat.last_modified.isoformat() if stat.last_modified else None
                 ),
                 "etag": stat.etag,
-                "metadata": stat.metadata,
+                "metadata": dict(stat.metadata or {}),
             }
         except S3Error:
             return None
 
     def delete_file(self, media_id: str, conversation_id: str) -> bool:
         """删除文件"""
-        object_key = f"conversations/{conversation_id}/media/{media_id}"
+        object_key = self.build_object_key(conversation_id, media_id)
+
+        try:
+            self.client.remove_object(self.bucket_name, object_key)
+            return True
+        except S3Error:
+            return False
+
+    def copy_object(self, source_key: str, target_key: str) -> None:
+        """服务端复制对象，数据不经过 API 进程"""
+        try:
+            self.client.copy_object(
+                self.bucket_name, target_key, CopySource(self.bucket_name, source_key)
+            )
+        except S3Error as e:
+            raise MediaStorageError(f"Failed to copy object: {e}")
 
+    def remove_object(self, object_key: str) -> bool:
         try:
             self.client.remove_object(self.bucket_name, object_key)
             return True
         except S3Error:
             return False
 
+    @staticmethod
+    def _sha256_hex_to_b64(value: str) -> str:
+        """S3 校验和头使用 base64 编码的摘要"""
+        try:
+            return base64.b64encode(bytes.fromhex(value)).decode("ascii")
+        except ValueError:
+            raise MediaStorageError("Invalid SHA256 hash")
+
+    def _stored_checksum_sha256(self, object_key: str) -> Optional[str]:
+        """读取对象写入时由存储端校验并保存的 SHA256（base64），未保存时返回 None"""
+        # minio 7.2 的 stat_object 不支持自定义请求头，这里直接发送带 checksum-mode 的 HEAD
+        response = self.client._execute(
+            "HEAD",
+            self.bucket_name,
+            object_key,
+            headers={"x-amz-checksum-mode": "ENABLED"},
+        )
+        checksum = response.headers.get("x-amz-checksum-sha256")
+        # 分段上传的对象是各段校验和的组合值（带 "-N" 后缀），不是整个对象的 SHA256
+        if checksum and "-" in checksum:
+            return None
+        return checksum
+
+    def _stream_sha256(self, object_key: str) -> str:
+        """分块读取对象计算 SHA256，内存占用与对象大小无关"""
+        digest = hashlib.sha256()
+        response = self.client.get_object(self.bucket_name, object_key)
+        try:
+            for chunk in response.stream(settings.MEDIA_VERIFY_CHUNK_SIZE):
+                digest.update(chunk)
+        finally:
+            response.close()
+            response.release_conn()
+        return digest.hexdigest()
+
+    def verify_content_hash(self, object_key: str, expected_hash: str) -> bool:
+        """确认对象内容的 SHA256（存储端校验和或流式计算），不接受仅 MD5 的校验"""
+        try:
+            stored_checksum = self._stored_checksum_sha256(object_key)
+            if stored_checksum:
+                return stored_checksum == self._sha256_hex_to_b64(expected_hash)
+            return self._stream_sha256(object_key) == expected_hash.lower()
+        except S3Error:
+            return False
+
     def verify_upload_integrity(
         self,
         media_id: str,
         conversation_id: str,
         expected_hash: str,
         expected_size: int,
+        expected_md5: Optional[str] = None,
     ) -> Tuple[bool, Optional[str]]:
-        """验证上传文件的完整性"""
-        object_key = f"conversations/{conversation_id}/media/{media_id}"
+        """
+        验证上传文件的完整性
+        优先使用存储端保存的 SHA256 校验和；单段上传且客户端提供 MD5 时比较 ETag；
+        均不可用时才流式下载对象重新计算
+        """
+        object_key = self.build_object_key(conversation_id, media_id)
 
         try:
             # 获取文件信息
@@ -243,14 +571,24 @@ class MediaStorageService:
                     f"Size mismatch: expected {expected_size}, got {stat.size}",
                 )
 
-            # 获取文件内容计算哈希
-            response = self.client.get_object(self.bucket_name, object_key)
-            file_data = response.read()
-            response.close()
-
-            # 计算SHA256哈希
-            actual_hash = hashlib.sha256(file_data).hexdigest()
-            if actual_hash != expected_hash:
+            stored_checksum = self._stored_checksum_sha256(object_key)
+            if stored_checksum:
+                if stored_checksum != self._sha256_hex_to_b64(expected_hash):
+                    return False, "Hash mismatch: stored checksum differs"
+                return True, None
+
+            # 单段上传的 ETag 即内容 MD5（分段上传的 ETag 带 "-N" 后缀）
+            etag = (stat.etag or "").strip('"')
+            if expected_md5 and etag and "-" not in etag:
+                if etag.lower() != expected_md5.lower():
+                    return (
+                        False,
+                        f"MD5 mismatch: expected {expected_md5}, got {etag}",
+                    )
+                return True, None
+
+            actual_hash = self._stream_sha256(object_key)
+            if actual_hash != expected_hash.lower():
                 return (
                     False,
                     f"Hash mismatch: expected {expected_hash}, got {actual_hash}",
@@ -262,5 +600,203 @@ class MediaStorageService:
             return False, f"Failed to verify upload: {e}"
 
 
+class AsyncMediaStorage:
+    """
+    MediaStorageService 的异步接口
+    同步 MinIO 调用在有界线程池中执行，每个操作带超时，超时抛出 MediaStorageError
+    """
+
+    def __init__(
+        self,
+        storage: MediaStorageService,
+        cache: Optional[MediaURLCache] = None,
+        max_workers: int = settings.MEDIA_STORAGE_MAX_WORKERS,
+        timeout: float = settings.MEDIA_STORAGE_TIMEOUT_SECONDS,
+    ):
+        self.storage = storage
+        self.cache = cache
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="media-io"
+        )
+        # 流式完整性校验使用独立线程池：线程数即并发上限（内存上限约为 并发数 x 分块大小），
+        # 排队或超时未结束的校验不会占用签名、stat、下载等常规调用的线程
+        self._verify_executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.MEDIA_VERIFY_MAX_CONCURRENT),
+            thread_name_prefix="media-verify",
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.storage.enabled
+
+    async def _run(
+        self,
+        func: Callable[..., T],
+        *args,
+        timeout: Optional[float] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+        **kwargs,
+    ) -> T:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            executor or self._executor, functools.partial(func, *args, **kwargs)
+        )
+        try:
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise MediaStorageError(
+                f"Media storage operation {func.__name__} timed out"
+            )
+
+    async def generate_upload_token(self, **kwargs) -> Dict[str, Any]:
+        return await self._run(self.storage.generate_upload_token, **kwargs)
+
+    async def generate_download_url(
+        self, media_id: str, conversation_id: str, object_key: Optional[str] = None
+    ) -> str:
+        if settings.MINIO_REGION:
+            # 已知区域时签名不涉及网络请求，直接在当前线程计算
+            return self.storage.generate_download_url(
+                media_id, conversation_id, object_key
+            )
+        return await self._run(
+            self.storage.generate_download_url, media_id, conversation_id, object_key
+        )
+
+    async def get_file_metadata(
+        self, media_id: str, conversation_id: str
+    ) -> Optional[Dict[str, Any]]:
+        if self.cache is not None:
+            cached = await self.cache.get_metadata(conversation_id, media_id)
+            if cached is not None:
+                return cached
+        metadata = await self._run(
+            self.storage.get_file_metadata, media_id, conversation_id
+        )
+        if metadata is not None and self.cache is not None:
+            await self.cache.set_metadata(conversation_id, media_id, metadata)
+        return metadata
+
+    async def get_download_url(
+        self, media_id: str, conversation_id: str, object_key: Optional[str] = None
+    ) -> Dict[str, str]:
+        """返回 {"download_url", "expires_at"}，优先使用缓存中仍有效的URL"""
+        if self.cache is not None:
+            cached = await self.cache.get_download(conversation_id, media_id)
+            if cached is not None:
+                return cached
+        expires_at = (
+            datetime.utcnow() + timedelta(seconds=settings.MEDIA_URL_EXPIRE_SECONDS)
+        ).isoformat()
+        download_url = await self.generate_download_url(
+            media_id, conversation_id, object_key
+        )
+        if self.cache is not None:
+            await self.cache.set_download(
+                conversation_id, media_id, download_url, expires_at
+            )
+        return {"download_url": download_url, "expires_at": expires_at}
+
+    async def delete_file(self, media_id: str, conversation_id: str) -> bool:
+        if self.cache is not None:
+            await self.cache.invalidate(conversation_id, media_id)
+        return await self._run(self.storage.delete_file, media_id, conversation_id)
+
+    async def copy_object(self, source_key: str, target_key: str) -> None:
+        await self._run(self.storage.copy_object, source_key, target_key)
+
+    async def remove_object(self, object_key: str) -> bool:
+        return await self._run(self.storage.remove_object, object_key)
+
+    async def initiate_multipart_upload(self, **kwargs) -> Dict[str, Any]:
+        return await self._run(self.storage.initiate_multipart_upload, **kwargs)
+
+    async def generate_part_urls(
+        self,
+        object_key: str,
+        upload_id: str,
+        part_numbers: list[int],
+        part_sha256: Optional[Dict[int, str]] = None,
+    ) -> Dict[int, str]:
+        if settings.MINIO_REGION:
+            # 与下载URL相同，已知区域时签名为纯本地计算
+            return self.storage.generate_part_urls(
+                object_key, upload_id, part_numbers, part_sha256
+            )
+        return await self._run(
+            self.storage.generate_part_urls,
+            object_key,
+            upload_id,
+            part_numbers,
+            part_sha256,
+        )
+
+    async def list_uploaded_parts(
+        self, object_key: str, upload_id: str
+    ) -> list[Dict[str, Any]]:
+        return await self._run(self.storage.list_uploaded_parts, object_key, upload_id)
+
+    async def complete_multipart_upload(
+        self, object_key: str, upload_id: str, parts: list[Dict[str, Any]]
+    ) -> None:
+        await self._run(
+            self.storage.complete_multipart_upload, object_key, upload_id, parts
+        )
+
+    async def abort_multipart_upload(self, object_key: str, upload_id: str) -> bool:
+        return await self._run(
+            self.storage.abort_multipart_upload, object_key, upload_id
+        )
+
+    async def validate_object_content(
+        self, media_id: str, conversation_id: str, expected_content_type: str
+    ) -> Tuple[bool, Dict[str, Any]]:
+        return await self._run(
+            self.storage.validate_object_content,
+            media_id,
+            conversation_id,
+            expected_content_type,
+        )
+
+    async def verify_content_hash(self, object_key: str, expected_hash: str) -> bool:
+        return await self._run(
+            self.storage.verify_content_hash,
+            object_key,
+            expected_hash,
+            timeout=settings.MEDIA_STORAGE_VERIFY_TIMEOUT_SECONDS,
+            executor=self._verify_executor,
+        )
+
+    async def invalidate(self, media_id: str, conversation_id: str) -> None:
+        if self.cache is not None:
+            await self.cache.invalidate(conversation_id, media_id)
+
+    async def verify_upload_integrity(
+        self,
+        media_id: str,
+        conversation_id: str,
+        expected_hash: str,
+        expected_size: int,
+        expected_md5: Optional[str] = None,
+    ) -> Tuple[bool, Optional[str]]:
+        return await self._run(
+            self.storage.verify_upload_integrity,
+            media_id,
+            conversation_id,
+            expected_hash,
+            expected_size,
+            expected_md5,
+            timeout=settings.MEDIA_STORAGE_VERIFY_TIMEOUT_SECONDS,
+            executor=self._verify_executor,
+        )
+
+    def shutdown(self) -> None:
+        """关闭线程池（不等待仍在执行的调用）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._verify_executor.shutdown(wait=False, cancel_futures=True)
+
+
 # 全局媒体存储服务实例
 media_storage = MediaStorageService()
+async_media_storage = AsyncMediaStorage(media_storage, cache=media_url_cache)
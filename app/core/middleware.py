@@ -0,0 +1,119 @@
+"""
+HTTP 网关中间件（纯 ASGI）
+在一层内完成限流、安全头注入、耗时统计与 Prometheus 记录，
+取代原先的四层 BaseHTTPMiddleware（每层都要额外创建任务并转接响应流）；
+WebSocket 等非 HTTP 连接直接透传
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import time
+from typing import Optional
+
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .monitoring import UNMATCHED_ROUTE, MetricsCollector, performance_monitor
+from .ratelimit import RateLimiter, is_exempt, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# 安全头（预先编码，逐请求只做列表拼接）
+_SECURITY_HEADERS = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+)
+_HSTS_HEADER = (b"strict-transport-security", b"max-age=31536000; includeSubDomains")
+# 跨域请求的默认 CORS 头；已由 CORSMiddleware 按配置设置时不覆盖
+# 在生产环境中应该配置具体的允许域名
+_CORS_HEADERS = (
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET, POST, PUT, DELETE, OPTIONS"),
+    (b"access-control-allow-headers", b"Authorization, Content-Type"),
+)
+
+
+class GatewayMiddleware:
+    """限流 + 安全头 + 耗时/指标记录"""
+
+    def __init__(self, app: ASGIApp, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        method = scope["method"]
+        path = scope["path"]
+        authorization = None
+        cross_origin = False
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+            elif name == b"origin":
+                cross_origin = True
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.extend(_SECURITY_HEADERS)
+                if scope.get("scheme") == "https":
+                    headers.append(_HSTS_HEADER)
+                if cross_origin and not any(
+                    k == b"access-control-allow-origin" for k, _ in headers
+                ):
+                    headers.extend(_CORS_HEADERS)
+                headers.append(
+                    (
+                        b"x-process-time",
+                        str(time.perf_counter() - start).encode("latin-1"),
+                    )
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            if not is_exempt(path):
+                client = scope.get("client")
+                key = self.limiter.identify(
+                    authorization, client[0] if client else "unknown"
+                )
+                allowed, retry_after = await self.limiter.acquire(
+                    key, self.limiter.route_cost(method, path)
+                )
+                if not allowed:
+                    response = Response(
+                        status_code=429,
+                        content="rate limit exceeded",
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                    )
+                    await response(scope, receive, send_wrapper)
+                    return
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            logger.error(f"Request failed: {e}")
+            try:
+                performance_monitor.record_error(type(e).__name__)
+            except Exception:
+                pass
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            # 路由匹配后 FastAPI 在 scope 中写入 route，按其路径模板记录
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            # 不让监控失败影响正常请求
+            try:
+                MetricsCollector.record_request(method, route, duration, status)
+                performance_monitor.record_request_time(duration, route)
+            except Exception:
+                pass
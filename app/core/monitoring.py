@@ -1,9 +1,14 @@
 """监控和健康检查"""
 
+import asyncio
+import glob
+import math
+import os
+import threading
 import time
+from array import array
 import psutil
-from typing import Dict, Any
-from fastapi import Request
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy import text
 from prometheus_client import (
     Counter,
@@ -11,16 +16,26 @@ from prometheus_client import (
     Gauge,
     generate_latest,
     CollectorRegistry,
+    multiprocess,
 )
+from prometheus_client.core import Metric
 import logging
 
-from .database import get_db
+from . import seq
+from .database import engine
 from .config import settings
+from .serialization import dumps_str, loads
 
 # 创建自定义注册表避免冲突
 CUSTOM_REGISTRY = CollectorRegistry()
 
+# gunicorn 多 worker 时设置该目录：各进程的指标写入其中的 mmap 文件，
+# /metrics 汇总所有进程（见 gunicorn.conf.py）；需在导入 prometheus_client 前设置
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
 # Prometheus metrics
+# HTTP 请求按路由模板（如 /api/aiim/messages/{message_id}）记录，未匹配路由的请求
+# 归入 UNMATCHED_ROUTE，标签基数与路由数量相当
 REQUEST_COUNT = Counter(
     "aiim_http_requests_total",
     "Total HTTP requests",
@@ -37,6 +52,7 @@ ACTIVE_CONNECTIONS = Gauge(
     "aiim_websocket_connections_active",
     "Active WebSocket connections",
     registry=CUSTOM_REGISTRY,
+    multiprocess_mode="livesum",
 )
 MESSAGE_COUNT = Counter(
     "aiim_messages_total",
@@ -47,6 +63,72 @@ MESSAGE_COUNT = Counter(
 CALL_COUNT = Counter(
     "aiim_calls_total", "Total calls processed", ["status"], registry=CUSTOM_REGISTRY
 )
+WS_FRAME_DURATION = Histogram(
+    "aiim_ws_frame_handle_seconds",
+    "WebSocket frame handling duration",
+    ["frame_type"],
+    registry=CUSTOM_REGISTRY,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+WS_FRAMES_RECEIVED = Counter(
+    "aiim_ws_frames_received_total",
+    "WebSocket frames received",
+    ["frame_type"],
+    registry=CUSTOM_REGISTRY,
+)
+WS_FRAMES_SENT = Counter(
+    "aiim_ws_frames_sent_total",
+    "WebSocket frames sent",
+    ["frame_type"],
+    registry=CUSTOM_REGISTRY,
+)
+WS_SUBSCRIBE_COUNT = Counter(
+    "aiim_ws_subscribe_total",
+    "WebSocket conversation subscribe requests",
+    ["result"],
+    registry=CUSTOM_REGISTRY,
+)
+WS_SUBSCRIPTIONS_ACTIVE = Gauge(
+    "aiim_ws_subscriptions_active",
+    "Active WebSocket conversation subscriptions",
+    registry=CUSTOM_REGISTRY,
+    multiprocess_mode="livesum",
+)
+WS_OUTBOUND_QUEUED = Gauge(
+    "aiim_ws_outbound_queued_frames",
+    "Frames waiting in WebSocket outbound queues",
+    registry=CUSTOM_REGISTRY,
+    multiprocess_mode="livesum",
+)
+WS_PUBLISH_TO_WRITE = Histogram(
+    "aiim_ws_publish_to_write_seconds",
+    "Latency from pubsub enqueue to WebSocket write",
+    registry=CUSTOM_REGISTRY,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+WS_DISCONNECTS = Counter(
+    "aiim_ws_disconnects_total",
+    "WebSocket disconnects by reason",
+    ["reason"],
+    registry=CUSTOM_REGISTRY,
+)
+WS_CONNECTION_LIFETIME = Histogram(
+    "aiim_ws_connection_lifetime_seconds",
+    "WebSocket connection lifetime",
+    registry=CUSTOM_REGISTRY,
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 4 * 3600, 12 * 3600, 24 * 3600),
+)
+MEDIA_GC_DELETED_OBJECTS = Counter(
+    "aiim_media_gc_deleted_objects_total",
+    "Object versions deleted by media garbage collection",
+    ["kind"],
+    registry=CUSTOM_REGISTRY,
+)
+MEDIA_GC_RECLAIMED_BYTES = Counter(
+    "aiim_media_gc_reclaimed_bytes_total",
+    "Bytes reclaimed by media garbage collection",
+    registry=CUSTOM_REGISTRY,
+)
 DB_QUERY_DURATION = Histogram(
     "aiim_db_query_duration_seconds",
     "Database query duration",
@@ -59,33 +141,48 @@ SYSTEM_CPU_USAGE = Gauge(
     "aiim_system_cpu_usage_percent",
     "System CPU usage percentage",
     registry=CUSTOM_REGISTRY,
+    multiprocess_mode="mostrecent",
 )
 SYSTEM_MEMORY_USAGE = Gauge(
     "aiim_system_memory_usage_percent",
     "System memory usage percentage",
     registry=CUSTOM_REGISTRY,
+    multiprocess_mode="mostrecent",
 )
 SYSTEM_DISK_USAGE = Gauge(
     "aiim_system_disk_usage_percent",
     "System disk usage percentage",
     registry=CUSTOM_REGISTRY,
+    multiprocess_mode="mostrecent",
 )
 
+UNMATCHED_ROUTE = "<unmatched>"
+_HTTP_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+# (method, route, status) -> 预先绑定的标签子项
+_REQUEST_METRICS: Dict[Tuple[str, str, int], Tuple[Any, Any]] = {}
+
 logger = logging.getLogger(__name__)
 
 
 class HealthChecker:
-    """健康检查器"""
+    """健康检查器（复用数据库连接池与共享 Redis 客户端）"""
+
+    @staticmethod
+    def _ping_database():
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT 1")).scalar()
 
     @staticmethod
     async def check_database() -> Dict[str, Any]:
         """检查数据库连接"""
         try:
-            db = next(get_db())
             start_time = time.time()
 
-            # 执行简单查询
-            result = db.execute(text("SELECT 1")).fetchone()
+            # 同步驱动，放到线程中执行简单查询
+            result = await asyncio.wait_for(
+                asyncio.to_thread(HealthChecker._ping_database),
+                settings.HEALTH_PROBE_TIMEOUT_SECONDS,
+            )
 
             duration = time.time() - start_time
 
@@ -102,7 +199,7 @@ class HealthChecker:
             return {
                 "status": "unhealthy",
                 "response_time": None,
-                "details": f"Database connection failed: {str(e)}",
+                "details": f"Database connection failed: {str(e) or type(e).__name__}",
             }
 
     @staticmethod
@@ -114,16 +211,21 @@ class HealthChecker:
                 "response_time": None,
                 "details": "Redis not configured",
             }
+        client = seq._redis_client
+        if client is None:
+            return {
+                "status": "unhealthy",
+                "response_time": None,
+                "details": "Redis client unavailable",
+            }
 
         try:
-            import redis.asyncio as redis
-
-            r = redis.from_url(settings.REDIS_URL)
             start_time = time.time()
 
             # 执行ping命令
-            pong = await r.ping()
-            await r.close()
+            pong = await asyncio.wait_for(
+                client.ping(), settings.HEALTH_PROBE_TIMEOUT_SECONDS
+            )
 
             duration = time.time() - start_time
 
@@ -138,15 +240,15 @@ class HealthChecker:
             return {
                 "status": "unhealthy",
                 "response_time": None,
-                "details": f"Redis connection failed: {str(e)}",
+                "details": f"Redis connection failed: {str(e) or type(e).__name__}",
             }
 
     @staticmethod
     def check_system_resources() -> Dict[str, Any]:
         """检查系统资源"""
         try:
-            # CPU使用率
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # CPU使用率（自上次调用以来的平均值，不阻塞）
+            cpu_percent = psutil.cpu_percent(interval=None)
 
             # 内存使用率
             memory = psutil.virtual_memory()
@@ -180,9 +282,12 @@ class HealthChecker:
     @staticmethod
     async def comprehensive_health_check() -> Dict[str, Any]:
         """综合健康检查"""
+        database, redis = await asyncio.gather(
+            HealthChecker.check_database(), HealthChecker.check_redis()
+        )
         checks = {
-            "database": await HealthChecker.check_database(),
-            "redis": await HealthChecker.check_redis(),
+            "database": database,
+            "redis": redis,
             "system": HealthChecker.check_system_resources(),
         }
 
@@ -203,17 +308,89 @@ class HealthChecker:
         }
 
 
+class HealthSampler:
+    """后台按周期刷新健康检查结果，/health 与 /ready 直接读取快照
+
+    后台任务未运行（或快照已过期两个周期）时在请求中刷新一次，
+    并发请求共用同一次刷新。
+    """
+
+    def __init__(self, interval: float = settings.HEALTH_SAMPLE_INTERVAL_SECONDS):
+        self.interval = max(0.1, interval)
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refreshing: Optional[asyncio.Task] = None
+
+    async def _refresh(self) -> Dict[str, Any]:
+        self.snapshot = await HealthChecker.comprehensive_health_check()
+        return self.snapshot
+
+    async def refresh(self) -> Dict[str, Any]:
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh())
+        return await asyncio.shield(self._refreshing)
+
+    async def get(self) -> Dict[str, Any]:
+        """最近一次健康快照"""
+        snapshot = self.snapshot
+        if snapshot is None or time.time() - snapshot["timestamp"] > 2 * self.interval:
+            snapshot = await self.refresh()
+        return snapshot
+
+    async def ready(self) -> bool:
+        """数据库可用即视为就绪"""
+        snapshot = await self.get()
+        return snapshot["checks"]["database"]["status"] == "healthy"
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Health sampling failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        # 首次调用只建立 CPU 采样基准
+        psutil.cpu_percent(interval=None)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+
+
+# 全局健康采样实例
+health_sampler = HealthSampler()
+
+
 class MetricsCollector:
     """指标收集器"""
 
     @staticmethod
-    def record_request(request: Request, response_time: float, status_code: int):
-        """记录HTTP请求指标"""
-        method = request.method
-        endpoint = request.url.path
-
-        REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status_code).inc()
-        REQUEST_DURATION.labels(method=method, endpoint=endpoint).observe(response_time)
+    def record_request(method: str, route: str, response_time: float, status_code: int):
+        """记录HTTP请求指标（route 为路由模板）"""
+        if method not in _HTTP_METHODS:
+            method = "OTHER"
+        key = (method, route, status_code)
+        children = _REQUEST_METRICS.get(key)
+        if children is None:
+            children = (
+                REQUEST_COUNT.labels(method=method, endpoint=route, status=status_code),
+                REQUEST_DURATION.labels(method=method, endpoint=route),
+            )
+            _REQUEST_METRICS[key] = children
+        children[0].inc()
+        children[1].observe(response_time)
 
     @staticmethod
     def record_message(message_type: str):
@@ -237,50 +414,413 @@ class MetricsCollector:
 
     @staticmethod
     def get_metrics() -> str:
-        """获取Prometheus格式的指标"""
+        """获取Prometheus格式的指标（多进程模式下汇总所有 worker）"""
+        if PROMETHEUS_MULTIPROC_DIR:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            registry.register(LatencySummaryCollector(performance_monitor))
+            return generate_latest(registry)
         return generate_latest(CUSTOM_REGISTRY)
 
 
+class WSMetrics:
+    """WebSocket网关指标
+
+    标签子项在构造时预先绑定，热路径上只有字典查找与计数，
+    不做 labels() 解析，也不为每帧分配对象。
+    """
+
+    # 断开原因：WebSocket 关闭码 -> 原因标签（固定集合，控制基数）
+    CLOSE_REASONS = {
+        1000: "normal",
+        1001: "going_away",
+        1006: "abnormal",
+        1009: "message_too_big",
+        1011: "server_error",
+        4401: "unauthorized",
+    }
+
+    def __init__(self, frame_types, sent_types, other_key: str = "other"):
+        self.other_key = other_key
+        keys = set(frame_types) | {other_key}
+        sent_keys = set(sent_types) | {other_key}
+        self._received = {k: WS_FRAMES_RECEIVED.labels(frame_type=k) for k in keys}
+        self._handle = {k: WS_FRAME_DURATION.labels(frame_type=k) for k in keys}
+        self._sent = {k: WS_FRAMES_SENT.labels(frame_type=k) for k in sent_keys}
+        self._subscribe = {
+            r: WS_SUBSCRIBE_COUNT.labels(result=r) for r in ("ok", "forbidden")
+        }
+        reasons = set(self.CLOSE_REASONS.values()) | {"other", "error"}
+        self._disconnects = {r: WS_DISCONNECTS.labels(reason=r) for r in reasons}
+        self._slow_threshold = settings.WS_SLOW_FRAME_SECONDS
+
+    def frame_received(self, key: str) -> None:
+        self._received.get(key, self._received[self.other_key]).inc()
+
+    def frame_handled(self, key: str, duration: float) -> None:
+        self._handle.get(key, self._handle[self.other_key]).observe(duration)
+        if duration >= self._slow_threshold:
+            logger.warning(f"Slow WS frame: type={key}, duration={duration:.3f}s")
+
+    def frame_sent(self, frame_type: str, published_at: float | None = None) -> None:
+        self._sent.get(frame_type, self._sent[self.other_key]).inc()
+        if published_at is not None:
+            WS_PUBLISH_TO_WRITE.observe(time.time() - published_at)
+
+    def subscribed(self, ok: bool) -> None:
+        self._subscribe["ok" if ok else "forbidden"].inc()
+        if ok:
+            WS_SUBSCRIPTIONS_ACTIVE.inc()
+
+    def unsubscribed(self, count: int = 1) -> None:
+        if count:
+            WS_SUBSCRIPTIONS_ACTIVE.dec(count)
+
+    def outbound_enqueued(self) -> None:
+        WS_OUTBOUND_QUEUED.inc()
+
+    def outbound_dequeued(self, count: int = 1) -> None:
+        WS_OUTBOUND_QUEUED.dec(count)
+
+    def connection_opened(self) -> None:
+        ACTIVE_CONNECTIONS.inc()
+
+    def connection_closed(self, code: int | None, lifetime: float) -> None:
+        ACTIVE_CONNECTIONS.dec()
+        if code is None:
+            reason = "error"
+        else:
+            reason = self.CLOSE_REASONS.get(code, "other")
+        self._disconnects[reason].inc()
+        WS_CONNECTION_LIFETIME.observe(lifetime)
+
+    def rejected(self, code: int) -> None:
+        """握手阶段被拒绝（未计入活跃连接）"""
+        self._disconnects[self.CLOSE_REASONS.get(code, "other")].inc()
+
+
+class LatencyHistogram:
+    """对数分桶直方图（1µs ~ 100s）
+
+    桶边界按固定倍率增长，内存固定，分位数相对误差约 1%；
+    to_dict 只保留非空桶，便于跨进程合并。
+    """
+
+    GAMMA = 1.02
+    MIN_VALUE = 1e-6
+    BUCKETS = int(math.ceil(math.log(1e8) / math.log(GAMMA))) + 1
+    _LOG_GAMMA = math.log(GAMMA)
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self) -> None:
+        self.counts = array("q", bytes(8 * self.BUCKETS))
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        if value > self.MIN_VALUE:
+            index = min(
+                int(math.log(value / self.MIN_VALUE) / self._LOG_GAMMA),
+                self.BUCKETS - 1,
+            )
+        else:
+            index = 0
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {str(i): c for i, c in enumerate(self.counts) if c},
+        }
+
+    @classmethod
+    def merge(cls, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        buckets: Dict[str, int] = {}
+        for state in states:
+            for index, count in state["buckets"].items():
+                buckets[index] = buckets.get(index, 0) + count
+        return {
+            "count": sum(s["count"] for s in states),
+            "sum": sum(s["sum"] for s in states),
+            "min": min(s["min"] for s in states),
+            "max": max(s["max"] for s in states),
+            "buckets": buckets,
+        }
+
+    @classmethod
+    def quantiles(
+        cls, state: Dict[str, Any], qs: Tuple[float, ...]
+    ) -> Dict[float, float]:
+        """按桶的几何中点估计分位数，并限制在 [min, max] 内"""
+        result: Dict[float, float] = {}
+        if not state["count"]:
+            return result
+        ranks = [(q, q * state["count"]) for q in sorted(qs)]
+        seen = 0
+        for index, count in sorted((int(i), c) for i, c in state["buckets"].items()):
+            seen += count
+            while ranks and seen >= ranks[0][1]:
+                value = cls.MIN_VALUE * cls.GAMMA ** (index + 0.5)
+                result[ranks.pop(0)[0]] = min(max(value, state["min"]), state["max"])
+            if not ranks:
+                break
+        for q, _ in ranks:
+            result[q] = state["max"]
+        return result
+
+
+class RateWindow:
+    """最近 60 秒的请求计数：每秒一个槽位的环形数组"""
+
+    SLOTS = 60
+
+    __slots__ = ("seconds", "counts")
+
+    def __init__(self) -> None:
+        self.seconds = array("q", [-1] * self.SLOTS)
+        self.counts = array("q", bytes(8 * self.SLOTS))
+
+    def add(self, now: float) -> None:
+        second = int(now)
+        index = second % self.SLOTS
+        if self.seconds[index] != second:
+            self.seconds[index] = second
+            self.counts[index] = 0
+        self.counts[index] += 1
+
+    def to_dict(self, now: float) -> Dict[str, int]:
+        current = int(now)
+        return {
+            str(s): c
+            for s, c in zip(self.seconds, self.counts)
+            if 0 <= current - s < self.SLOTS
+        }
+
+
 class PerformanceMonitor:
-    """性能监控"""
+    """性能监控：按路由模板的延迟分位数与最近一分钟请求速率
 
-    def __init__(self):
-        self.request_times = []
-        self.error_counts = {}
-        self.start_time = time.time()
+    记录路径只做对数分桶计数（线程锁保护）；多进程模式
+    （PROMETHEUS_MULTIPROC_DIR）下各进程由后台线程每隔 dump_interval 秒把状态
+    写入 perf_{pid}.json，读取统计时合并所有进程的文件。
+    """
 
-    def record_request_time(self, duration: float):
-        """记录请求时间"""
-        self.request_times.append(duration)
+    QUANTILE_KEYS = {0.5: "p50", 0.9: "p90", 0.99: "p99", 0.999: "p999"}
+    QUANTILES = tuple(QUANTILE_KEYS)
 
-        # 只保留最近1000个请求的数据
-        if len(self.request_times) > 1000:
-            self.request_times = self.request_times[-1000:]
+    def __init__(
+        self,
+        multiproc_dir: Optional[str] = PROMETHEUS_MULTIPROC_DIR,
+        dump_interval: float = 1.0,
+    ):
+        self.start_time = time.time()
+        self.multiproc_dir = multiproc_dir
+        self.dump_interval = dump_interval
+        self._lock = threading.Lock()
+        # 写文件与记录路径分开加锁，写出期间不阻塞请求计数
+        self._dump_lock = threading.Lock()
+        self._routes: Dict[str, LatencyHistogram] = {}
+        self._rate = RateWindow()
+        self.error_counts: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    def record_request_time(self, duration: float, route: str = UNMATCHED_ROUTE):
+        """记录请求时间"""
+        now = time.time()
+        with self._lock:
+            histogram = self._routes.get(route)
+            if histogram is None:
+                histogram = self._routes[route] = LatencyHistogram()
+            histogram.record(duration)
+            self._rate.add(now)
 
     def record_error(self, error_type: str):
         """记录错误"""
-        self.error_counts[error_type] = self.error_counts.get(error_type, 0) + 1
+        with self._lock:
+            self.error_counts[error_type] = self.error_counts.get(error_type, 0) + 1
+
+    # --- 状态与多进程合并 ---
+
+    def _state(self, now: float) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "start_time": self.start_time,
+                "routes": {r: h.to_dict() for r, h in self._routes.items()},
+                "rate": self._rate.to_dict(now),
+                "errors": dict(self.error_counts),
+            }
+
+    def _dump(self, now: float) -> None:
+        path = os.path.join(self.multiproc_dir, f"perf_{os.getpid()}.json")
+        with self._dump_lock:
+            try:
+                with open(f"{path}.tmp", "w") as f:
+                    f.write(dumps_str(self._state(now)))
+                os.replace(f"{path}.tmp", path)
+            except Exception as e:
+                logger.debug(f"Failed to dump performance stats: {e}")
+
+    def flush(self) -> None:
+        """多进程模式下立即写出本进程状态"""
+        if self.multiproc_dir:
+            self._dump(time.time())
+
+    def _write_loop(self) -> None:
+        while not self._stop.wait(self.dump_interval):
+            self.flush()
+
+    def start(self) -> None:
+        """多进程模式下启动写出线程（在 worker 进程内调用）"""
+        if not self.multiproc_dir:
+            return
+        if self._writer is None or not self._writer.is_alive():
+            self._stop.clear()
+            self._writer = threading.Thread(
+                target=self._write_loop, name="perf-dump", daemon=True
+            )
+            self._writer.start()
+
+    def stop(self) -> None:
+        if self._writer is None:
+            return
+        self._stop.set()
+        self._writer.join(timeout=self.dump_interval + 1)
+        self._writer = None
+
+    def _states(self, now: float) -> List[Dict[str, Any]]:
+        states = [self._state(now)]
+        if not self.multiproc_dir:
+            return states
+        own = f"perf_{os.getpid()}.json"
+        for path in glob.glob(os.path.join(self.multiproc_dir, "perf_*.json")):
+            if os.path.basename(path) == own:
+                continue
+            try:
+                with open(path) as f:
+                    states.append(loads(f.read()))
+            except Exception:
+                continue
+        return states
+
+    def merged(self) -> Dict[str, Any]:
+        """合并所有进程：按路由的直方图、最近一分钟请求数与错误计数"""
+        now = time.time()
+        states = self._states(now)
+        routes: Dict[str, List[Dict[str, Any]]] = {}
+        errors: Dict[str, int] = {}
+        window = 0
+        current = int(now)
+        for state in states:
+            for route, histogram in state["routes"].items():
+                routes.setdefault(route, []).append(histogram)
+            for error_type, count in state["errors"].items():
+                errors[error_type] = errors.get(error_type, 0) + count
+            window += sum(
+                c
+                for s, c in state["rate"].items()
+                if 0 <= current - int(s) < RateWindow.SLOTS
+            )
+        return {
+            "routes": {r: LatencyHistogram.merge(h) for r, h in routes.items()},
+            "requests_per_minute": window,
+            "errors": errors,
+            "processes": len(states),
+        }
+
+    def _summary(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        quantiles = LatencyHistogram.quantiles(state, self.QUANTILES)
+        summary = {
+            "count": state["count"],
+            "avg": state["sum"] / state["count"],
+            "min": state["min"],
+            "max": state["max"],
+        }
+        for q, key in self.QUANTILE_KEYS.items():
+            summary[key] = quantiles[q]
+        return summary
 
     def get_stats(self) -> Dict[str, Any]:
         """获取性能统计"""
-        if not self.request_times:
+        merged = self.merged()
+        routes = {r: s for r, s in merged["routes"].items() if s["count"]}
+        if not routes:
             return {"message": "No request data available"}
 
+        overall = self._summary(LatencyHistogram.merge(list(routes.values())))
         return {
             "uptime": time.time() - self.start_time,
-            "total_requests": len(self.request_times),
-            "avg_response_time": sum(self.request_times) / len(self.request_times),
-            "min_response_time": min(self.request_times),
-            "max_response_time": max(self.request_times),
-            "error_counts": self.error_counts,
-            "requests_per_minute": len(
-                [t for t in self.request_times if time.time() - t < 60]
-            ),
+            "total_requests": overall["count"],
+            "avg_response_time": overall["avg"],
+            "min_response_time": overall["min"],
+            "max_response_time": overall["max"],
+            "latency": overall,
+            "routes": {r: self._summary(s) for r, s in sorted(routes.items())},
+            "error_counts": merged["errors"],
+            "requests_per_minute": merged["requests_per_minute"],
+            "requests_per_second": merged["requests_per_minute"] / RateWindow.SLOTS,
+            "processes": merged["processes"],
         }
 
 
+class LatencySummaryCollector:
+    """以 Prometheus summary 导出按路由的延迟分位数（多进程模式下为合并结果）"""
+
+    NAME = "aiim_http_request_latency_seconds"
+
+    def __init__(self, monitor: PerformanceMonitor):
+        self.monitor = monitor
+
+    def describe(self):
+        return [Metric(self.NAME, "HTTP request latency quantiles", "summary")]
+
+    def collect(self):
+        metric = Metric(self.NAME, "HTTP request latency quantiles", "summary")
+        for route, state in sorted(self.monitor.merged()["routes"].items()):
+            if not state["count"]:
+                continue
+            quantiles = LatencyHistogram.quantiles(state, self.monitor.QUANTILES)
+            for q, value in quantiles.items():
+                metric.add_sample(
+                    self.NAME, {"endpoint": route, "quantile": str(q)}, value
+                )
+            metric.add_sample(f"{self.NAME}_count", {"endpoint": route}, state["count"])
+            metric.add_sample(f"{self.NAME}_sum", {"endpoint": route}, state["sum"])
+        yield metric
+
+
 # 全局实例
 performance_monitor = PerformanceMonitor()
+CUSTOM_REGISTRY.register(LatencySummaryCollector(performance_monitor))
+
+
+class JSONLogFormatter(logging.Formatter):
+    """JSON日志格式（消息中的引号/换行会被正确转义）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return dumps_str(entry)
 
 
 class LoggingConfig:
@@ -299,9 +839,7 @@ class LoggingConfig:
                     "format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s (%(filename)s:%(lineno)d)"
                 },
                 "simple": {"format": "%(levelname)s: %(message)s"},
-                "json": {
-                    "format": '{"timestamp": "%(asctime)s", "level": "%(levelname)s", "logger": "%(name)s", "message": "%(message)s", "module": "%(module)s", "line": %(lineno)d}'
-                },
+                "json": {"()": "app.core.monitoring.JSONLogFormatter"},
             },
             "handlers": {
                 "console": {
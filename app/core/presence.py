@@ -0,0 +1,44 @@
+"""
+用户在线状态
+本实例的 WebSocket 连接按用户计数；其他实例上的连接通过在线路由（conn:{user_id}，
+心跳续期）判断，未使用 Redis 时只有本实例的连接
+"""
+
+from __future__ import annotations
+
+from typing import Dict
+
+from .pubsub import pubsub
+
+
+class PresenceTracker:
+    def __init__(self) -> None:
+        self._local: Dict[str, int] = {}
+
+    def connected(self, user_id: str) -> None:
+        self._local[user_id] = self._local.get(user_id, 0) + 1
+
+    def disconnected(self, user_id: str) -> None:
+        count = self._local.get(user_id, 0) - 1
+        if count > 0:
+            self._local[user_id] = count
+        else:
+            self._local.pop(user_id, None)
+
+    def is_local(self, user_id: str) -> bool:
+        return user_id in self._local
+
+    async def is_online(self, user_id: str) -> bool:
+        if user_id in self._local:
+            return True
+        if not hasattr(pubsub, "get_connection"):
+            return False
+        try:
+            return await pubsub.get_connection(user_id) is not None  # type: ignore
+        except Exception:
+            # 路由不可查时不判定为离线，避免误结束通话
+            return True
+
+
+# 全局在线状态实例
+presence = PresenceTracker()
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 from .config import settings
+from .serialization import dumps, loads
 
 try:
     from redis import asyncio as aioredis  # type: ignore
@@ -14,6 +16,29 @@ except Exception:  # pragma: no cover
     REDIS_AVAILABLE = False
 
 
+# 订阅队列中的元素为 (published_at, data)：published_at 为 publish 调用时的 time.time()
+# （Redis 模式下开启信封时跨实例传递，包含 Redis 转发耗时；跨主机时受时钟偏差影响），
+# 供网关统计“发布到写出socket”的延迟；None 为停止转发的哨兵
+
+# Redis 消息信封：{"v": 1, "ts": 发布时间, "data": 原始数据}，由 PUBSUB_ENVELOPE 开启；
+# 订阅端同时接受无信封的消息（按到达时间计），滚动升级期间新旧实例可互通
+_ENVELOPE_VERSION = 1
+
+
+def _unwrap(message: Any) -> Tuple[float, Any]:
+    if (
+        isinstance(message, dict)
+        and message.get("v") == _ENVELOPE_VERSION
+        and "ts" in message
+        and "data" in message
+    ):
+        try:
+            return float(message["ts"]), message["data"]
+        except (TypeError, ValueError):
+            pass
+    return time.time(), message
+
+
 class InMemoryPubSub:
     def __init__(self) -> None:
         self._subs: Dict[str, List[asyncio.Queue]] = {}
@@ -48,9 +73,10 @@ class InMemoryPubSub:
             lst = self._subs.get(channel)
             if not lst:
                 return
+            item = (time.time(), data)
             for q in lst:
                 try:
-                    q.put_nowait(data)
+                    q.put_nowait(item)
                 except Exception:
                     pass
 
@@ -81,15 +107,11 @@ class RedisPubSub:
                     data = message.get("data")
                     # 调用方 publish 的是 JSON 序列化后的对象
                     try:
-                        import json
-
-                        if isinstance(data, (bytes, bytearray)):
-                            data = json.loads(data.decode("utf-8"))
-                        elif isinstance(data, str):
-                            data = json.loads(data)
+                        if isinstance(data, (bytes, bytearray, str)):
+                            data = loads(data)
                     except Exception:
                         pass
-                    await q.put(data)
+                    await q.put(_unwrap(data))
             except Exception:
                 pass
             finally:
@@ -111,10 +133,10 @@ class RedisPubSub:
         self._queues.pop(channel, None)
 
     async def publish(self, channel: str, data: Any) -> None:
+        if settings.PUBSUB_ENVELOPE:
+            data = {"v": _ENVELOPE_VERSION, "ts": time.time(), "data": data}
         try:
-            import json
-
-            payload = json.dumps(data)
+            payload = dumps(data)
         except Exception:
             payload = data
         await self._pub.publish(channel, payload)
@@ -140,12 +162,8 @@ class RedisPubSub:
         if not val:
             return None
         try:
-            import json
-
-            if isinstance(val, (bytes, bytearray)):
-                return json.loads(val.decode("utf-8"))
-            if isinstance(val, str):
-                return json.loads(val)
+            if isinstance(val, (bytes, bytearray, str)):
+                return loads(val)
         except Exception:
             return None
 
@@ -1,9 +1,23 @@
+"""
+请求速率限制（GCRA）
+- 按 JWT sub 限流（无有效令牌时按客户端 IP），刷新令牌不会重置额度
+- 每个请求按路由计费（RATE_LIMIT_ROUTE_COSTS），默认 1
+- 配置 REDIS_URL 时由单个 Lua 脚本原子完成检查与计费（使用 Redis 时钟，多实例共享额度）；
+  本地用量明显低于限额（不超过 RATE_LIMIT_LOCAL_RATIO × 突发量）的请求直接放行，
+  记入待计费量，随后批量或在下次访问 Redis 时一并扣除
+- 未配置 Redis 或 Redis 不可用时退化为进程内限流；本地状态为定长 LRU，淘汰最久未访问的键
+"""
+
 from __future__ import annotations
 
+import asyncio
+import logging
+import math
 import time
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from jose import jwt
 
 from .config import settings
 
@@ -12,47 +26,243 @@ try:
 except Exception:  # pragma: no cover
     aioredis = None
 
+logger = logging.getLogger(__name__)
+
+_EXEMPT_PREFIXES = ("/health", "/metrics", "/api/aiim/ws")
+# Redis 出错后暂停访问的时长（期间使用本地限流）
+_REDIS_RETRY_SECONDS = 5.0
+
+# KEYS[1]=限流键；ARGV: 发放间隔(ms), 突发容量(ms), 本次计费, 本地已放行的待计费量
+# 返回 {是否放行, 当前占用(ms)}；数值以字符串返回，避免被截断为整数
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + tonumber(t[2]) / 1000
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tat < now then tat = now end
+local deferred = tonumber(ARGV[4]) * interval
+if deferred > 0 then tat = math.min(tat + deferred, now + burst) end
+local new_tat = tat + tonumber(ARGV[3]) * interval
+local allowed = 0
+if new_tat - now <= burst then
+  allowed = 1
+  tat = new_tat
+end
+if tat > now then
+  redis.call('SET', KEYS[1], string.format('%.3f', tat), 'PX', math.ceil(tat - now))
+end
+return {allowed, string.format('%.3f', tat - now)}
+"""
+
+
+def is_exempt(path: str) -> bool:
+    """健康检查、指标与 WebSocket 不限流"""
+    return path.startswith(_EXEMPT_PREFIXES)
+
+
+class _LocalState:
+    __slots__ = ("tat", "pending")
+
+    def __init__(self, tat: float):
+        # 理论到达时间（time.monotonic 秒）与尚未计入 Redis 的计费量
+        self.tat = tat
+        self.pending = 0
+
+
+def parse_route_costs(value: str) -> List[Tuple[Optional[str], str, int]]:
+    """格式 [METHOD ]/path/prefix=cost，逗号分隔；按前缀长度降序匹配"""
+    rules = []
+    for entry in (value or "").split(","):
+        if "=" not in entry:
+            continue
+        target, _, cost = entry.rpartition("=")
+        parts = target.split()
+        if not parts:
+            continue
+        method = parts[0].upper() if len(parts) > 1 else None
+        try:
+            rules.append((method, parts[-1], max(0, int(cost))))
+        except ValueError:
+            continue
+    rules.sort(key=lambda r: (len(r[1]), r[0] is not None), reverse=True)
+    return rules
+
+
+class RateLimiter:
+    """GCRA 限流器：Redis Lua 脚本 + 本地预检查"""
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self._rate = max(1, int(settings.RATE_LIMIT_PER_SEC))
+    def __init__(
+        self,
+        rate: float = settings.RATE_LIMIT_PER_SEC,
+        burst: int = settings.RATE_LIMIT_BURST,
+        route_costs: str = settings.RATE_LIMIT_ROUTE_COSTS,
+        local_ratio: float = settings.RATE_LIMIT_LOCAL_RATIO,
+        max_keys: int = settings.RATE_LIMIT_LOCAL_MAX_KEYS,
+        flush_interval: float = settings.RATE_LIMIT_FLUSH_INTERVAL_SECONDS,
+        redis_url: Optional[str] = settings.REDIS_URL,
+    ):
+        rate = max(rate, 0.001)
+        self.interval = 1.0 / rate
+        # 突发量为可连续放行的请求数，容量 = 突发量 × 发放间隔
+        self.burst_offset = max(1, burst or math.ceil(rate)) * self.interval
+        self.local_offset = max(0.0, min(local_ratio, 1.0)) * self.burst_offset
+        self.route_costs = parse_route_costs(route_costs)
+        self.max_keys = max(1, max_keys)
+        self.flush_interval = flush_interval
+        self._local: "OrderedDict[str, _LocalState]" = OrderedDict()
+        self._identities: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        self._last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._redis_retry_at = 0.0
         self._redis = None
-        if settings.REDIS_URL and aioredis is not None:
-            self._redis = aioredis.from_url(settings.REDIS_URL)
-        self._bucket = {}
+        self._script = None
+        if redis_url and aioredis is not None:
+            self._redis = aioredis.from_url(redis_url)
+            self._script = self._redis.register_script(_GCRA_LUA)
 
-    async def dispatch(self, request: Request, call_next):
-        # 跳过健康/指标
-        path = request.url.path
+    # --- 身份与计费 ---
+
+    def identify(self, authorization: Optional[str], client_host: str) -> str:
+        """限流键：有效 JWT 的 sub，否则客户端 IP"""
+        token = None
+        if authorization and authorization[:7].lower() == "bearer ":
+            token = authorization[7:].strip()
+        if token:
+            if token in self._identities:
+                self._identities.move_to_end(token)
+                user_id = self._identities[token]
+            else:
+                try:
+                    user_id = jwt.decode(
+                        token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM]
+                    ).get("sub")
+                except Exception:
+                    user_id = None
+                self._identities[token] = user_id
+                while len(self._identities) > self.max_keys:
+                    self._identities.popitem(last=False)
+            if user_id:
+                return f"rl:user:{user_id}"
+        return f"rl:ip:{client_host}"
+
+    def route_cost(self, method: str, path: str) -> int:
+        for rule_method, prefix, cost in self.route_costs:
+            if path.startswith(prefix) and (
+                rule_method is None or rule_method == method
+            ):
+                return cost
+        return 1
+
+    # --- 本地状态 ---
+
+    def _state(self, key: str, now: float) -> _LocalState:
+        state = self._local.get(key)
+        if state is None:
+            state = _LocalState(now)
+            self._local[key] = state
+            while len(self._local) > self.max_keys:
+                evicted, _ = self._local.popitem(last=False)
+                self._dirty.discard(evicted)
+        else:
+            self._local.move_to_end(key)
+        return state
+
+    def _acquire_local(
+        self, state: _LocalState, now: float, cost: int, offset: float
+    ) -> Tuple[bool, float]:
+        tat = max(state.tat, now)
+        new_tat = tat + cost * self.interval
+        if new_tat - now <= offset:
+            state.tat = new_tat
+            return True, 0.0
+        return False, new_tat - now - offset
+
+    # --- Redis ---
+
+    async def _acquire_redis(
+        self, key: str, state: _LocalState, now: float, cost: int
+    ) -> Tuple[bool, float]:
+        deferred, state.pending = state.pending, 0
+        self._dirty.discard(key)
+        try:
+            allowed, fill = await self._script(
+                keys=[key],
+                args=[
+                    self.interval * 1000,
+                    self.burst_offset * 1000,
+                    cost,
+                    deferred,
+                ],
+            )
+        except Exception as e:
+            logger.warning(f"Rate limit falls back to local state: {e}")
+            self._redis_retry_at = now + _REDIS_RETRY_SECONDS
+            state.pending += deferred
+            if state.pending:
+                self._dirty.add(key)
+            return self._acquire_local(state, now, cost, self.burst_offset)
+        fill = float(fill) / 1000
+        # 采用 Redis 中的全局占用，之后的本地预检查基于它衰减
+        state.tat = now + fill
+        if int(allowed):
+            return True, 0.0
+        return False, fill + cost * self.interval - self.burst_offset
+
+    async def flush(self) -> None:
+        """批量扣除本地已放行的待计费量"""
+        keys, self._dirty = self._dirty, set()
+        self._last_flush = time.monotonic()
+        batch = []
+        for key in keys:
+            state = self._local.get(key)
+            if state is not None and state.pending:
+                batch.append((key, state, state.pending))
+                state.pending = 0
+        if not batch or self._redis is None or self._last_flush < self._redis_retry_at:
+            return
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for key, _, pending in batch:
+                await self._script(
+                    keys=[key],
+                    args=[self.interval * 1000, self.burst_offset * 1000, 0, pending],
+                    client=pipe,
+                )
+            results = await pipe.execute()
+        except Exception as e:
+            logger.debug(f"Rate limit flush failed: {e}")
+            return
+        now = time.monotonic()
+        for (_, state, _), (_, fill) in zip(batch, results):
+            state.tat = max(state.tat, now + float(fill) / 1000)
+
+    def _maybe_flush(self, now: float) -> None:
         if (
-            path.startswith("/health")
-            or path.startswith("/metrics")
-            or path.startswith("/api/aiim/ws")
+            self._dirty
+            and now - self._last_flush >= self.flush_interval
+            and (self._flush_task is None or self._flush_task.done())
         ):
-            return await call_next(request)
-
-        identifier = request.headers.get("Authorization") or request.client.host
-        now = int(time.time())
-        key = f"rate:{identifier}:{now}"
-        allowed = True
-
-        if self._redis is not None:
-            try:
-                c = await self._redis.incr(key)
-                if c == 1:
-                    await self._redis.expire(key, 1)
-                if c > self._rate:
-                    allowed = False
-            except Exception:
-                pass
-        else:
-            cnt = self._bucket.get(key, 0) + 1
-            self._bucket[key] = cnt
-            if cnt > self._rate:
-                allowed = False
+            self._last_flush = now
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def acquire(self, key: str, cost: int = 1) -> Tuple[bool, float]:
+        """返回 (是否放行, 建议重试等待秒数)"""
+        if cost <= 0:
+            return True, 0.0
+        now = time.monotonic()
+        state = self._state(key, now)
+        if self._script is None or now < self._redis_retry_at:
+            return self._acquire_local(state, now, cost, self.burst_offset)
+        allowed, _ = self._acquire_local(state, now, cost, self.local_offset)
+        if allowed:
+            state.pending += cost
+            self._dirty.add(key)
+            self._maybe_flush(now)
+            return True, 0.0
+        return await self._acquire_redis(key, state, now, cost)
 
-        if not allowed:
-            return Response(status_code=429, content="rate limit exceeded")
 
-        return await call_next(request)
+# 全局限流器实例
+rate_limiter = RateLimiter()
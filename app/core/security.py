@@ -4,43 +4,44 @@ import hashlib
 import hmac
 import secrets
 import time
-from typing import Optional, Dict, Any
+from io import BytesIO
+from typing import Optional, Dict, Any, BinaryIO, Union
 from fastapi import Request, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
 
 from .config import settings
 
-
-class SecurityHeaders(BaseHTTPMiddleware):
-    """添加安全头中间件"""
-
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-
-        # 安全头
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-
-        # HTTPS相关 (生产环境)
-        if request.url.scheme == "https":
-            response.headers["Strict-Transport-Security"] = (
-                "max-age=31536000; includeSubDomains"
-            )
-
-        # CORS (如果需要)
-        if "origin" in request.headers:
-            # 在生产环境中应该配置具体的允许域名
-            response.headers["Access-Control-Allow-Origin"] = "*"
-            response.headers["Access-Control-Allow-Methods"] = (
-                "GET, POST, PUT, DELETE, OPTIONS"
-            )
-            response.headers["Access-Control-Allow-Headers"] = (
-                "Authorization, Content-Type"
-            )
-
-        return response
+# 容器格式族：libmagic 报告的 MIME 与客户端声明的 MIME 常常不完全一致
+# （如 audio/webm 被识别为 video/webm，ADTS 封装的 AAC 被识别为 audio/x-hx-aac-adts），
+# 类型一致性按容器族比较而不是精确比较 MIME 字符串
+MEDIA_CONTAINER_FAMILIES = {
+    "audio/mpeg": "mpeg",
+    "audio/mp3": "mpeg",
+    "audio/x-mp3": "mpeg",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/vnd.wave": "wav",
+    "audio/ogg": "ogg",
+    "application/ogg": "ogg",
+    "audio/opus": "ogg",
+    "audio/mp4": "mp4",
+    "audio/x-m4a": "mp4",
+    "video/mp4": "mp4",
+    "audio/webm": "webm",
+    "video/webm": "webm",
+    "video/x-matroska": "webm",
+    "audio/aac": "aac",
+    "audio/x-aac": "aac",
+    "audio/x-hx-aac-adts": "aac",
+    "audio/x-hx-aac-adif": "aac",
+}
+
+
+def media_family(mime_type: Optional[str]) -> Optional[str]:
+    """MIME 类型所属的容器族，未知类型返回 None"""
+    if not mime_type:
+        return None
+    return MEDIA_CONTAINER_FAMILIES.get(mime_type.split(";")[0].strip().lower())
 
 
 class APIKeyAuth:
@@ -168,49 +169,82 @@ class ContentValidation:
     @staticmethod
     def validate_media_content(content: bytes, content_type: str) -> Dict[str, Any]:
         """验证媒体文件内容"""
+        result = ContentValidation.validate_media_stream(
+            BytesIO(content), len(content), content_type
+        )
+        result.pop("header", None)
+        return result
+
+    @staticmethod
+    def validate_media_stream(
+        fileobj: BinaryIO, size: int, content_type: str
+    ) -> Dict[str, Any]:
+        """
+        基于文件对象验证媒体内容：类型检测只读取文件头，
+        音频元数据由 mutagen 按需 seek/read，不需要完整内容在内存中
+        """
         import magic
 
-        # 检测真实文件类型
-        detected_type = magic.from_buffer(content, mime=True)
+        # 检测真实文件类型（只需文件头）
+        fileobj.seek(0)
+        header = fileobj.read(getattr(settings, "MEDIA_SNIFF_BYTES", 8192))
+        detected_type = magic.from_buffer(header, mime=True)
 
         # 基础验证
         result = {
             "valid": True,
             "detected_type": detected_type,
             "declared_type": content_type,
-            "size": len(content),
+            "size": size,
             "issues": [],
+            "header": header,
         }
 
-        # 类型一致性检查
-        if not detected_type.startswith(content_type.split("/")[0]):
+        # 类型一致性检查：两者都是已知容器族时按族比较，否则退回比较主类型
+        declared_family = media_family(content_type)
+        detected_family = media_family(detected_type)
+        if declared_family and detected_family:
+            mismatch = declared_family != detected_family
+        else:
+            mismatch = not detected_type.startswith(content_type.split("/")[0])
+        if mismatch:
             result["issues"].append(
                 f"Type mismatch: declared {content_type}, detected {detected_type}"
             )
 
         # 大小检查
         max_size = getattr(settings, "MEDIA_MAX_FILE_SIZE", 50 * 1024 * 1024)
-        if len(content) > max_size:
+        if size > max_size:
             result["valid"] = False
-            result["issues"].append(f"File too large: {len(content)} > {max_size}")
-
-        # 音频/视频特定检查
-        if detected_type.startswith("audio/"):
-            result.update(ContentValidation._validate_audio(content))
+            result["issues"].append(f"File too large: {size} > {max_size}")
+
+        # 音频/视频特定检查（被识别为 video/* 的音频容器同样按音频处理）
+        if detected_type.startswith("audio/") or detected_family is not None:
+            fileobj.seek(0)
+            audio = ContentValidation._validate_audio(fileobj, detected_family)
+            result["issues"].extend(audio.pop("issues", []))
+            result.update(audio)
         elif detected_type.startswith("video/"):
-            result.update(ContentValidation._validate_video(content))
+            result.update(ContentValidation._validate_video(fileobj))
 
         return result
 
     @staticmethod
-    def _validate_audio(content: bytes) -> Dict[str, Any]:
+    def _validate_audio(
+        content: Union[bytes, BinaryIO], family: Optional[str] = None
+    ) -> Dict[str, Any]:
         """音频文件特定验证"""
+        # mutagen 不支持 Matroska/WebM，无法提取元数据时不视为问题
+        if family == "webm":
+            return {}
         try:
             from mutagen import File as MutagenFile
-            from io import BytesIO
+            from mutagen.aac import AAC
 
-            # 使用mutagen解析音频元数据
-            audio_file = MutagenFile(BytesIO(content))
+            # 使用mutagen解析音频元数据（接受文件对象，避免整体载入内存）
+            fileobj = BytesIO(content) if isinstance(content, bytes) else content
+            # ADTS/ADIF 没有文件名时 mutagen.File 无法识别，直接指定解析器
+            audio_file = AAC(fileobj) if family == "aac" else MutagenFile(fileobj)
             if audio_file is None:
                 return {"issues": ["Invalid audio file format"]}
 
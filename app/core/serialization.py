@@ -0,0 +1,83 @@
+"""
+统一JSON序列化层
+优先使用 orjson，其次 msgspec，均不可用时回退到标准库 json；
+datetime/date/UUID/Decimal 等类型在所有后端下行为一致
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson  # type: ignore
+
+    BACKEND = "orjson"
+except Exception:  # pragma: no cover
+    orjson = None
+    try:
+        import msgspec  # type: ignore
+
+        BACKEND = "msgspec"
+    except Exception:
+        msgspec = None
+        BACKEND = "json"
+
+
+def json_default(obj: Any) -> Any:
+    """后端无法原生处理的类型"""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (UUID, Decimal)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if BACKEND == "orjson":
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(data: str | bytes | bytearray) -> Any:
+        return orjson.loads(data)
+
+elif BACKEND == "msgspec":
+    _encoder = msgspec.json.Encoder(enc_hook=json_default)
+    _decoder = msgspec.json.Decoder()
+
+    def dumps(obj: Any) -> bytes:
+        return _encoder.encode(obj)
+
+    def loads(data: str | bytes | bytearray) -> Any:
+        return _decoder.decode(data)
+
+else:
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(
+            obj, default=json_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    def loads(data: str | bytes | bytearray) -> Any:
+        return json.loads(data)
+
+
+def dumps_str(obj: Any) -> str:
+    """序列化为 str（WebSocket 文本帧、日志等场景）"""
+    return dumps(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """使用统一序列化层渲染的 JSON 响应（作为路由默认响应类）"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,6 +1,10 @@
 """
 TURN服务集成
-提供ICE候选生成和TURN凭证管理
+提供ICE候选生成和TURN凭证管理：
+- STUN 列表与 TURN 服务器列表在启动时解析一次
+- TURN 凭证按时间桶生成（同一用户在一个桶内得到相同凭证），进程内 LRU 缓存，
+  有效期从桶结束时计算，返回给客户端的凭证剩余有效期不少于 TURN_CREDENTIAL_TTL
+- 多个 TURN 服务器按区域筛选，按权重与用户做加权一致性哈希选择
 """
 
 from __future__ import annotations
@@ -8,30 +12,84 @@ from __future__ import annotations
 import hmac
 import hashlib
 import base64
+import math
+import threading
 import time
-from typing import Dict, List, Any
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
 
 from .config import settings
 
+# 凭证在有效期的 3/4 内复用
+_CREDENTIAL_REUSE_RATIO = 0.75
+
+
+class TURNServer:
+    """TURN服务器（host:port，区域，权重）"""
+
+    __slots__ = ("address", "region", "weight")
+
+    def __init__(self, address: str, region: str = "", weight: float = 1.0):
+        self.address = address
+        self.region = region
+        self.weight = weight
+
+    @classmethod
+    def parse(cls, entry: str) -> Optional["TURNServer"]:
+        """格式 host:port[|region[|weight]]，可带 turn:/turns: 前缀"""
+        parts = [p.strip() for p in entry.split("|")]
+        address = parts[0]
+        for prefix in ("turns:", "turn:"):
+            if address.startswith(prefix):
+                address = address[len(prefix) :]
+        if not address:
+            return None
+        region = parts[1] if len(parts) > 1 else ""
+        try:
+            weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        except ValueError:
+            weight = 1.0
+        if weight <= 0:
+            return None
+        return cls(address, region, weight)
+
+    def score(self, user_id: str) -> float:
+        """加权一致性哈希：同一用户稳定选中同一服务器，选中概率与权重成正比"""
+        digest = hashlib.sha1(f"{self.address}:{user_id}".encode("utf-8")).digest()
+        u = (int.from_bytes(digest[:8], "big") + 1) / float(2**64 + 1)
+        return -self.weight / math.log(u)
+
+
+def parse_turn_servers(
+    turn_servers: str, turn_server: Optional[str]
+) -> List[TURNServer]:
+    """TURN_SERVERS（逗号分隔）优先，未配置时使用单个 TURN_SERVER"""
+    entries = [e for e in (turn_servers or "").split(",") if e.strip()]
+    if not entries and turn_server:
+        entries = [turn_server]
+    servers = [TURNServer.parse(e) for e in entries]
+    return [s for s in servers if s is not None]
+
 
 class TURNCredentialService:
     """TURN凭证服务"""
 
-    def __init__(self):
+    def __init__(self, cache_size: int = settings.TURN_CREDENTIAL_CACHE_SIZE):
         self.turn_secret = settings.TURN_PASSWORD or "default_turn_secret"
         self.credential_ttl = settings.TURN_CREDENTIAL_TTL
-
-    def generate_turn_credentials(self, username: str) -> Dict[str, str]:
-        """生成TURN临时凭证"""
-        if not settings.TURN_SERVER:
-            return {}
-
-        # 生成时间戳用户名
-        timestamp = int(time.time()) + self.credential_ttl
-        temp_username = f"{timestamp}:{username}"
-
-        # 使用HMAC-SHA1生成密码
-        password = base64.b64encode(
+        self.bucket_seconds = max(1, int(self.credential_ttl * _CREDENTIAL_REUSE_RATIO))
+        self.stun_servers: List[Dict[str, Any]] = [
+            {"urls": s.strip()} for s in settings.STUN_SERVERS.split(",") if s.strip()
+        ]
+        self.turn_servers = parse_turn_servers(
+            settings.TURN_SERVERS, settings.TURN_SERVER
+        )
+        self.cache_size = max(1, cache_size)
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sign(self, temp_username: str) -> str:
+        return base64.b64encode(
             hmac.new(
                 self.turn_secret.encode("utf-8"),
                 temp_username.encode("utf-8"),
@@ -39,40 +97,64 @@ class TURNCredentialService:
             ).digest()
         ).decode("utf-8")
 
+    def generate_turn_credentials(self, username: str) -> Dict[str, Any]:
+        """生成TURN临时凭证（同一时间桶内命中缓存）"""
+        if not self.turn_servers:
+            return {}
+
+        now = time.time()
+        bucket = int(now // self.bucket_seconds)
+        key = (username, bucket)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is None:
+            # 时间戳用户名：有效期截止到桶结束后再加 TTL
+            expires_at = (bucket + 1) * self.bucket_seconds + self.credential_ttl
+            temp_username = f"{expires_at}:{username}"
+            cached = (temp_username, self._sign(temp_username))
+            with self._lock:
+                self._cache[key] = cached
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        temp_username, password = cached
         return {
             "username": temp_username,
             "credential": password,
-            "ttl": self.credential_ttl,
+            "ttl": int(temp_username.split(":", 1)[0]) - int(now),
         }
 
-    def get_ice_servers(self, user_id: str) -> List[Dict[str, Any]]:
+    def select_turn_server(
+        self, user_id: str, region: Optional[str] = None
+    ) -> Optional[TURNServer]:
+        """优先选择指定区域的服务器，区域内无服务器时在全部服务器中选择"""
+        candidates = self.turn_servers
+        if region:
+            candidates = [s for s in self.turn_servers if s.region == region] or (
+                self.turn_servers
+            )
+        if not candidates:
+            return None
+        return max(candidates, key=lambda s: s.score(user_id))
+
+    def get_ice_servers(
+        self, user_id: str, region: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
         """获取ICE服务器配置"""
-        ice_servers = []
-
         # STUN服务器
-        stun_servers = [
-            s.strip() for s in settings.STUN_SERVERS.split(",") if s.strip()
-        ]
-        for stun_server in stun_servers:
-            ice_servers.append({"urls": stun_server})
+        ice_servers = list(self.stun_servers)
 
         # TURN服务器
-        if settings.TURN_SERVER:
+        server = self.select_turn_server(user_id, region)
+        if server is not None:
             turn_creds = self.generate_turn_credentials(user_id)
-            if turn_creds:
-                ice_servers.append(
-                    {
-                        "urls": f"turn:{settings.TURN_SERVER}",
-                        "username": turn_creds["username"],
-                        "credential": turn_creds["credential"],
-                        "credentialType": "password",
-                    }
-                )
-
+            for scheme in ("turn", "turns"):
                 # 同时添加TURNS (TLS)
                 ice_servers.append(
                     {
-                        "urls": f"turns:{settings.TURN_SERVER}",
+                        "urls": f"{scheme}:{server.address}",
                         "username": turn_creds["username"],
                         "credential": turn_creds["credential"],
                         "credentialType": "password",
@@ -88,9 +170,11 @@ class WebRTCConfigService:
     def __init__(self):
         self.turn_service = TURNCredentialService()
 
-    def get_rtc_configuration(self, user_id: str) -> Dict[str, Any]:
+    def get_rtc_configuration(
+        self, user_id: str, region: Optional[str] = None
+    ) -> Dict[str, Any]:
         """获取WebRTC配置"""
-        ice_servers = self.turn_service.get_ice_servers(user_id)
+        ice_servers = self.turn_service.get_ice_servers(user_id, region)
 
         return {
             "iceServers": ice_servers,
@@ -0,0 +1,140 @@
+"""
+WebSocket帧编解码层
+客户端在建连时通过 ?encoding= 协商帧编码：
+- json: 文本帧（默认，兼容旧客户端）
+- msgpack: MessagePack 二进制帧
+- deflate: JSON + raw deflate 二进制帧（连接级上下文复用，窗口大小可调）
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import Any, Dict, Type
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .config import settings
+from .serialization import json_default, dumps, dumps_str, loads
+
+try:
+    import msgpack  # type: ignore
+
+    MSGPACK_AVAILABLE = True
+except Exception:  # pragma: no cover
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+
+# permessage-deflate 约定的同步刷新尾部，发送时去掉、接收时补回
+_DEFLATE_TAIL = b"\x00\x00\xff\xff"
+
+
+class FrameTooLarge(ValueError):
+    """解压后的帧超过 WS_MAX_FRAME_BYTES；压缩上下文已不可用，应关闭连接"""
+
+
+class FrameCodec:
+    """帧编解码基类（每个连接一个实例，允许持有压缩上下文）"""
+
+    name = "json"
+    binary = False
+
+    def encode(self, obj: Any) -> str | bytes:
+        return dumps_str(obj)
+
+    def decode(self, data: str | bytes) -> Any:
+        return loads(data)
+
+    async def send(self, websocket: WebSocket, obj: Any) -> None:
+        """按协商的编码写出一帧"""
+        payload = self.encode(obj)
+        if self.binary:
+            await websocket.send_bytes(payload)  # type: ignore[arg-type]
+        else:
+            await websocket.send_text(payload)  # type: ignore[arg-type]
+
+    async def receive(self, websocket: WebSocket) -> Any:
+        """读取并解析一帧；文本帧始终按 JSON 解析，二进制帧按协商编码解析"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        data = message.get("bytes")
+        if data is not None:
+            return self.decode(data)
+        return loads(message.get("text") or "")
+
+
+class JSONCodec(FrameCodec):
+    name = "json"
+    binary = False
+
+
+class MsgPackCodec(FrameCodec):
+    name = "msgpack"
+    binary = True
+
+    def encode(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True, default=json_default)
+
+    def decode(self, data: str | bytes) -> Any:
+        if isinstance(data, str):
+            return loads(data)
+        return msgpack.unpackb(data, raw=False)
+
+
+class DeflateJSONCodec(FrameCodec):
+    """JSON + raw deflate，连接内复用滑动窗口（等价于 permessage-deflate 的 context takeover）"""
+
+    name = "deflate"
+    binary = True
+
+    def __init__(
+        self,
+        window_bits: int | None = None,
+        mem_level: int | None = None,
+        level: int | None = None,
+        max_frame_bytes: int | None = None,
+    ) -> None:
+        self.max_frame_bytes = max_frame_bytes or settings.WS_MAX_FRAME_BYTES
+        wbits = window_bits or settings.WS_DEFLATE_WINDOW_BITS
+        self._compressor = zlib.compressobj(
+            level if level is not None else settings.WS_DEFLATE_LEVEL,
+            zlib.DEFLATED,
+            -wbits,
+            mem_level or settings.WS_DEFLATE_MEM_LEVEL,
+        )
+        self._decompressor = zlib.decompressobj(-wbits)
+
+    def encode(self, obj: Any) -> bytes:
+        raw = dumps(obj)
+        data = self._compressor.compress(raw) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+        if data.endswith(_DEFLATE_TAIL):
+            data = data[: -len(_DEFLATE_TAIL)]
+        return data
+
+    def decode(self, data: str | bytes) -> Any:
+        if isinstance(data, str):
+            return loads(data)
+        # 限制输出长度，防止小压缩帧膨胀成超大内存
+        raw = self._decompressor.decompress(data + _DEFLATE_TAIL, self.max_frame_bytes)
+        if self._decompressor.unconsumed_tail:
+            raise FrameTooLarge(f"frame exceeds {self.max_frame_bytes} bytes")
+        return loads(raw)
+
+
+CODECS: Dict[str, Type[FrameCodec]] = {
+    JSONCodec.name: JSONCodec,
+    DeflateJSONCodec.name: DeflateJSONCodec,
+}
+if MSGPACK_AVAILABLE:
+    CODECS[MsgPackCodec.name] = MsgPackCodec
+
+
+def negotiate_codec(websocket: WebSocket) -> FrameCodec:
+    """根据 ?encoding= 选择编解码器；未知或未启用的编码回退到 JSON"""
+    requested = (websocket.query_params.get("encoding") or "json").strip().lower()
+    allowed = {e.strip().lower() for e in settings.WS_ALLOWED_ENCODINGS.split(",")}
+    codec_cls = CODECS.get(requested) if requested in allowed else None
+    return (codec_cls or JSONCodec)()
@@ -0,0 +1,137 @@
+"""
+WebSocket帧调度器
+按帧类型查表分发，接收循环只负责读帧，处理在独立任务中并发执行：
+- inline 类型（如 pong）直接在接收循环内处理，不占用并发槽位
+- ordered 类型按 conversation_id 串行，保证同一会话内的发送顺序
+- 其余类型并发执行，单连接并发数受 max_inflight 限制（满时对读循环形成背压）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+FrameHandler = Callable[[Any, Dict[str, Any]], Awaitable[None]]
+TimingHook = Callable[[str, float], None]
+
+# 未在处理表中登记的帧类型统一归到该键下（避免客户端自定义类型放大指标基数）
+DEFAULT_FRAME_KEY = "other"
+
+
+class FrameDispatcher:
+    """单连接帧调度器"""
+
+    def __init__(
+        self,
+        handlers: Dict[str, FrameHandler],
+        default_handler: Optional[FrameHandler] = None,
+        invalid_handler: Optional[FrameHandler] = None,
+        inline_types: Iterable[str] = (),
+        ordered_types: Iterable[str] = (),
+        max_inflight: int = 8,
+        on_timing: Optional[TimingHook] = None,
+        on_received: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._handlers = handlers
+        self._default_handler = default_handler
+        self._invalid_handler = invalid_handler
+        self._inline_types = frozenset(inline_types)
+        self._ordered_types = frozenset(ordered_types)
+        self._slots = asyncio.Semaphore(max(1, max_inflight))
+        self._on_timing = on_timing
+        self._on_received = on_received
+        self._lanes: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def resolve(self, frame_type: Any) -> tuple[str, Optional[FrameHandler]]:
+        """帧类型 -> (指标键, 处理函数)"""
+        if isinstance(frame_type, str):
+            handler = self._handlers.get(frame_type)
+            if handler is not None:
+                return frame_type, handler
+        elif frame_type is not None:
+            # 客户端传入列表/对象等非字符串类型：不可作为键查表，交给 invalid_handler 回错
+            return DEFAULT_FRAME_KEY, self._invalid_handler
+        return DEFAULT_FRAME_KEY, self._default_handler
+
+    async def dispatch(self, ctx: Any, frame: Dict[str, Any]) -> None:
+        key, handler = self.resolve(frame.get("type"))
+        if self._on_received is not None:
+            self._on_received(key)
+        if handler is None:
+            return
+
+        if key in self._inline_types:
+            await self._run(key, handler, ctx, frame)
+            return
+
+        # 槽位满时在此等待，读循环随之暂停
+        await self._slots.acquire()
+        lane = frame.get("conversation_id") if key in self._ordered_types else None
+        if lane and isinstance(lane, str):
+            prev = self._lanes.get(lane)
+            task = asyncio.create_task(self._run_after(prev, key, handler, ctx, frame))
+            self._lanes[lane] = task
+            task.add_done_callback(lambda t, lane=lane: self._release_lane(lane, t))
+        else:
+            task = asyncio.create_task(self._run_slot(key, handler, ctx, frame))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _release_lane(self, lane: str, task: asyncio.Task) -> None:
+        if self._lanes.get(lane) is task:
+            self._lanes.pop(lane, None)
+
+    async def _run_after(
+        self,
+        prev: Optional[asyncio.Task],
+        key: str,
+        handler: FrameHandler,
+        ctx: Any,
+        frame: Dict[str, Any],
+    ) -> None:
+        try:
+            if prev is not None and not prev.done():
+                # 只等待前序完成，不传播其异常
+                await asyncio.wait({prev})
+            await self._run(key, handler, ctx, frame)
+        finally:
+            self._slots.release()
+
+    async def _run_slot(
+        self, key: str, handler: FrameHandler, ctx: Any, frame: Dict[str, Any]
+    ) -> None:
+        try:
+            await self._run(key, handler, ctx, frame)
+        finally:
+            self._slots.release()
+
+    async def _run(
+        self, key: str, handler: FrameHandler, ctx: Any, frame: Dict[str, Any]
+    ) -> None:
+        start = time.perf_counter()
+        try:
+            await handler(ctx, frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"WS frame handler failed: type={key}, error={e}")
+        finally:
+            if self._on_timing is not None:
+                try:
+                    self._on_timing(key, time.perf_counter() - start)
+                except Exception:
+                    pass
+
+    async def aclose(self) -> None:
+        """连接关闭时取消所有未完成的处理任务"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._lanes.clear()
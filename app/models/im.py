@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from typing import Optional, List, Any, Literal
+from typing import Optional, List, Any, Literal, Dict
 
 from sqlalchemy import (
     Column,
@@ -13,13 +13,19 @@ from sqlalchemy import (
     Index,
     JSON,
     Integer,
+    Text,
     UniqueConstraint,
+    text,
 )
 from sqlalchemy.orm import relationship
 from pydantic import BaseModel, Field
 
 from .base import Base
 
+# 活跃通话状态；部分索引条件与 call_state.ACTIVE_STATUSES 一致
+_ACTIVE_CALL_WHERE = text("status IN ('initiated', 'ringing', 'answered')")
+_OPEN_PARTICIPANT_WHERE = text("leave_time IS NULL")
+
 
 class Conversation(Base):
     __tablename__ = "conversations"
@@ -36,6 +42,8 @@ class Conversation(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_seq = Column(BigInteger, default=0)
+    # 通话记录数（创建通话记录时递增，通话历史分页返回的 total）
+    call_count = Column(Integer, default=0, server_default="0", nullable=False)
 
     members = relationship(
         "ConversationMember",
@@ -159,7 +167,7 @@ class CallLog(Base):
         ),
         nullable=False,
     )
-    start_time = Column(DateTime, default=datetime.utcnow)
+    start_time = Column(DateTime, nullable=False, default=datetime.utcnow)
     answer_time = Column(DateTime, nullable=True)
     end_time = Column(DateTime, nullable=True)
     duration_sec = Column(Integer, nullable=True)
@@ -170,6 +178,18 @@ class CallLog(Base):
         "CallParticipant", back_populates="call", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        Index("idx_calls_conv_start", "conversation_id", "start_time", "call_id"),
+        # 每个会话最多一个活跃通话（部分唯一索引，同时用于活跃通话查询）
+        Index(
+            "uq_calls_conv_active",
+            "conversation_id",
+            unique=True,
+            postgresql_where=_ACTIVE_CALL_WHERE,
+            sqlite_where=_ACTIVE_CALL_WHERE,
+        ),
+    )
+
 
 class CallParticipant(Base):
     __tablename__ = "call_participants"
@@ -183,6 +203,73 @@ class CallParticipant(Base):
 
     call = relationship("CallLog", back_populates="participants")
 
+    __table_args__ = (
+        # 同一用户在通话中最多一条未离开的记录
+        Index(
+            "uq_call_participants_open",
+            "call_id",
+            "user_id",
+            unique=True,
+            postgresql_where=_OPEN_PARTICIPANT_WHERE,
+            sqlite_where=_OPEN_PARTICIPANT_WHERE,
+        ),
+    )
+
+
+class MediaObject(Base):
+    """媒体对象元数据（上传令牌签发时写入 pending，上传完成校验后置为 ready）"""
+
+    __tablename__ = "media_objects"
+    media_id = Column(String, primary_key=True)
+    conversation_id = Column(
+        String, ForeignKey("conversations.conversation_id"), nullable=False
+    )
+    uploader_id = Column(String, nullable=False, index=True)
+    object_key = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    sha256 = Column(String(64), nullable=True)
+    status = Column(
+        Enum("pending", "ready", name="media_status"),
+        nullable=False,
+        default="pending",
+    )
+    duration_ms = Column(Integer, nullable=True)
+    waveform_data = Column(Text, nullable=True)
+    bitrate = Column(Integer, nullable=True)
+    tenant_id = Column(String, nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    upload_expires_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+    # 分段上传（完成后清空 upload_id）
+    upload_id = Column(String, nullable=True)
+    part_size = Column(Integer, nullable=True)
+    # 内容寻址存储：引用的 media_blobs 记录（object_key 指向共享对象）
+    blob_sha256 = Column(String(64), ForeignKey("media_blobs.sha256"), nullable=True)
+    # 首条引用该媒体的消息；为空且超过宽限期的记录由 media_gc 回收
+    message_id = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("idx_media_conv_created", "conversation_id", "created_at"),
+        Index("idx_media_status_created", "status", "created_at"),
+        Index("idx_media_blob_sha256", "blob_sha256"),
+        Index("idx_media_unreferenced", "message_id", "created_at"),
+    )
+
+
+class MediaBlob(Base):
+    """按 SHA256 去重的共享媒体对象，ref_count 为引用它的 media_objects 数量"""
+
+    __tablename__ = "media_blobs"
+    sha256 = Column(String(64), primary_key=True)
+    object_key = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 
 # --- Pydantic Models for API Contracts ---
 
@@ -247,6 +334,8 @@ class UploadTokenRequest(BaseModel):
     filename: str
     content_type: str
     file_size: int = Field(..., gt=0, le=50 * 1024 * 1024)  # 最大50MB
+    # 可选：声明文件SHA256，由对象存储在上传时校验，完成时无需重新下载
+    file_hash: Optional[str] = Field(None, min_length=64, max_length=64)
 
 
 class UploadTokenResponse(BaseModel):
@@ -261,6 +350,17 @@ class MediaUploadCompleteRequest(BaseModel):
     conversation_id: str
     file_hash: str = Field(..., min_length=64, max_length=64)  # SHA256
     file_size: int
+    # 可选：单段上传时可与 ETag 比较，避免下载校验
+    file_md5: Optional[str] = Field(None, min_length=32, max_length=32)
+    duration_ms: Optional[int] = Field(None, ge=0)  # 音频时长(毫秒)
+    waveform_data: Optional[str] = None  # Base64编码的波形数据
+
+
+class MediaAttachRequest(BaseModel):
+    """引用已存在的内容（by-hash）创建会话内媒体，跳过上传"""
+
+    conversation_id: str
+    filename: str
 
 
 class MediaMetadata(BaseModel):
@@ -289,6 +389,87 @@ class MediaDownloadResponse(BaseModel):
     expires_at: str
 
 
+class MultipartInitiateRequest(BaseModel):
+    conversation_id: str
+    filename: str
+    content_type: str
+    file_size: int = Field(..., gt=0, le=50 * 1024 * 1024)  # 最大50MB
+
+
+class MultipartInitiateResponse(BaseModel):
+    media_id: str
+    part_size: int
+    part_count: int
+    expires_at: str
+
+
+class MultipartPartURLsRequest(BaseModel):
+    conversation_id: str
+    part_numbers: List[int] = Field(..., min_length=1, max_length=1000)
+    # 可选：分段SHA256（hex），签入分段URL由对象存储在写入时校验
+    part_sha256: Optional[Dict[int, str]] = None
+
+
+class MultipartPartURL(BaseModel):
+    part_number: int
+    url: str
+
+
+class MultipartPartURLsResponse(BaseModel):
+    media_id: str
+    parts: List[MultipartPartURL]
+    expires_at: str
+    method: str = "PUT"
+
+
+class MultipartPartInfo(BaseModel):
+    part_number: int
+    etag: str
+    size: int
+
+
+class MultipartPartsResponse(BaseModel):
+    media_id: str
+    part_size: int
+    part_count: int
+    parts: List[MultipartPartInfo]
+
+
+class MultipartCompletePart(BaseModel):
+    part_number: int = Field(..., ge=1, le=10000)
+    md5: str = Field(..., min_length=32, max_length=32)  # 分段内容MD5（hex）
+
+
+class MultipartCompleteRequest(BaseModel):
+    conversation_id: str
+    file_hash: str = Field(..., min_length=64, max_length=64)  # SHA256
+    parts: List[MultipartCompletePart] = Field(..., min_length=1)
+    duration_ms: Optional[int] = Field(None, ge=0)
+    waveform_data: Optional[str] = None
+
+
+class MediaBatchRequest(BaseModel):
+    conversation_id: str
+    media_ids: List[str] = Field(..., min_length=1, max_length=100)
+
+
+class MediaBatchItem(BaseModel):
+    media_id: str
+    found: bool = True
+    download_url: Optional[str] = None
+    content_type: Optional[str] = None
+    filename: Optional[str] = None
+    file_size: Optional[int] = None
+    duration_ms: Optional[int] = None
+    waveform_data: Optional[str] = None
+    expires_at: Optional[str] = None
+
+
+class MediaBatchResponse(BaseModel):
+    conversation_id: str
+    items: List[MediaBatchItem]
+
+
 # --- Pydantic Models for WebSocket Signaling ---
 
 
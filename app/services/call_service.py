@@ -5,229 +5,114 @@
 
 from __future__ import annotations
 
-from typing import Optional, Dict, Any, List
+import base64
 from datetime import datetime
-from sqlalchemy.orm import Session
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, joinedload
 
 from ..models import im as im_model
 from ..core.events import publish_event_async
 from ..core.turn_service import webrtc_config
+from .call_state import CallState, SQLCallStateStore, call_state_store
+from .call_sweeper import call_sweeper
+
+# 通话结束并超过状态存储保留时间后，从数据库读取
+_sql_store = SQLCallStateStore()
 
 
 class CallManagementService:
-    """通话管理服务"""
+    """通话管理服务（活跃通话状态由 call_state_store 维护）"""
 
     @staticmethod
-    def create_call(
-        db: Session, conversation_id: str, initiator_id: str, call_type: str = "audio"
-    ) -> im_model.CallLog:
+    async def create_call(
+        conversation_id: str, initiator_id: str, call_type: str = "audio"
+    ) -> CallState:
         """创建新通话"""
-
-        # 检查是否已有活跃通话
-        active_call = (
-            db.query(im_model.CallLog)
-            .filter(
-                im_model.CallLog.conversation_id == conversation_id,
-                im_model.CallLog.status.in_(["initiated", "ringing", "answered"]),
-            )
-            .first()
-        )
-
-        if active_call:
+        call = await call_state_store.create(conversation_id, initiator_id)
+        if call is None:
             raise ValueError("A call is already active in this conversation")
+        await call_sweeper.call_created(call)
+        return call
 
-        # 创建通话记录
-        call = im_model.CallLog(
-            conversation_id=conversation_id,
-            initiator_id=initiator_id,
-            status="initiated",
-        )
-        db.add(call)
-        db.flush()
-
-        # 添加发起者为参与者
-        initiator_participant = im_model.CallParticipant(
-            call_id=call.call_id, user_id=initiator_id, join_time=datetime.utcnow()
-        )
-        db.add(initiator_participant)
-
-        db.commit()
-        db.refresh(call)
-
+    @staticmethod
+    async def get_call(call_id: str) -> Optional[CallState]:
+        """活跃或刚结束的通话从状态存储读取，更早的通话回退到 call_logs"""
+        call = await call_state_store.get(call_id)
+        if call is None and not isinstance(call_state_store, SQLCallStateStore):
+            call = await _sql_store.get(call_id)
         return call
 
     @staticmethod
-    def get_call_participants(db: Session, call_id: str) -> List[str]:
+    async def get_call_participants(call_id: str) -> List[str]:
         """获取通话参与者列表"""
-        participants = (
-            db.query(im_model.CallParticipant.user_id)
-            .filter(
-                im_model.CallParticipant.call_id == call_id,
-                im_model.CallParticipant.leave_time.is_(None),
-            )
-            .all()
-        )
-        return [p.user_id for p in participants]
+        call = await CallManagementService.get_call(call_id)
+        return call.active_participants if call is not None else []
 
     @staticmethod
-    def update_call_status(
-        db: Session, call_id: str, new_status: str, user_id: Optional[str] = None
-    ) -> Optional[im_model.CallLog]:
-        """更新通话状态"""
-        call = (
-            db.query(im_model.CallLog)
-            .filter(im_model.CallLog.call_id == call_id)
-            .first()
-        )
-
-        if not call:
-            return None
-
-        old_status = call.status
-        call.status = new_status
-
-        # 根据状态变化更新相关时间戳
-        now = datetime.utcnow()
-        if new_status == "answered" and old_status in ["initiated", "ringing"]:
-            call.answer_time = now
-        elif new_status in ["completed", "missed", "rejected"]:
-            call.end_time = now
-            if call.answer_time:
-                call.duration_sec = int((now - call.answer_time).total_seconds())
-
-        db.commit()
-        db.refresh(call)
-
-        # 广播状态变化事件
+    async def _finish(call: CallState, event_type: str, user_id: Optional[str]) -> None:
+        """
+        广播事件；进入终态时持久化通话记录并取消超时调度
+        状态未发生变化（重复的拒绝、挂断等）时不做任何处理
+        """
+        if not call.changed:
+            return
+        if not call.is_active:
+            call_state_store.persist(call)
+            await call_sweeper.call_ended(call.call_id)
         try:
-            CallManagementService._broadcast_call_event(
-                call, "call.status_changed", user_id
-            )
+            CallManagementService._broadcast_call_event(call, event_type, user_id)
         except Exception:
             pass
 
+    @staticmethod
+    async def update_call_status(
+        call_id: str, new_status: str, user_id: Optional[str] = None
+    ) -> Optional[CallState]:
+        """更新通话状态（已结束的通话保持不变）"""
+        call = await call_state_store.set_status(call_id, new_status)
+        if call is None:
+            return None
+        await CallManagementService._finish(call, "call.status_changed", user_id)
         return call
 
     @staticmethod
-    def join_call(db: Session, call_id: str, user_id: str) -> bool:
-        """用户加入通话"""
-        call = (
-            db.query(im_model.CallLog)
-            .filter(im_model.CallLog.call_id == call_id)
-            .first()
-        )
-
-        if not call or call.status not in ["initiated", "ringing", "answered"]:
-            return False
-
-        # 检查是否已在通话中
-        existing = (
-            db.query(im_model.CallParticipant)
-            .filter(
-                im_model.CallParticipant.call_id == call_id,
-                im_model.CallParticipant.user_id == user_id,
-                im_model.CallParticipant.leave_time.is_(None),
-            )
-            .first()
-        )
-
-        if existing:
-            return True  # 已在通话中
-
-        # 添加参与者
-        participant = im_model.CallParticipant(
-            call_id=call_id, user_id=user_id, join_time=datetime.utcnow()
-        )
-        db.add(participant)
-
-        # 如果是第一次有人接听，更新状态为answered
-        if call.status in ["initiated", "ringing"]:
-            call.status = "answered"
-            call.answer_time = datetime.utcnow()
-
-        db.commit()
-
-        # 广播加入事件
-        try:
-            CallManagementService._broadcast_call_event(
-                call, "call.participant_joined", user_id
-            )
-        except Exception:
-            pass
-
-        return True
+    async def expire_call(call_id: str) -> Optional[CallState]:
+        """振铃超时或发起方断线：未接听的通话置为 missed"""
+        call = await call_state_store.expire_unanswered(call_id)
+        if call is None:
+            return None
+        await CallManagementService._finish(call, "call.status_changed", None)
+        return call
 
     @staticmethod
-    def leave_call(db: Session, call_id: str, user_id: str) -> bool:
-        """用户离开通话"""
-        participant = (
-            db.query(im_model.CallParticipant)
-            .filter(
-                im_model.CallParticipant.call_id == call_id,
-                im_model.CallParticipant.user_id == user_id,
-                im_model.CallParticipant.leave_time.is_(None),
-            )
-            .first()
-        )
-
-        if not participant:
-            return False
-
-        # 标记离开时间
-        participant.leave_time = datetime.utcnow()
-
-        # 检查是否还有其他活跃参与者
-        remaining_participants = (
-            db.query(im_model.CallParticipant)
-            .filter(
-                im_model.CallParticipant.call_id == call_id,
-                im_model.CallParticipant.leave_time.is_(None),
-                im_model.CallParticipant.user_id != user_id,
-            )
-            .count()
-        )
-
-        # 如果没有其他参与者，结束通话
-        if remaining_participants == 0:
-            call = (
-                db.query(im_model.CallLog)
-                .filter(im_model.CallLog.call_id == call_id)
-                .first()
-            )
-            if call and call.status not in ["completed", "missed", "rejected"]:
-                call.status = "completed"
-                call.end_time = datetime.utcnow()
-                if call.answer_time:
-                    call.duration_sec = int(
-                        (call.end_time - call.answer_time).total_seconds()
-                    )
-
-        db.commit()
-
-        # 广播离开事件
-        try:
-            call = (
-                db.query(im_model.CallLog)
-                .filter(im_model.CallLog.call_id == call_id)
-                .first()
-            )
-            if call:
-                CallManagementService._broadcast_call_event(
-                    call, "call.participant_left", user_id
-                )
-        except Exception:
-            pass
+    async def join_call(call_id: str, user_id: str) -> Optional[CallState]:
+        """用户加入通话，首次有人接听时状态变为 answered；无法加入返回 None"""
+        call = await call_state_store.join(call_id, user_id)
+        if call is None:
+            return None
+        await CallManagementService._finish(call, "call.participant_joined", user_id)
+        return call
 
-        return True
+    @staticmethod
+    async def leave_call(call_id: str, user_id: str) -> Optional[CallState]:
+        """用户离开通话，最后一人离开时通话结束；不在通话中返回 None"""
+        call = await call_state_store.leave(call_id, user_id)
+        if call is None:
+            return None
+        await CallManagementService._finish(call, "call.participant_left", user_id)
+        return call
 
     @staticmethod
-    def get_ice_configuration(user_id: str) -> Dict[str, Any]:
-        """获取ICE服务器配置"""
-        return webrtc_config.get_rtc_configuration(user_id)
+    def get_ice_configuration(
+        user_id: str, region: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """获取ICE服务器配置（region 为客户端所在区域，用于选择TURN服务器）"""
+        return webrtc_config.get_rtc_configuration(user_id, region)
 
     @staticmethod
     def _broadcast_call_event(
-        call: im_model.CallLog, event_type: str, user_id: Optional[str] = None
+        call: CallState, event_type: str, user_id: Optional[str] = None
     ):
         """广播通话事件"""
         payload = {
@@ -246,34 +131,71 @@ class CallManagementService:
         # 向会话频道广播
         publish_event_async(f"im:conv:{call.conversation_id}", payload)
 
+    @staticmethod
+    def encode_history_cursor(call: im_model.CallLog) -> str:
+        raw = f"{call.start_time.isoformat()}|{call.call_id}"
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_history_cursor(cursor: str) -> Tuple[datetime, str]:
+        """游标格式错误时抛出 ValueError"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+            start_time, call_id = raw.split("|", 1)
+            return datetime.fromisoformat(start_time), call_id
+        except Exception:
+            raise ValueError("Invalid cursor")
+
     @staticmethod
     def get_call_history(
-        db: Session, conversation_id: str, limit: int = 20, offset: int = 0
-    ) -> List[im_model.CallLog]:
-        """获取通话历史"""
-        calls = (
+        db: Session,
+        conversation_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        offset: int = 0,
+    ) -> Tuple[List[im_model.CallLog], Optional[str]]:
+        """
+        获取通话历史（按 start_time, call_id 倒序），返回 (通话列表, 下一页游标)
+        游标分页走 idx_calls_conv_start 索引，offset 仅为兼容旧客户端保留
+        """
+        q = (
             db.query(im_model.CallLog)
+            .options(joinedload(im_model.CallLog.participants))
             .filter(im_model.CallLog.conversation_id == conversation_id)
-            .order_by(im_model.CallLog.start_time.desc())
-            .offset(offset)
-            .limit(limit)
-            .all()
         )
-        return calls
+        if cursor:
+            start_time, call_id = CallManagementService.decode_history_cursor(cursor)
+            q = q.filter(
+                tuple_(im_model.CallLog.start_time, im_model.CallLog.call_id)
+                < tuple_(start_time, call_id)
+            )
+        q = q.order_by(
+            im_model.CallLog.start_time.desc(), im_model.CallLog.call_id.desc()
+        )
+        if offset and not cursor:
+            q = q.offset(offset)
+        # 多取一条判断是否还有下一页
+        calls = q.limit(limit + 1).all()
+        next_cursor = None
+        if len(calls) > limit:
+            calls = calls[:limit]
+            next_cursor = CallManagementService.encode_history_cursor(calls[-1])
+        return calls, next_cursor
 
     @staticmethod
-    def get_active_call(
-        db: Session, conversation_id: str
-    ) -> Optional[im_model.CallLog]:
-        """获取会话中的活跃通话"""
-        return (
-            db.query(im_model.CallLog)
-            .filter(
-                im_model.CallLog.conversation_id == conversation_id,
-                im_model.CallLog.status.in_(["initiated", "ringing", "answered"]),
-            )
-            .first()
+    def get_call_count(db: Session, conversation_id: str) -> int:
+        """会话通话记录总数（读取会话上维护的计数）"""
+        count = (
+            db.query(im_model.Conversation.call_count)
+            .filter(im_model.Conversation.conversation_id == conversation_id)
+            .scalar()
         )
+        return count or 0
+
+    @staticmethod
+    async def get_active_call(conversation_id: str) -> Optional[CallState]:
+        """获取会话中的活跃通话"""
+        return await call_state_store.get_active(conversation_id)
 
 
 class WebRTCSignalingService:
@@ -0,0 +1,716 @@
+"""
+通话状态存储
+活跃通话（状态、参与者、时间戳）的状态机：
+- 配置 REDIS_URL 时保存在 Redis 哈希中，状态转换由 Lua 脚本原子完成
+  （同一会话仅一个活跃通话、重复接听等竞争在 Redis 内解决），通话结束后异步写入
+  call_logs/call_participants，建立通话不依赖数据库；进入终态的通话同时登记到
+  待持久化队列，写入成功后移除，失败或进程退出时由超时调度重试
+- 未配置 Redis 时直接读写数据库
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.exc import IntegrityError
+
+from ..core.config import settings
+from ..core.serialization import loads
+from ..models import im as im_model
+
+try:
+    from redis import asyncio as aioredis  # type: ignore
+
+    REDIS_AVAILABLE = True
+except Exception:  # pragma: no cover
+    aioredis = None
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("initiated", "ringing", "answered")
+TERMINAL_STATUSES = ("completed", "missed", "rejected")
+
+
+def _ts(value: Optional[float]) -> Optional[datetime]:
+    return datetime.utcfromtimestamp(value) if value else None
+
+
+class CallState:
+    """通话状态快照（字段与 CallLog 一致，participants 为加入/离开记录）"""
+
+    __slots__ = (
+        "call_id",
+        "conversation_id",
+        "initiator_id",
+        "status",
+        "start_time",
+        "answer_time",
+        "end_time",
+        "duration_sec",
+        "participants",
+        "changed",
+    )
+
+    def __init__(
+        self,
+        call_id: str,
+        conversation_id: str,
+        initiator_id: str,
+        status: str,
+        start_time: Optional[datetime],
+        answer_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        duration_sec: Optional[int] = None,
+        participants: Optional[List[Dict[str, Any]]] = None,
+        changed: bool = False,
+    ):
+        self.call_id = call_id
+        self.conversation_id = conversation_id
+        self.initiator_id = initiator_id
+        self.status = status
+        self.start_time = start_time
+        self.answer_time = answer_time
+        self.end_time = end_time
+        self.duration_sec = duration_sec
+        # [{"user_id", "join_time", "leave_time"}]，时间为 datetime
+        self.participants = participants or []
+        # 本次操作是否改变了状态（重复的拒绝/挂断等无变化时为 False）
+        self.changed = changed
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def active_participants(self) -> List[str]:
+        return [p["user_id"] for p in self.participants if p.get("leave_time") is None]
+
+    @classmethod
+    def from_call_log(cls, call: im_model.CallLog) -> "CallState":
+        return cls(
+            call_id=call.call_id,
+            conversation_id=call.conversation_id,
+            initiator_id=call.initiator_id,
+            status=call.status,
+            start_time=call.start_time,
+            answer_time=call.answer_time,
+            end_time=call.end_time,
+            duration_sec=call.duration_sec,
+            participants=[
+                {
+                    "user_id": p.user_id,
+                    "join_time": p.join_time,
+                    "leave_time": p.leave_time,
+                }
+                for p in sorted(
+                    call.participants, key=lambda p: p.join_time or datetime.min
+                )
+            ],
+        )
+
+    @classmethod
+    def from_redis(cls, data: Dict[bytes, bytes]) -> "CallState":
+        fields = {
+            (k.decode() if isinstance(k, bytes) else k): (
+                v.decode() if isinstance(v, bytes) else v
+            )
+            for k, v in data.items()
+        }
+        raw = loads(fields.get("participants") or "[]")
+        # cjson 将空表编码为 {}
+        participants = raw if isinstance(raw, list) else []
+        return cls(
+            call_id=fields["call_id"],
+            conversation_id=fields["conversation_id"],
+            initiator_id=fields["initiator_id"],
+            status=fields["status"],
+            start_time=_ts(float(fields.get("start_time") or 0)),
+            answer_time=_ts(float(fields.get("answer_time") or 0)),
+            end_time=_ts(float(fields.get("end_time") or 0)),
+            duration_sec=(
+                int(float(fields["duration_sec"]))
+                if fields.get("duration_sec")
+                else None
+            ),
+            participants=[
+                {
+                    "user_id": p["user_id"],
+                    "join_time": _ts(p.get("join_time")),
+                    "leave_time": _ts(p.get("leave_time")),
+                }
+                for p in participants
+            ],
+        )
+
+
+def _count_call(db, conversation_id: str) -> None:
+    """新增通话记录时递增会话的通话计数（与插入同一事务）"""
+    db.query(im_model.Conversation).filter(
+        im_model.Conversation.conversation_id == conversation_id
+    ).update(
+        {im_model.Conversation.call_count: im_model.Conversation.call_count + 1},
+        synchronize_session=False,
+    )
+
+
+def _apply_terminal(call: im_model.CallLog, status: str, now: datetime) -> None:
+    call.status = status
+    call.end_time = now
+    if call.answer_time:
+        call.duration_sec = int((now - call.answer_time).total_seconds())
+    for p in call.participants:
+        if p.leave_time is None:
+            p.leave_time = now
+
+
+class SQLCallStateStore:
+    """直接读写 call_logs/call_participants（未配置 Redis 时使用）"""
+
+    @staticmethod
+    def _run(func, *args):
+        from ..core.database import SessionLocal
+
+        def call():
+            db = SessionLocal()
+            try:
+                return func(db, *args)
+            finally:
+                db.close()
+
+        return asyncio.to_thread(call)
+
+    @staticmethod
+    def _get(db, call_id: str) -> Optional[im_model.CallLog]:
+        return db.get(im_model.CallLog, call_id)
+
+    @classmethod
+    def _create(
+        cls, db, conversation_id: str, initiator_id: str
+    ) -> Optional[CallState]:
+        # 每个会话一个活跃通话由部分唯一索引 uq_calls_conv_active 保证
+        now = datetime.utcnow()
+        call = im_model.CallLog(
+            conversation_id=conversation_id,
+            initiator_id=initiator_id,
+            status="initiated",
+            start_time=now,
+        )
+        call.participants.append(
+            im_model.CallParticipant(user_id=initiator_id, join_time=now)
+        )
+        db.add(call)
+        try:
+            db.flush()
+            _count_call(db, conversation_id)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return None
+        return cls._changed(call)
+
+    @staticmethod
+    def _changed(call: im_model.CallLog) -> CallState:
+        state = CallState.from_call_log(call)
+        state.changed = True
+        return state
+
+    @classmethod
+    def _join(cls, db, call_id: str, user_id: str) -> Optional[CallState]:
+        call = cls._get(db, call_id)
+        if call is None or call.status not in ACTIVE_STATUSES:
+            return None
+        now = datetime.utcnow()
+        changed = False
+        if not any(
+            p.user_id == user_id and p.leave_time is None for p in call.participants
+        ):
+            call.participants.append(
+                im_model.CallParticipant(user_id=user_id, join_time=now)
+            )
+            changed = True
+        if call.status != "answered":
+            call.status = "answered"
+            call.answer_time = now
+            changed = True
+        if not changed:
+            return CallState.from_call_log(call)
+        try:
+            db.commit()
+        except IntegrityError:
+            # 并发重复加入（uq_call_participants_open），以已提交的状态为准
+            db.rollback()
+            return cls._load(db, call_id)
+        return cls._changed(call)
+
+    @classmethod
+    def _leave(cls, db, call_id: str, user_id: str) -> Optional[CallState]:
+        call = cls._get(db, call_id)
+        if call is None:
+            return None
+        mine = [
+            p
+            for p in call.participants
+            if p.user_id == user_id and p.leave_time is None
+        ]
+        if not mine:
+            return None
+        now = datetime.utcnow()
+        for p in mine:
+            p.leave_time = now
+        remaining = [p for p in call.participants if p.leave_time is None]
+        if not remaining and call.status in ACTIVE_STATUSES:
+            _apply_terminal(call, "completed", now)
+        db.commit()
+        return cls._changed(call)
+
+    @classmethod
+    def _set_status(cls, db, call_id: str, status: str) -> Optional[CallState]:
+        call = cls._get(db, call_id)
+        if call is None:
+            return None
+        if call.status not in ACTIVE_STATUSES or call.status == status:
+            return CallState.from_call_log(call)
+        now = datetime.utcnow()
+        if status in TERMINAL_STATUSES:
+            _apply_terminal(call, status, now)
+        else:
+            if status == "answered":
+                call.answer_time = now
+            call.status = status
+        db.commit()
+        return cls._changed(call)
+
+    @classmethod
+    def _expire(cls, db, call_id: str) -> Optional[CallState]:
+        call = cls._get(db, call_id)
+        if call is None or call.status not in ("initiated", "ringing"):
+            return None
+        _apply_terminal(call, "missed", datetime.utcnow())
+        db.commit()
+        return cls._changed(call)
+
+    @classmethod
+    def _load(cls, db, call_id: str) -> Optional[CallState]:
+        call = cls._get(db, call_id)
+        return CallState.from_call_log(call) if call is not None else None
+
+    @staticmethod
+    def _load_active(db, conversation_id: str) -> Optional[CallState]:
+        call = (
+            db.query(im_model.CallLog)
+            .filter(
+                im_model.CallLog.conversation_id == conversation_id,
+                im_model.CallLog.status.in_(ACTIVE_STATUSES),
+            )
+            .first()
+        )
+        return CallState.from_call_log(call) if call is not None else None
+
+    @staticmethod
+    def _load_all_active(db) -> List[CallState]:
+        calls = (
+            db.query(im_model.CallLog)
+            .filter(im_model.CallLog.status.in_(ACTIVE_STATUSES))
+            .all()
+        )
+        return [CallState.from_call_log(call) for call in calls]
+
+    async def create(
+        self, conversation_id: str, initiator_id: str
+    ) -> Optional[CallState]:
+        """会话中已有活跃通话时返回 None"""
+        return await self._run(self._create, conversation_id, initiator_id)
+
+    async def join(self, call_id: str, user_id: str) -> Optional[CallState]:
+        return await self._run(self._join, call_id, user_id)
+
+    async def leave(self, call_id: str, user_id: str) -> Optional[CallState]:
+        return await self._run(self._leave, call_id, user_id)
+
+    async def set_status(self, call_id: str, status: str) -> Optional[CallState]:
+        return await self._run(self._set_status, call_id, status)
+
+    async def expire_unanswered(self, call_id: str) -> Optional[CallState]:
+        """未接听的通话置为 missed；已接听或已结束返回 None"""
+        return await self._run(self._expire, call_id)
+
+    async def get(self, call_id: str) -> Optional[CallState]:
+        return await self._run(self._load, call_id)
+
+    async def get_active(self, conversation_id: str) -> Optional[CallState]:
+        return await self._run(self._load_active, conversation_id)
+
+    async def list_active(self) -> List[CallState]:
+        """全部活跃通话（进程重启后重建超时调度）"""
+        return await self._run(self._load_all_active)
+
+    def persist(self, state: CallState) -> None:
+        """状态转换时已写入数据库"""
+
+    async def retry_persist(self, limit: int) -> int:
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+
+# KEYS[1]=会话活跃通话指针 KEYS[2]=通话哈希
+# ARGV: call_id, conversation_id, initiator_id, now, ttl
+_CREATE_LUA = """
+if not redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[5]) then
+  return redis.call('GET', KEYS[1])
+end
+local participants = cjson.encode({{user_id = ARGV[3], join_time = tonumber(ARGV[4])}})
+redis.call('HSET', KEYS[2], 'call_id', ARGV[1], 'conversation_id', ARGV[2],
+  'initiator_id', ARGV[3], 'status', 'initiated', 'start_time', ARGV[4],
+  'participants', participants)
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return 1
+"""
+
+# 公共函数：进入终态时关闭参与者、释放会话指针、取消通话哈希的过期时间，
+# 并登记到待持久化队列（KEYS[3]，score 为登记时间）
+# 转换脚本返回 {是否发生变化, HGETALL}
+_LUA_COMMON = """
+local function is_active(status)
+  return status == 'initiated' or status == 'ringing' or status == 'answered'
+end
+local function decode_participants()
+  local raw = redis.call('HGET', KEYS[1], 'participants')
+  local ok, list = pcall(cjson.decode, raw or '[]')
+  if not ok or type(list) ~= 'table' then return {} end
+  return list
+end
+local function is_present(p)
+  return p.leave_time == nil or p.leave_time == cjson.null
+end
+local function finish(status, now)
+  local list = decode_participants()
+  for _, p in ipairs(list) do
+    if is_present(p) then p.leave_time = now end
+  end
+  if #list > 0 then
+    redis.call('HSET', KEYS[1], 'participants', cjson.encode(list))
+  end
+  redis.call('HSET', KEYS[1], 'status', status, 'end_time', now)
+  local answered = tonumber(redis.call('HGET', KEYS[1], 'answer_time') or '')
+  if answered then
+    redis.call('HSET', KEYS[1], 'duration_sec', math.floor(now - answered))
+  end
+  local call_id = redis.call('HGET', KEYS[1], 'call_id')
+  if redis.call('GET', KEYS[2]) == call_id then
+    redis.call('DEL', KEYS[2])
+  end
+  -- 取消过期时间直到终态写入 call_logs（写入成功后才设置结束后的保留时间），
+  -- 写入失败持续多久都能从哈希重试
+  redis.call('PERSIST', KEYS[1])
+  redis.call('ZADD', KEYS[3], now, call_id)
+end
+local function reply(changed)
+  return {changed, redis.call('HGETALL', KEYS[1])}
+end
+"""
+
+# KEYS[1]=通话哈希 KEYS[2]=会话活跃通话指针 KEYS[3]=待持久化队列；ARGV: user_id, now
+_JOIN_LUA = (
+    _LUA_COMMON
+    + """
+local status = redis.call('HGET', KEYS[1], 'status')
+if not status or not is_active(status) then return nil end
+local now = tonumber(ARGV[2])
+local list = decode_participants()
+local present = false
+for _, p in ipairs(list) do
+  if p.user_id == ARGV[1] and is_present(p) then present = true end
+end
+local changed = 0
+if not present then
+  table.insert(list, {user_id = ARGV[1], join_time = now})
+  redis.call('HSET', KEYS[1], 'participants', cjson.encode(list))
+  changed = 1
+end
+if status ~= 'answered' then
+  redis.call('HSET', KEYS[1], 'status', 'answered', 'answer_time', ARGV[2])
+  changed = 1
+end
+return reply(changed)
+"""
+)
+
+# KEYS 同上；ARGV: user_id, now
+_LEAVE_LUA = (
+    _LUA_COMMON
+    + """
+local status = redis.call('HGET', KEYS[1], 'status')
+if not status then return nil end
+local now = tonumber(ARGV[2])
+local list = decode_participants()
+local found, remaining = false, 0
+for _, p in ipairs(list) do
+  if is_present(p) then
+    if p.user_id == ARGV[1] then
+      p.leave_time = now
+      found = true
+    else
+      remaining = remaining + 1
+    end
+  end
+end
+if not found then return nil end
+redis.call('HSET', KEYS[1], 'participants', cjson.encode(list))
+if remaining == 0 and is_active(status) then
+  finish('completed', now)
+end
+return reply(1)
+"""
+)
+
+# KEYS 同上；ARGV: new_status, now
+_STATUS_LUA = (
+    _LUA_COMMON
+    + """
+local status = redis.call('HGET', KEYS[1], 'status')
+if not status then return nil end
+local new_status = ARGV[1]
+-- 已结束或状态未变：不做修改，由调用方跳过持久化与广播
+if not is_active(status) or new_status == status then return reply(0) end
+if is_active(new_status) then
+  if new_status == 'answered' then
+    redis.call('HSET', KEYS[1], 'answer_time', ARGV[2])
+  end
+  redis.call('HSET', KEYS[1], 'status', new_status)
+else
+  finish(new_status, tonumber(ARGV[2]))
+end
+return reply(1)
+"""
+)
+
+
+# KEYS 同上；ARGV: now
+_EXPIRE_LUA = (
+    _LUA_COMMON
+    + """
+local status = redis.call('HGET', KEYS[1], 'status')
+if status ~= 'initiated' and status ~= 'ringing' then return nil end
+finish('missed', tonumber(ARGV[1]))
+return reply(1)
+"""
+)
+
+
+# KEYS[1]=待持久化队列；ARGV: cutoff, limit, now
+# 取出登记早于 cutoff 的通话并把 score 更新为 now，重试期间其他实例不会重复领取
+_CLAIM_PERSIST_LUA = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, item in ipairs(items) do
+  redis.call('ZADD', KEYS[1], ARGV[3], item)
+end
+return items
+"""
+
+_PERSIST_KEY = "call:persist"
+
+
+def _pairs_to_dict(values) -> Dict[bytes, bytes]:
+    return dict(zip(values[::2], values[1::2]))
+
+
+class RedisCallStateStore:
+    """Redis 哈希保存活跃通话，Lua 脚本完成原子状态转换"""
+
+    def __init__(self, url: str):
+        self._redis = aioredis.from_url(url)
+        self._create_script = self._redis.register_script(_CREATE_LUA)
+        self._join_script = self._redis.register_script(_JOIN_LUA)
+        self._leave_script = self._redis.register_script(_LEAVE_LUA)
+        self._status_script = self._redis.register_script(_STATUS_LUA)
+        self._expire_script = self._redis.register_script(_EXPIRE_LUA)
+        self._claim_script = self._redis.register_script(_CLAIM_PERSIST_LUA)
+        self._tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _call_key(call_id: str) -> str:
+        return f"call:{call_id}"
+
+    @staticmethod
+    def _active_key(conversation_id: str) -> str:
+        return f"call:active:{conversation_id}"
+
+    async def _keys_for(self, call_id: str) -> Optional[List[str]]:
+        conversation_id = await self._redis.hget(
+            self._call_key(call_id), "conversation_id"
+        )
+        if conversation_id is None:
+            return None
+        if isinstance(conversation_id, bytes):
+            conversation_id = conversation_id.decode()
+        return [
+            self._call_key(call_id),
+            self._active_key(conversation_id),
+            _PERSIST_KEY,
+        ]
+
+    async def create(
+        self, conversation_id: str, initiator_id: str
+    ) -> Optional[CallState]:
+        call_id = f"call_{uuid.uuid4()}"
+        result = await self._create_script(
+            keys=[self._active_key(conversation_id), self._call_key(call_id)],
+            args=[
+                call_id,
+                conversation_id,
+                initiator_id,
+                time.time(),
+                settings.CALL_STATE_TTL_SECONDS,
+            ],
+        )
+        if result != 1:
+            return None
+        return await self.get(call_id)
+
+    async def _transition(self, script, call_id: str, *args) -> Optional[CallState]:
+        keys = await self._keys_for(call_id)
+        if keys is None:
+            return None
+        result = await script(keys=keys, args=list(args))
+        if not result:
+            return None
+        changed, values = result
+        state = CallState.from_redis(_pairs_to_dict(values))
+        state.changed = bool(changed)
+        return state
+
+    async def join(self, call_id: str, user_id: str) -> Optional[CallState]:
+        return await self._transition(self._join_script, call_id, user_id, time.time())
+
+    async def leave(self, call_id: str, user_id: str) -> Optional[CallState]:
+        return await self._transition(self._leave_script, call_id, user_id, time.time())
+
+    async def set_status(self, call_id: str, status: str) -> Optional[CallState]:
+        return await self._transition(self._status_script, call_id, status, time.time())
+
+    async def expire_unanswered(self, call_id: str) -> Optional[CallState]:
+        """未接听的通话置为 missed；已接听或已结束返回 None"""
+        return await self._transition(self._expire_script, call_id, time.time())
+
+    async def get(self, call_id: str) -> Optional[CallState]:
+        data = await self._redis.hgetall(self._call_key(call_id))
+        return CallState.from_redis(data) if data else None
+
+    async def get_active(self, conversation_id: str) -> Optional[CallState]:
+        call_id = await self._redis.get(self._active_key(conversation_id))
+        if call_id is None:
+            return None
+        if isinstance(call_id, bytes):
+            call_id = call_id.decode()
+        state = await self.get(call_id)
+        return state if state is not None and state.is_active else None
+
+    # --- 终态持久化 ---
+
+    @classmethod
+    def _write(cls, state: CallState) -> None:
+        try:
+            cls._upsert(state)
+        except IntegrityError:
+            # 与另一实例的重试并发插入，记录已存在，按更新重写一次
+            cls._upsert(state)
+
+    @staticmethod
+    def _upsert(state: CallState) -> None:
+        from ..core.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            call = db.get(im_model.CallLog, state.call_id)
+            if call is None:
+                call = im_model.CallLog(
+                    call_id=state.call_id,
+                    conversation_id=state.conversation_id,
+                    initiator_id=state.initiator_id,
+                )
+                db.add(call)
+                _count_call(db, state.conversation_id)
+            call.status = state.status
+            if state.start_time is not None:
+                call.start_time = state.start_time
+            call.answer_time = state.answer_time
+            call.end_time = state.end_time
+            call.duration_sec = state.duration_sec
+            call.participants = [
+                im_model.CallParticipant(
+                    call_id=state.call_id,
+                    user_id=p["user_id"],
+                    join_time=p["join_time"],
+                    leave_time=p["leave_time"] or state.end_time,
+                )
+                for p in state.participants
+            ]
+            db.commit()
+        finally:
+            db.close()
+
+    async def _persist(self, state: CallState) -> None:
+        try:
+            await asyncio.to_thread(self._write, state)
+        except Exception as e:
+            # 通话哈希没有过期时间，保留到重试成功
+            logger.warning(f"Failed to persist call {state.call_id}: {e}")
+            return
+        try:
+            await self._redis.expire(
+                self._call_key(state.call_id), settings.CALL_STATE_ENDED_TTL_SECONDS
+            )
+            await self._redis.zrem(_PERSIST_KEY, state.call_id)
+        except Exception:
+            # 队列项保留，重试时按已存在的记录更新并再次设置过期时间
+            pass
+
+    def persist(self, state: CallState) -> None:
+        """
+        后台写入 call_logs/call_participants，不阻塞状态转换；
+        终态已由 Lua 脚本登记到待持久化队列，写入成功后移除
+        """
+        task = asyncio.create_task(self._persist(state))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def retry_persist(self, limit: int) -> int:
+        """重试登记超过 CALL_PERSIST_RETRY_SECONDS 仍未写入的通话，返回处理数量"""
+        now = time.time()
+        items = await self._claim_script(
+            keys=[_PERSIST_KEY],
+            args=[now - settings.CALL_PERSIST_RETRY_SECONDS, limit, now],
+        )
+        for item in items or []:
+            call_id = item.decode() if isinstance(item, bytes) else item
+            state = await self.get(call_id)
+            if state is None or state.is_active:
+                if state is None:
+                    logger.error(f"Call {call_id} expired before it was persisted")
+                await self._redis.zrem(_PERSIST_KEY, call_id)
+                continue
+            await self._persist(state)
+        return len(items or [])
+
+    async def close(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        try:
+            await self._redis.close()
+        except Exception:
+            pass
+
+
+call_state_store = (
+    RedisCallStateStore(settings.REDIS_URL)
+    if (REDIS_AVAILABLE and settings.REDIS_URL)
+    else SQLCallStateStore()
+)
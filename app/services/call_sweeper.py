@@ -0,0 +1,255 @@
+"""
+通话超时调度
+- 振铃超时：创建通话时登记 ring:{call_id}，到期仍未接听则置为 missed
+- 断线检测：登记 presence:{call_id}，到期时检查参与者的 WebSocket 在线状态，
+  全部离线则结束通话，否则顺延到下一个检查周期
+到期项保存在 Redis 有序集合（score 为到期时间，多实例共享，Lua 脚本原子取出一批），
+未配置 Redis 时使用进程内最小堆；后台任务按批处理到期项，不轮询数据库，
+并重试写入 call_logs 失败的已结束通话
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import time
+from datetime import timezone
+from typing import Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.presence import presence
+from .call_state import CallState, call_state_store
+
+try:
+    from redis import asyncio as aioredis  # type: ignore
+
+    REDIS_AVAILABLE = True
+except Exception:  # pragma: no cover
+    aioredis = None
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_RING = "ring"
+_PRESENCE = "presence"
+
+# KEYS[1]=到期有序集合；ARGV: now, limit
+_POP_DUE_LUA = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #items > 0 then
+  redis.call('ZREM', KEYS[1], unpack(items))
+end
+return items
+"""
+
+
+class RedisDeadlineQueue:
+    """到期队列：Redis 有序集合"""
+
+    def __init__(self, url: str, key: str = "call:deadlines"):
+        self._redis = aioredis.from_url(url)
+        self._key = key
+        self._pop_script = self._redis.register_script(_POP_DUE_LUA)
+
+    async def schedule(self, member: str, deadline: float) -> None:
+        await self._redis.zadd(self._key, {member: deadline})
+
+    async def cancel(self, *members: str) -> None:
+        if members:
+            await self._redis.zrem(self._key, *members)
+
+    async def pop_due(self, now: float, limit: int) -> List[str]:
+        items = await self._pop_script(keys=[self._key], args=[now, limit])
+        return [i.decode() if isinstance(i, bytes) else i for i in items or []]
+
+    async def close(self) -> None:
+        try:
+            await self._redis.close()
+        except Exception:
+            pass
+
+
+class LocalDeadlineQueue:
+    """到期队列：进程内最小堆（重复登记或取消的旧项在出堆时丢弃）"""
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}
+
+    async def schedule(self, member: str, deadline: float) -> None:
+        self._deadlines[member] = deadline
+        heapq.heappush(self._heap, (deadline, member))
+
+    async def cancel(self, *members: str) -> None:
+        for member in members:
+            self._deadlines.pop(member, None)
+
+    async def pop_due(self, now: float, limit: int) -> List[str]:
+        due: List[str] = []
+        while self._heap and self._heap[0][0] <= now and len(due) < limit:
+            deadline, member = heapq.heappop(self._heap)
+            if self._deadlines.get(member) == deadline:
+                del self._deadlines[member]
+                due.append(member)
+        return due
+
+    async def close(self) -> None:
+        pass
+
+
+class CallSweeper:
+    """振铃超时与断线结束通话"""
+
+    def __init__(
+        self,
+        queue=None,
+        ring_timeout: int = settings.CALL_RING_TIMEOUT_SECONDS,
+        presence_interval: int = settings.CALL_PRESENCE_CHECK_SECONDS,
+        interval: float = settings.CALL_SWEEP_INTERVAL_SECONDS,
+        batch_size: int = settings.CALL_SWEEP_BATCH_SIZE,
+    ):
+        if queue is None:
+            queue = (
+                RedisDeadlineQueue(settings.REDIS_URL)
+                if (REDIS_AVAILABLE and settings.REDIS_URL)
+                else LocalDeadlineQueue()
+            )
+        self.queue = queue
+        self.ring_timeout = ring_timeout
+        self.presence_interval = presence_interval
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _members(call_id: str) -> Tuple[str, str]:
+        return f"{_RING}:{call_id}", f"{_PRESENCE}:{call_id}"
+
+    async def _schedule_presence(self, call_id: str) -> None:
+        if self.presence_interval > 0:
+            await self.queue.schedule(
+                f"{_PRESENCE}:{call_id}", time.time() + self.presence_interval
+            )
+
+    async def call_created(self, call: CallState) -> None:
+        """登记振铃超时与首次在线检查"""
+        try:
+            if self.ring_timeout > 0:
+                await self.queue.schedule(
+                    f"{_RING}:{call.call_id}", time.time() + self.ring_timeout
+                )
+            await self._schedule_presence(call.call_id)
+        except Exception as e:
+            logger.warning(f"Failed to schedule call {call.call_id}: {e}")
+
+    async def call_ended(self, call_id: str) -> None:
+        """通话已结束，移除待处理项"""
+        try:
+            await self.queue.cancel(*self._members(call_id))
+        except Exception:
+            pass
+
+    # --- 到期处理 ---
+
+    async def _check_presence(self, call_id: str) -> None:
+        from .call_service import CallManagementService
+
+        call = await CallManagementService.get_call(call_id)
+        if call is None or not call.is_active:
+            return
+        for user_id in call.active_participants:
+            if await presence.is_online(user_id):
+                await self._schedule_presence(call_id)
+                return
+        if call.status == "answered":
+            ended = await CallManagementService.update_call_status(call_id, "completed")
+        else:
+            ended = await CallManagementService.expire_call(call_id)
+        if ended is None or ended.is_active:
+            # 期间状态已变化（如刚被接听），下个周期再检查
+            await self._schedule_presence(call_id)
+
+    async def _handle(self, member: str) -> None:
+        from .call_service import CallManagementService
+
+        kind, _, call_id = member.partition(":")
+        if kind == _RING:
+            await CallManagementService.expire_call(call_id)
+        elif kind == _PRESENCE:
+            await self._check_presence(call_id)
+
+    async def run_once(self, now: Optional[float] = None) -> int:
+        """处理所有已到期项，返回处理数量"""
+        now = time.time() if now is None else now
+        handled = 0
+        while True:
+            due = await self.queue.pop_due(now, self.batch_size)
+            if not due:
+                break
+            results = await asyncio.gather(
+                *(self._handle(member) for member in due), return_exceptions=True
+            )
+            for member, result in zip(due, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Call sweep failed for {member}: {result}")
+            handled += len(due)
+            if len(due) < self.batch_size:
+                break
+        return handled
+
+    # --- 后台任务 ---
+
+    async def _restore(self) -> None:
+        """进程内队列在重启后丢失，从数据库重建一次活跃通话的调度"""
+        if not isinstance(self.queue, LocalDeadlineQueue) or not hasattr(
+            call_state_store, "list_active"
+        ):
+            return
+        now = time.time()
+        for call in await call_state_store.list_active():
+            if call.status != "answered" and self.ring_timeout > 0:
+                started = (
+                    call.start_time.replace(tzinfo=timezone.utc).timestamp()
+                    if call.start_time
+                    else now
+                )
+                await self.queue.schedule(
+                    f"{_RING}:{call.call_id}",
+                    max(now, started + self.ring_timeout),
+                )
+            await self._schedule_presence(call.call_id)
+
+    async def _loop(self) -> None:
+        try:
+            await self._restore()
+        except Exception as e:
+            logger.warning(f"Failed to restore call deadlines: {e}")
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+                # 补写未能持久化的已结束通话（Redis 状态存储）
+                await call_state_store.retry_persist(self.batch_size)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Call sweep failed: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        await self.queue.close()
+
+
+# 全局通话超时调度实例
+call_sweeper = CallSweeper()
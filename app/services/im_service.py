@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from ..models import im as im_model
 from ..core.events import publish_event_async
 from ..core.seq import next_seq
+from . import media_service
 
 
 def create_conversation(
@@ -127,6 +128,15 @@ def create_message(
     )
     db.add(msg)
 
+    # 消息引用的媒体标记为已引用，不再被孤立媒体回收
+    if isinstance(req.content, dict):
+        media_id = req.content.get("media_id")
+        if isinstance(media_id, str) and media_id:
+            db.flush()
+            media_service.mark_referenced(
+                db, media_id, req.conversation_id, msg.message_id
+            )
+
     conv = (
         db.query(im_model.Conversation)
         .filter(im_model.Conversation.conversation_id == req.conversation_id)
@@ -0,0 +1,345 @@
+"""
+孤立媒体回收
+后台定期执行：
+- 清理超过宽限期仍未被任何消息引用（message_id 为空）的 media_objects 记录
+  （含过期的 pending 上传，进行中的分段上传一并 abort）
+- 扫描 conversations/*/media/ 与 blobs/ 下的对象，删除没有任何 media_objects / media_blobs
+  记录指向且超过宽限期的对象
+- 删除超过宽限期的非当前版本与删除标记（存储桶启用了版本控制，覆盖/删除不会释放空间）
+引用关系以 media_objects（message_id、object_key、blob_sha256）为准；
+message_id 为空的记录与没有记录的历史对象，删除前再按消息内容确认未被引用。
+删除不可恢复，默认关闭（MEDIA_GC_ENABLED）。
+删除通过 remove_objects 分批执行，批次之间休眠以限制对对象存储的压力
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from minio.deleteobjects import DeleteObject
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.media_storage import MediaStorageService, media_storage
+from ..core.monitoring import MEDIA_GC_DELETED_OBJECTS, MEDIA_GC_RECLAIMED_BYTES
+from ..models import im as im_model
+from . import media_service
+
+logger = logging.getLogger(__name__)
+
+_MEDIA_PREFIX = "conversations/"
+_BLOB_PREFIX = "blobs/"
+_LOCK_KEY = "media:gc:lock"
+# 执行期间按租约续期锁，锁不会在一轮回收结束前过期
+_LOCK_LEASE_SECONDS = 60
+
+# 仍由本实例持有时才续期（只延长，不缩短按间隔设置的过期时间）
+_RENEW_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if redis.call('TTL', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 1
+"""
+
+
+def _parse_media_key(object_key: str) -> Optional[Tuple[str, str]]:
+    """conversations/{conv}/media/{media_id} -> (conv, media_id)"""
+    parts = object_key.split("/")
+    if len(parts) != 4 or parts[0] != "conversations" or parts[2] != "media":
+        return None
+    return parts[1], parts[3]
+
+
+class MediaGarbageCollector:
+    """孤立媒体对象回收器"""
+
+    def __init__(
+        self,
+        storage: MediaStorageService = media_storage,
+        grace_seconds: int = settings.MEDIA_GC_GRACE_SECONDS,
+        batch_size: int = settings.MEDIA_GC_BATCH_SIZE,
+        batch_interval: float = settings.MEDIA_GC_BATCH_INTERVAL_SECONDS,
+        interval: int = settings.MEDIA_GC_INTERVAL_SECONDS,
+    ):
+        self.storage = storage
+        self.grace_seconds = grace_seconds
+        # S3 DeleteObjects 单次最多 1000 个对象
+        self.batch_size = max(1, min(batch_size, 1000))
+        self.batch_interval = batch_interval
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    # --- 记录清理 ---
+
+    @staticmethod
+    def _message_refs(
+        db: Session, pairs: Set[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], str]:
+        """按消息内容查找引用 (会话, media_id) 的最早消息"""
+        if not pairs:
+            return {}
+        media_ref = im_model.IMMessage.content["media_id"].as_string()
+        rows = (
+            db.query(
+                im_model.IMMessage.conversation_id,
+                media_ref,
+                im_model.IMMessage.message_id,
+            )
+            .filter(
+                im_model.IMMessage.conversation_id.in_({c for c, _ in pairs}),
+                media_ref.in_({m for _, m in pairs}),
+            )
+            .order_by(im_model.IMMessage.created_at.desc())
+            .all()
+        )
+        # 倒序遍历，同一媒体保留最早的消息
+        return {
+            (conv, media_id): message_id
+            for conv, media_id, message_id in rows
+            if (conv, media_id) in pairs
+        }
+
+    def sweep_rows(self, db: Session, cutoff: datetime) -> int:
+        """删除超过宽限期且未被消息引用的媒体记录，对象由随后的存储扫描回收"""
+        candidates = (
+            db.query(im_model.MediaObject)
+            .filter(
+                im_model.MediaObject.message_id.is_(None),
+                im_model.MediaObject.created_at < cutoff,
+            )
+            .all()
+        )
+        # 未回填的历史引用（如以 --sql 离线执行的迁移）按消息内容补记，不删除
+        refs = self._message_refs(
+            db, {(m.conversation_id, m.media_id) for m in candidates}
+        )
+        removed = 0
+        for media in candidates:
+            message_id = refs.get((media.conversation_id, media.media_id))
+            if message_id is not None:
+                media.message_id = message_id
+                continue
+            if media.upload_id:
+                self.storage.abort_multipart_upload(media.object_key, media.upload_id)
+            if media.blob_sha256:
+                media_service.release_blob(db, media)
+            else:
+                db.delete(media)
+            removed += 1
+        db.commit()
+        return removed
+
+    # --- 对象清理 ---
+
+    def _orphan_media_keys(self, db: Session, objects: List) -> Set[str]:
+        """
+        一页最新版本对象中没有媒体记录指向、也没有消息引用的 conversations/*/media/ 键
+        （media_objects 之前上传的历史媒体没有记录，只能按消息内容确认）
+        """
+        parsed = {obj.object_name: _parse_media_key(obj.object_name) for obj in objects}
+        names = [name for name, ref in parsed.items() if ref is not None]
+        if not names:
+            return set()
+        known = {
+            row[0]
+            for row in db.query(im_model.MediaObject.object_key)
+            .filter(im_model.MediaObject.object_key.in_(names))
+            .all()
+        }
+        rowless = {name: parsed[name] for name in names if name not in known}
+        referenced = self._message_refs(db, set(rowless.values()))
+        return {name for name, ref in rowless.items() if ref not in referenced}
+
+    def _orphan_blob_keys(self, db: Session, objects: List) -> Set[str]:
+        """既没有 media_blobs 记录、也没有媒体记录引用的 blobs/ 对象"""
+        shas = {
+            obj.object_name.rsplit("/", 1)[-1]: obj.object_name
+            for obj in objects
+            if obj.object_name.startswith(_BLOB_PREFIX)
+        }
+        if not shas:
+            return set()
+        known = {
+            row[0]
+            for row in db.query(im_model.MediaBlob.sha256)
+            .filter(im_model.MediaBlob.sha256.in_(list(shas)))
+            .all()
+        }
+        known.update(
+            row[0]
+            for row in db.query(im_model.MediaObject.blob_sha256)
+            .filter(im_model.MediaObject.blob_sha256.in_(list(shas)))
+            .distinct()
+            .all()
+        )
+        return {name for sha, name in shas.items() if sha not in known}
+
+    def _flush(self, batch: List[Tuple[str, str, int, str]], stats: Dict) -> None:
+        """batch 元素为 (对象键, 版本, 字节数, 类别)"""
+        if not batch:
+            return
+        # remove_objects 惰性执行，遍历返回的错误才会真正发出请求
+        errors = {
+            (e.name, e.version_id)
+            for e in self.storage.client.remove_objects(
+                self.storage.bucket_name,
+                [DeleteObject(name, version_id) for name, version_id, _, _ in batch],
+            )
+        }
+        for name, version_id, size, kind in batch:
+            if (name, version_id) in errors:
+                stats["errors"] += 1
+                continue
+            stats["deleted"] += 1
+            stats["reclaimed_bytes"] += size
+            MEDIA_GC_DELETED_OBJECTS.labels(kind=kind).inc()
+            MEDIA_GC_RECLAIMED_BYTES.inc(size)
+        batch.clear()
+        if self.batch_interval > 0:
+            time.sleep(self.batch_interval)
+
+    def sweep_objects(self, db: Session, cutoff: datetime, prefix: str) -> Dict:
+        stats = {"deleted": 0, "reclaimed_bytes": 0, "errors": 0}
+        cutoff_utc = cutoff.replace(tzinfo=timezone.utc)
+        batch: List[Tuple[str, str, int, str]] = []
+        page: List = []
+
+        def process(entries: List) -> None:
+            latest = [
+                o for o in entries if o.is_latest != "false" and not o.is_delete_marker
+            ]
+            orphans = (
+                self._orphan_blob_keys(db, latest)
+                if prefix == _BLOB_PREFIX
+                else self._orphan_media_keys(db, latest)
+            )
+            for obj in entries:
+                if obj.last_modified is None or obj.last_modified >= cutoff_utc:
+                    continue
+                if obj.is_delete_marker:
+                    kind = "delete_marker"
+                elif obj.is_latest == "false":
+                    kind = "noncurrent"
+                elif obj.object_name in orphans:
+                    kind = "orphan"
+                else:
+                    continue
+                batch.append((obj.object_name, obj.version_id, obj.size or 0, kind))
+                if len(batch) >= self.batch_size:
+                    self._flush(batch, stats)
+
+        for obj in self.storage.client.list_objects(
+            self.storage.bucket_name,
+            prefix=prefix,
+            recursive=True,
+            include_version=True,
+        ):
+            page.append(obj)
+            if len(page) >= self.batch_size:
+                process(page)
+                page = []
+        process(page)
+        self._flush(batch, stats)
+        return stats
+
+    def run_once(self) -> Dict:
+        """执行一轮回收（同步，在线程中运行）"""
+        from ..core.database import SessionLocal
+
+        started = time.time()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.grace_seconds)
+        db = SessionLocal()
+        try:
+            rows = self.sweep_rows(db, cutoff)
+            stats = {"rows": rows, "deleted": 0, "reclaimed_bytes": 0, "errors": 0}
+            for prefix in (_MEDIA_PREFIX, _BLOB_PREFIX):
+                for key, value in self.sweep_objects(db, cutoff, prefix).items():
+                    stats[key] += value
+        finally:
+            db.close()
+        stats["seconds"] = round(time.time() - started, 3)
+        return stats
+
+    # --- 后台任务 ---
+
+    async def _acquire_lock(self, token: str) -> bool:
+        """多实例部署时同一时间（及同一间隔内）只有一个实例执行回收"""
+        from ..core.seq import _redis_client
+
+        if _redis_client is None:
+            return True
+        try:
+            return bool(
+                await _redis_client.set(
+                    _LOCK_KEY,
+                    token,
+                    nx=True,
+                    ex=max(self.interval, _LOCK_LEASE_SECONDS),
+                )
+            )
+        except Exception:
+            return True
+
+    async def _renew_lock(self, token: str) -> None:
+        """回收执行期间定期续期，防止耗时超过锁过期时间后其他实例并发执行"""
+        from ..core.seq import _redis_client
+
+        if _redis_client is None:
+            return
+        renew = _redis_client.register_script(_RENEW_LUA)
+        while True:
+            await asyncio.sleep(_LOCK_LEASE_SECONDS / 3)
+            try:
+                if not await renew(keys=[_LOCK_KEY], args=[token, _LOCK_LEASE_SECONDS]):
+                    logger.warning("Media GC lock lost during run")
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Media GC lock renewal failed: {e}")
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                token = uuid.uuid4().hex
+                if not await self._acquire_lock(token):
+                    continue
+                renewer = asyncio.create_task(self._renew_lock(token))
+                try:
+                    stats = await asyncio.to_thread(self.run_once)
+                finally:
+                    renewer.cancel()
+                logger.info(f"Media GC finished: {stats}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Media GC failed: {e}")
+
+    def start(self) -> None:
+        if not settings.MEDIA_GC_ENABLED or not self.storage.enabled:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+
+
+# 全局媒体回收实例
+media_gc = MediaGarbageCollector()
@@ -0,0 +1,276 @@
+"""
+媒体后处理流水线
+upload_complete 校验通过后提交任务，在独立进程池中：
+- 从对象存储流式下载到临时文件
+- mutagen 解析时长、码率、声道、采样率
+- NumPy 向量化计算降采样波形（峰值，uint8，Base64 编码）
+结果写回 media_objects 并在会话频道发布 media.processed 事件；
+CPU 密集的解析与波形计算不会占用 API 进程
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from ..core.config import settings
+
+try:
+    import numpy as np  # type: ignore
+
+    NUMPY_AVAILABLE = True
+except Exception:  # pragma: no cover
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg 解码输出的单声道 PCM 采样率（波形只需要低采样率）
+_DECODE_SAMPLE_RATE = 8000
+_WAV_READ_FRAMES = 64 * 1024
+
+_worker_client = None
+
+
+def _get_worker_client():
+    """工作进程内的对象存储客户端（每个进程创建一次）"""
+    global _worker_client
+    if _worker_client is None:
+        from minio import Minio
+
+        _worker_client = Minio(
+            settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=settings.MINIO_SECURE,
+            region=settings.MINIO_REGION or None,
+        )
+    return _worker_client
+
+
+def _read_audio_info(path: str) -> Dict[str, Any]:
+    from mutagen import File as MutagenFile
+
+    audio_file = MutagenFile(path)
+    if audio_file is None or audio_file.info is None:
+        return {}
+    info = audio_file.info
+    length = getattr(info, "length", None)
+    return {
+        "duration_ms": int(length * 1000) if length else None,
+        "bitrate": getattr(info, "bitrate", None) or None,
+        "channels": getattr(info, "channels", None),
+        "sample_rate": getattr(info, "sample_rate", None),
+    }
+
+
+def _bucket_peaks(samples, points: int):
+    """将一维采样按桶取绝对值峰值，返回长度为 points 的数组"""
+    n = samples.shape[0]
+    if n == 0:
+        return np.zeros(points, dtype=np.float32)
+    edges = np.linspace(0, n, points + 1).astype(np.int64)
+    starts = np.minimum(edges[:-1], n - 1)
+    peaks = np.maximum.reduceat(np.abs(samples), starts).astype(np.float32)
+    # 采样数少于点数时相邻桶起点相同，reduceat 结果仍有效
+    return peaks
+
+
+def _wav_peaks(path: str, points: int):
+    """分块读取 WAV，逐块归约到桶峰值，内存占用与文件大小无关"""
+    with wave.open(path, "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        total = wav.getnframes()
+        if width not in (1, 2, 4) or total == 0:
+            return None
+        dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+        full_scale = float(2 ** (8 * width - 1))
+        edges = np.linspace(0, total, points + 1).astype(np.int64)
+        peaks = np.zeros(points, dtype=np.float32)
+        offset = 0
+        while offset < total:
+            raw = wav.readframes(_WAV_READ_FRAMES)
+            if not raw:
+                break
+            block = np.frombuffer(raw, dtype=dtype).reshape(-1, channels)
+            if width == 1:
+                block = block.astype(np.int16) - 128
+            mono = np.abs(block.astype(np.int64)).max(axis=1)
+            idx = np.searchsorted(edges, np.arange(offset, offset + len(mono)), "right")
+            idx = np.clip(idx - 1, 0, points - 1)
+            np.maximum.at(peaks, idx, mono.astype(np.float32))
+            offset += len(mono)
+        return peaks / full_scale
+
+
+def _ffmpeg_peaks(path: str, points: int):
+    """非 WAV 格式通过 ffmpeg 解码为 8kHz 单声道 PCM 后计算"""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    proc = subprocess.run(
+        [
+            ffmpeg,
+            "-v",
+            "error",
+            "-i",
+            path,
+            "-ac",
+            "1",
+            "-ar",
+            str(_DECODE_SAMPLE_RATE),
+            "-f",
+            "s16le",
+            "-",
+        ],
+        capture_output=True,
+        timeout=settings.MEDIA_PROCESSING_TIMEOUT_SECONDS,
+    )
+    if proc.returncode != 0:
+        return None
+    samples = np.frombuffer(proc.stdout, dtype=np.int16).astype(np.int32)
+    return _bucket_peaks(samples, points) / 32768.0
+
+
+def compute_waveform(path: str, points: int) -> Optional[str]:
+    """返回 Base64 编码的 uint8 峰值序列"""
+    if not NUMPY_AVAILABLE:
+        return None
+    try:
+        peaks = _wav_peaks(path, points)
+    except (wave.Error, EOFError):
+        peaks = None
+    if peaks is None:
+        peaks = _ffmpeg_peaks(path, points)
+    if peaks is None:
+        return None
+    scaled = np.clip(np.rint(peaks * 255), 0, 255).astype(np.uint8)
+    return base64.b64encode(scaled.tobytes()).decode("ascii")
+
+
+def process_media_object(bucket: str, object_key: str, points: int) -> Dict[str, Any]:
+    """进程池任务：下载对象并提取音频信息与波形"""
+    fd, path = tempfile.mkstemp(prefix="aiim-media-")
+    os.close(fd)
+    try:
+        # fget_object 分块写入临时文件，不会整体载入内存
+        _get_worker_client().fget_object(bucket, object_key, path)
+        result = _read_audio_info(path)
+        result["waveform_data"] = compute_waveform(path, points)
+        return result
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class MediaProcessor:
+    """管理进程池与后处理任务"""
+
+    def __init__(self, max_workers: int = settings.MEDIA_PROCESSING_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn 避免 fork 带有事件循环与线程池的 API 进程
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def submit(
+        self, media_id: str, conversation_id: str, object_key: str, content_type: str
+    ) -> Optional[asyncio.Task]:
+        """提交后处理任务（仅音频），立即返回"""
+        if not settings.MEDIA_PROCESSING_ENABLED or not content_type.startswith(
+            "audio/"
+        ):
+            return None
+        task = asyncio.create_task(self._process(media_id, conversation_id, object_key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _process(
+        self, media_id: str, conversation_id: str, object_key: str
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            result = await asyncio.wait_for(
+                loop.run_in_executor(
+                    self._get_pool(),
+                    process_media_object,
+                    settings.MINIO_BUCKET_NAME,
+                    object_key,
+                    settings.MEDIA_WAVEFORM_POINTS,
+                ),
+                settings.MEDIA_PROCESSING_TIMEOUT_SECONDS,
+            )
+        except Exception as e:
+            logger.warning(f"Media processing failed: media_id={media_id}, error={e}")
+            return
+        await self._finish(media_id, conversation_id, result)
+
+    async def _finish(
+        self, media_id: str, conversation_id: str, result: Dict[str, Any]
+    ) -> None:
+        from ..core.database import SessionLocal
+        from ..core.events import publish_event
+        from ..models import im as im_model
+
+        db = SessionLocal()
+        try:
+            media = db.get(im_model.MediaObject, media_id)
+            if media is None:
+                return
+            if result.get("duration_ms") is not None:
+                media.duration_ms = result["duration_ms"]
+            if result.get("waveform_data"):
+                media.waveform_data = result["waveform_data"]
+            media.bitrate = result.get("bitrate")
+            media.processed_at = datetime.utcnow()
+            db.commit()
+            payload = {
+                "event": "media.processed",
+                "conversation_id": conversation_id,
+                "media": {
+                    "media_id": media_id,
+                    "duration_ms": media.duration_ms,
+                    "bitrate": media.bitrate,
+                    "channels": result.get("channels"),
+                    "sample_rate": result.get("sample_rate"),
+                    "waveform_data": media.waveform_data,
+                },
+            }
+        finally:
+            db.close()
+        try:
+            await publish_event(f"im:conv:{conversation_id}", payload)
+        except Exception as e:
+            logger.warning(f"Failed to publish media.processed: {e}")
+
+    def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# 全局媒体后处理实例
+media_processor = MediaProcessor()
@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models import im as im_model
+
+
+def create_pending_media(
+    db: Session,
+    media_id: str,
+    conversation_id: str,
+    uploader_id: str,
+    object_key: str,
+    filename: str,
+    content_type: str,
+    file_size: int,
+    file_hash: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    upload_expires_at: Optional[datetime] = None,
+    upload_id: Optional[str] = None,
+    part_size: Optional[int] = None,
+) -> im_model.MediaObject:
+    """签发上传令牌（或创建分段上传）时登记媒体对象"""
+    media = im_model.MediaObject(
+        media_id=media_id,
+        conversation_id=conversation_id,
+        uploader_id=uploader_id,
+        object_key=object_key,
+        filename=filename,
+        content_type=content_type,
+        file_size=file_size,
+        sha256=file_hash.lower() if file_hash else None,
+        status="pending",
+        tenant_id=tenant_id,
+        upload_expires_at=upload_expires_at,
+        upload_id=upload_id,
+        part_size=part_size,
+    )
+    db.add(media)
+    db.commit()
+    return media
+
+
+def get_media(
+    db: Session, media_id: str, conversation_id: Optional[str] = None
+) -> Optional[im_model.MediaObject]:
+    media = db.get(im_model.MediaObject, media_id)
+    if media is None:
+        return None
+    if conversation_id is not None and media.conversation_id != conversation_id:
+        return None
+    return media
+
+
+def get_ready_media(
+    db: Session, media_id: str, conversation_id: str
+) -> Optional[im_model.MediaObject]:
+    media = get_media(db, media_id, conversation_id)
+    if media is None or media.status != "ready":
+        return None
+    return media
+
+
+def get_ready_media_bulk(
+    db: Session, conversation_id: str, media_ids: List[str]
+) -> Dict[str, im_model.MediaObject]:
+    """一次查询批量获取会话内已就绪的媒体对象"""
+    if not media_ids:
+        return {}
+    rows = (
+        db.query(im_model.MediaObject)
+        .filter(
+            im_model.MediaObject.media_id.in_(media_ids),
+            im_model.MediaObject.conversation_id == conversation_id,
+            im_model.MediaObject.status == "ready",
+        )
+        .all()
+    )
+    return {row.media_id: row for row in rows}
+
+
+def complete_media(
+    db: Session,
+    media: im_model.MediaObject,
+    file_hash: str,
+    file_size: int,
+    duration_ms: Optional[int] = None,
+    waveform_data: Optional[str] = None,
+) -> im_model.MediaObject:
+    """上传完成并通过校验后记录最终元数据"""
+    media.sha256 = file_hash.lower()
+    media.file_size = file_size
+    media.status = "ready"
+    media.completed_at = datetime.utcnow()
+    media.upload_id = None
+    if duration_ms is not None:
+        media.duration_ms = duration_ms
+    if waveform_data is not None:
+        media.waveform_data = waveform_data
+    db.commit()
+    return media
+
+
+def check_multipart_parts(
+    media: im_model.MediaObject,
+    uploaded: List[Dict[str, Any]],
+    client_md5: Dict[int, str],
+) -> Optional[str]:
+    """
+    校验已上传分段：编号连续、与客户端声明一致，每段 ETag 等于客户端计算的 MD5，
+    总大小等于登记大小；通过返回 None，否则返回错误说明
+    """
+    numbers = [p["part_number"] for p in uploaded]
+    if numbers != list(range(1, len(numbers) + 1)):
+        return f"Uploaded parts are not contiguous: {numbers}"
+    if set(numbers) != set(client_md5):
+        missing = sorted(set(client_md5) - set(numbers))
+        extra = sorted(set(numbers) - set(client_md5))
+        return f"Part list mismatch: missing {missing}, unexpected {extra}"
+    mismatched = [
+        p["part_number"]
+        for p in uploaded
+        if p["etag"].lower() != client_md5[p["part_number"]].lower()
+    ]
+    if mismatched:
+        return f"Part checksum mismatch: {mismatched}"
+    total = sum(p["size"] or 0 for p in uploaded)
+    if total != media.file_size:
+        return f"Size mismatch: expected {media.file_size}, got {total}"
+    return None
+
+
+def mark_referenced(
+    db: Session, media_id: str, conversation_id: str, message_id: str
+) -> None:
+    """记录首条引用媒体的消息（由调用方提交事务）"""
+    db.query(im_model.MediaObject).filter(
+        im_model.MediaObject.media_id == media_id,
+        im_model.MediaObject.conversation_id == conversation_id,
+        im_model.MediaObject.message_id.is_(None),
+    ).update({im_model.MediaObject.message_id: message_id}, synchronize_session=False)
+
+
+def delete_media(db: Session, media: im_model.MediaObject) -> None:
+    db.delete(media)
+    db.commit()
+
+
+def can_delete_media(db: Session, media: im_model.MediaObject, user_id: str) -> bool:
+    """上传者或会话 owner 可删除"""
+    if media.uploader_id == user_id:
+        return True
+    owner = (
+        db.query(im_model.ConversationMember.id)
+        .filter(
+            im_model.ConversationMember.conversation_id == media.conversation_id,
+            im_model.ConversationMember.user_id == user_id,
+            im_model.ConversationMember.role == "owner",
+        )
+        .first()
+    )
+    return owner is not None
+
+
+def get_blob(db: Session, sha256: str) -> Optional[im_model.MediaBlob]:
+    return db.get(im_model.MediaBlob, sha256.lower())
+
+
+def get_visible_blob(
+    db: Session, sha256: str, user_id: str, tenant_id: Optional[str]
+) -> Optional[im_model.MediaBlob]:
+    """
+    调用者可见的共享对象：仅当该内容已被调用者所在会话（同一租户）中
+    就绪的媒体引用时返回；哈希本身不能证明持有内容，范围外一律视为不存在
+    """
+    sha256 = sha256.lower()
+    tenant_filter = (
+        im_model.MediaObject.tenant_id == tenant_id
+        if tenant_id is not None
+        else im_model.MediaObject.tenant_id.is_(None)
+    )
+    visible = (
+        db.query(im_model.MediaObject.media_id)
+        .join(
+            im_model.ConversationMember,
+            im_model.ConversationMember.conversation_id
+            == im_model.MediaObject.conversation_id,
+        )
+        .filter(
+            im_model.MediaObject.blob_sha256 == sha256,
+            im_model.MediaObject.status == "ready",
+            im_model.ConversationMember.user_id == user_id,
+            tenant_filter,
+        )
+        .first()
+    )
+    if visible is None:
+        return None
+    return get_blob(db, sha256)
+
+
+def create_blob(
+    db: Session, sha256: str, object_key: str, size: int, content_type: str
+) -> im_model.MediaBlob:
+    """登记共享对象（初始无引用）；并发创建时返回已存在的记录"""
+    sha256 = sha256.lower()
+    blob = im_model.MediaBlob(
+        sha256=sha256,
+        object_key=object_key,
+        size=size,
+        content_type=content_type,
+        ref_count=0,
+    )
+    db.add(blob)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        blob = db.get(im_model.MediaBlob, sha256)
+    return blob
+
+
+def _copy_processed_fields(db: Session, media: im_model.MediaObject) -> None:
+    """同一内容已有后处理结果时直接复用"""
+    if media.processed_at is not None:
+        return
+    processed = (
+        db.query(im_model.MediaObject)
+        .filter(
+            im_model.MediaObject.blob_sha256 == media.blob_sha256,
+            im_model.MediaObject.processed_at.isnot(None),
+        )
+        .first()
+    )
+    if processed is None:
+        return
+    media.duration_ms = media.duration_ms or processed.duration_ms
+    media.waveform_data = media.waveform_data or processed.waveform_data
+    media.bitrate = processed.bitrate
+    media.processed_at = processed.processed_at
+
+
+def attach_blob(
+    db: Session, media: im_model.MediaObject, blob: im_model.MediaBlob
+) -> bool:
+    """
+    让媒体对象引用共享对象并增加引用计数
+    共享对象已被并发释放（记录已删除）时返回 False，媒体对象保持不变
+    """
+    updated = (
+        db.query(im_model.MediaBlob)
+        .filter(im_model.MediaBlob.sha256 == blob.sha256)
+        .update(
+            {im_model.MediaBlob.ref_count: im_model.MediaBlob.ref_count + 1},
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        db.rollback()
+        return False
+    media.blob_sha256 = blob.sha256
+    media.object_key = blob.object_key
+    _copy_processed_fields(db, media)
+    db.commit()
+    return True
+
+
+def attach_media_from_blob(
+    db: Session,
+    media_id: str,
+    conversation_id: str,
+    uploader_id: str,
+    filename: str,
+    blob: im_model.MediaBlob,
+    tenant_id: Optional[str] = None,
+) -> Optional[im_model.MediaObject]:
+    """按哈希引用已存储的内容，直接创建就绪的媒体对象（无需上传）"""
+    now = datetime.utcnow()
+    media = im_model.MediaObject(
+        media_id=media_id,
+        conversation_id=conversation_id,
+        uploader_id=uploader_id,
+        object_key=blob.object_key,
+        filename=filename,
+        content_type=blob.content_type,
+        file_size=blob.size,
+        sha256=blob.sha256,
+        status="ready",
+        tenant_id=tenant_id,
+        completed_at=now,
+    )
+    db.add(media)
+    if not attach_blob(db, media, blob):
+        return None
+    return media
+
+
+def release_blob(db: Session, media: im_model.MediaObject) -> Optional[str]:
+    """
+    删除引用共享对象的媒体记录并减少引用计数
+    最后一个引用删除时同时删除共享对象记录，返回需要从存储中移除的对象键
+    """
+    sha256 = media.blob_sha256
+    db.delete(media)
+    db.query(im_model.MediaBlob).filter(im_model.MediaBlob.sha256 == sha256).update(
+        {im_model.MediaBlob.ref_count: im_model.MediaBlob.ref_count - 1},
+        synchronize_session=False,
+    )
+    blob = db.get(im_model.MediaBlob, sha256)
+    object_key = blob.object_key if blob is not None else None
+    # 条件删除：期间若有新的引用（ref_count 回升）则保留
+    removed = (
+        db.query(im_model.MediaBlob)
+        .filter(
+            im_model.MediaBlob.sha256 == sha256,
+            im_model.MediaBlob.ref_count <= 0,
+        )
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return object_key if removed else None
+
+
+def media_metadata(media: im_model.MediaObject) -> Dict[str, Any]:
+    """与对象存储 get_file_metadata 结构一致的元数据"""
+    return {
+        "media_id": media.media_id,
+        "size": media.file_size,
+        "content_type": media.content_type,
+        "last_modified": (
+            (media.completed_at or media.created_at).isoformat()
+            if (media.completed_at or media.created_at)
+            else None
+        ),
+        "sha256": media.sha256,
+        "duration_ms": media.duration_ms,
+        "bitrate": media.bitrate,
+        "waveform_data": media.waveform_data,
+        "uploader_id": media.uploader_id,
+        "metadata": {"original_filename": media.filename},
+    }
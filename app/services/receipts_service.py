@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 
 from ..models import im as im_model
-from ..core.pubsub import pubsub
+from ..core.events import publish_event_async
 
 
 class ReceiptReadRequestBody(BaseModel):
@@ -119,9 +119,7 @@ def mark_read(db: Session, req: ReceiptReadRequestBody) -> None:
                 member.last_read_seq if anchor and anchor.seq is not None else None
             ),
         }
-        import asyncio
-
-        asyncio.create_task(pubsub.publish(f"im:conv:{req.conversation_id}", payload))
+        publish_event_async(f"im:conv:{req.conversation_id}", payload)
     except Exception:
         pass
 
@@ -167,9 +165,7 @@ def mark_delivered(
             "seq": msg.seq,
             "user_id": user_id,
         }
-        import asyncio
-
-        asyncio.create_task(pubsub.publish(f"im:conv:{conversation_id}", payload))
+        publish_event_async(f"im:conv:{conversation_id}", payload)
     except Exception:
         pass
 
@@ -0,0 +1,211 @@
+"""
+HTTP 中间件开销基准
+在同一个最小 FastAPI 应用上对比：
+- bare:   不加中间件
+- legacy: 原先的四层 BaseHTTPMiddleware（安全头、性能监控、限流、指标）
+- fused:  单层纯 ASGI 的 GatewayMiddleware
+直接以 ASGI 调用驱动（不经网络），输出每个请求的平均/p99 耗时、相对 bare 的中间件开销，
+以及按目标 RPS 折算的中间件 CPU 占用（单核百分比）
+
+用法: python benchmarks/bench_middleware.py [--requests 5000] [--rps 500]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request, Response  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from app.core.middleware import GatewayMiddleware  # noqa: E402
+from app.core.monitoring import MetricsCollector, performance_monitor  # noqa: E402
+from app.core.ratelimit import RateLimiter, is_exempt  # noqa: E402
+
+TOKEN = "Bearer not-a-valid-jwt"
+
+
+# --- 原先的四层实现（仅用作基线） ---
+
+
+class LegacySecurityHeaders(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "1; mode=block"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        if request.url.scheme == "https":
+            response.headers["Strict-Transport-Security"] = (
+                "max-age=31536000; includeSubDomains"
+            )
+        return response
+
+
+class LegacyRateLimit(BaseHTTPMiddleware):
+    def __init__(self, app, limiter: RateLimiter):
+        super().__init__(app)
+        self.limiter = limiter
+
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        if is_exempt(path):
+            return await call_next(request)
+        key = self.limiter.identify(
+            request.headers.get("authorization"),
+            request.client.host if request.client else "unknown",
+        )
+        allowed, retry_after = await self.limiter.acquire(
+            key, self.limiter.route_cost(request.method, path)
+        )
+        if not allowed:
+            return Response(
+                status_code=429,
+                content="rate limit exceeded",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+        return await call_next(request)
+
+
+def build_app(stack: str, limiter: RateLimiter) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/aiim/ping")
+    async def ping():
+        return {"ok": True}
+
+    if stack == "legacy":
+        app.add_middleware(LegacySecurityHeaders)
+
+        @app.middleware("http")
+        async def performance_middleware(request: Request, call_next):
+            start = time.time()
+            response = await call_next(request)
+            process_time = time.time() - start
+            MetricsCollector.record_request(
+                request.method, request.url.path, process_time, response.status_code
+            )
+            performance_monitor.record_request_time(process_time)
+            response.headers["X-Process-Time"] = str(process_time)
+            return response
+
+        app.add_middleware(LegacyRateLimit, limiter=limiter)
+
+        @app.middleware("http")
+        async def metrics_middleware(request: Request, call_next):
+            start = time.time()
+            response = None
+            try:
+                response = await call_next(request)
+                return response
+            finally:
+                MetricsCollector.record_request(
+                    request.method,
+                    request.url.path,
+                    time.time() - start,
+                    getattr(response, "status_code", 500),
+                )
+
+    elif stack == "fused":
+        app.add_middleware(GatewayMiddleware, limiter=limiter)
+    return app
+
+
+async def call(app, scope: dict) -> int:
+    status = 0
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # 模拟连接保持，直到中间件取消等待
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def make_scope() -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/aiim/ping",
+        "raw_path": b"/api/aiim/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"bench"),
+            (b"authorization", TOKEN.encode()),
+            (b"accept", b"application/json"),
+        ],
+        "client": ("10.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+
+
+async def run_stack(stack: str, requests: int) -> list[float]:
+    limiter = RateLimiter(rate=1e9, burst=10**9, redis_url=None)
+    app = build_app(stack, limiter)
+    for _ in range(200):  # 预热
+        await call(app, make_scope())
+    samples = []
+    for _ in range(requests):
+        scope = make_scope()
+        start = time.perf_counter()
+        status = await call(app, scope)
+        samples.append(time.perf_counter() - start)
+        assert status == 200, status
+    return samples
+
+
+def summarize(samples: list[float]) -> tuple[float, float]:
+    ordered = sorted(samples)
+    mean = sum(ordered) / len(ordered)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return mean * 1e6, p99 * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rps", type=int, default=500, help="单实例常规请求速率")
+    args = parser.parse_args()
+
+    results = {}
+    for stack in ("bare", "legacy", "fused"):
+        results[stack] = summarize(asyncio.run(run_stack(stack, args.requests)))
+
+    bare_mean = results["bare"][0]
+    print(f"requests={args.requests}  target_rps={args.rps}")
+    print(
+        f"{'stack':<8}{'mean_us':>10}{'p99_us':>10}{'overhead_us':>13}"
+        f"{'cpu@rps':>10}"
+    )
+    for stack, (mean, p99) in results.items():
+        overhead = mean - bare_mean
+        cpu = overhead * args.rps / 1e6 * 100
+        print(f"{stack:<8}{mean:>10.1f}{p99:>10.1f}{overhead:>13.1f}{cpu:>9.2f}%")
+    legacy = results["legacy"][0] - bare_mean
+    fused = results["fused"][0] - bare_mean
+    if fused > 0:
+        print(f"middleware overhead reduced {legacy / fused:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+序列化开销基准
+在一个最小 FastAPI 应用上对比标准库 JSONResponse 与 FastJSONResponse，
+输出每个请求的总耗时、其中序列化(render)耗时以及序列化占比；
+同时对比 pubsub 事件的 dumps/loads 往返耗时
+
+用法: python benchmarks/bench_serialization.py [--requests 500] [--messages 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core import serialization  # noqa: E402
+from app.models import im as im_model  # noqa: E402
+
+
+def build_messages(n: int) -> list[dict]:
+    return [
+        {
+            "message_id": str(uuid.uuid4()),
+            "sender_id": f"user_{i % 7}",
+            "type": "text",
+            "content": f"第{i}条消息 with some ascii text to make it realistic",
+            "created_at": datetime.utcnow(),
+            "seq": i,
+            "reply_to": None,
+        }
+        for i in range(n)
+    ]
+
+
+def build_app(messages: list[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get(
+        "/stdlib",
+        response_model=im_model.MessageListResponse,
+        response_class=JSONResponse,
+    )
+    def stdlib_route():
+        return {"conversation_id": "bench", "messages": messages}
+
+    @app.get(
+        "/fast",
+        response_model=im_model.MessageListResponse,
+        response_class=serialization.FastJSONResponse,
+    )
+    def fast_route():
+        return {"conversation_id": "bench", "messages": messages}
+
+    return app
+
+
+def time_requests(client: TestClient, path: str, n: int) -> float:
+    client.get(path)  # warmup
+    start = time.perf_counter()
+    for _ in range(n):
+        client.get(path)
+    return (time.perf_counter() - start) / n
+
+
+def time_render(response_cls, content, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        response_cls(content)
+    return (time.perf_counter() - start) / n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+
+    messages = build_messages(args.messages)
+    client = TestClient(build_app(messages))
+    # render 阶段拿到的是 jsonable_encoder 之后的内容
+    encoded = client.get("/stdlib").json()
+
+    print(f"serialization backend: {serialization.BACKEND}")
+    print(f"{'response':<18}{'request us':>12}{'render us':>12}{'share':>9}")
+    for name, path, cls in (
+        ("JSONResponse", "/stdlib", JSONResponse),
+        ("FastJSONResponse", "/fast", serialization.FastJSONResponse),
+    ):
+        per_request = time_requests(client, path, args.requests)
+        per_render = time_render(cls, encoded, args.requests)
+        print(
+            f"{name:<18}{per_request * 1e6:>12.1f}{per_render * 1e6:>12.1f}"
+            f"{per_render / per_request:>9.1%}"
+        )
+
+    event = {
+        "event": "message.created",
+        "conversation_id": str(uuid.uuid4()),
+        "message": {**messages[0], "created_at": messages[0]["created_at"].isoformat()},
+    }
+    n = args.requests * 20
+    start = time.perf_counter()
+    for _ in range(n):
+        json.loads(json.dumps(event))
+    stdlib_rt = (time.perf_counter() - start) / n
+    start = time.perf_counter()
+    for _ in range(n):
+        serialization.loads(serialization.dumps(event))
+    fast_rt = (time.perf_counter() - start) / n
+    print(
+        f"\npubsub event round trip: stdlib {stdlib_rt * 1e6:.2f} us, "
+        f"{serialization.BACKEND} {fast_rt * 1e6:.2f} us"
+    )
+
+
+if __name__ == "__main__":
+    main()
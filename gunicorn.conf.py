@@ -0,0 +1,34 @@
+"""
+gunicorn 配置
+多 worker 时 Prometheus 指标写入 PROMETHEUS_MULTIPROC_DIR（每个 worker 一组 mmap 文件），
+/metrics 汇总所有 worker：主进程启动时清空上次运行留下的文件，
+worker 退出（含 --max-requests 轮换）时移除其存活类 Gauge 与性能统计文件
+"""
+
+import os
+import shutil
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/aiim_prometheus")
+
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+    # PerformanceMonitor 写出的 perf_{pid}.json，不移除会一直计入合并统计
+    try:
+        os.remove(
+            os.path.join(
+                os.environ["PROMETHEUS_MULTIPROC_DIR"], f"perf_{worker.pid}.json"
+            )
+        )
+    except OSError:
+        pass
@@ -1,20 +1,24 @@
-import time
 import logging
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import PlainTextResponse
-from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from app.core.config import settings
 from app.core.database import engine
-from app.core.metrics import add_metrics_middleware
-from app.core.ratelimit import RateLimitMiddleware
+from app.core.middleware import GatewayMiddleware
 from app.core.pubsub import pubsub
+from app.core.media_storage import async_media_storage
+from app.core.media_cache import media_url_cache
+from app.services.media_processing import media_processor
+from app.services.media_gc import media_gc
+from app.services.call_state import call_state_store
+from app.services.call_sweeper import call_sweeper
+from app.core.serialization import FastJSONResponse
 from app.models.base import Base
-from app.core.security import SecurityHeaders
 from app.core.monitoring import (
-    HealthChecker,
     MetricsCollector,
+    health_sampler,
     performance_monitor,
     LoggingConfig,
 )
@@ -40,16 +44,11 @@ app = FastAPI(
     description="企业级即时通讯系统，支持音视频通话",
     docs_url="/docs" if getattr(settings, "LOG_LEVEL", "INFO") == "DEBUG" else None,
     redoc_url="/redoc" if getattr(settings, "LOG_LEVEL", "INFO") == "DEBUG" else None,
+    default_response_class=FastJSONResponse,
 )
 
-# 中间件顺序很重要！
-# 1. 安全头中间件
-try:
-    app.add_middleware(SecurityHeaders)
-except Exception as e:
-    logger.warning(f"Failed to add security middleware: {e}")
-
-# 2. CORS中间件
+# 中间件顺序很重要！（后添加的在外层）
+# 1. CORS中间件
 if getattr(settings, "ENABLE_CORS", False):
     origins = [
         origin.strip()
@@ -63,52 +62,16 @@ if getattr(settings, "ENABLE_CORS", False):
         allow_headers=["Authorization", "Content-Type", "X-API-Key"],
     )
 
-
-# 3. 性能监控中间件
-@app.middleware("http")
-async def performance_middleware(request: Request, call_next):
-    start_time = time.time()
-
-    try:
-        # 处理请求
-        response = await call_next(request)
-
-        # 计算响应时间
-        process_time = time.time() - start_time
-
-        # 记录指标
-        try:
-            MetricsCollector.record_request(request, process_time, response.status_code)
-            performance_monitor.record_request_time(process_time)
-        except Exception:
-            pass  # 不让监控失败影响正常请求
-
-        # 添加响应头
-        response.headers["X-Process-Time"] = str(process_time)
-
-        return response
-    except Exception as e:
-        process_time = time.time() - start_time
-        logger.error(f"Request failed: {e}")
-        try:
-            performance_monitor.record_error(type(e).__name__)
-        except Exception:
-            pass
-        raise
-
-
-# 4. 速率限制和指标中间件
-app.add_middleware(RateLimitMiddleware)
-add_metrics_middleware(app)
+# 2. 网关中间件：限流、安全头、性能监控与指标（单层纯 ASGI）
+app.add_middleware(GatewayMiddleware)
 
 
 # 健康检查端点
 @app.get("/health")
 async def health():
-    """增强版健康检查"""
+    """增强版健康检查（后台采样快照）"""
     try:
-        health_status = await HealthChecker.comprehensive_health_check()
-        return health_status
+        return await health_sampler.get()
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         # 降级到简单检查
@@ -134,10 +97,9 @@ async def simple_health_check():
 # 准备就绪检查
 @app.get("/ready")
 async def readiness_check():
-    """准备就绪检查"""
+    """准备就绪检查（后台采样快照）"""
     try:
-        db_status = await HealthChecker.check_database()
-        if db_status["status"] != "healthy":
+        if not await health_sampler.ready():
             return Response(status_code=503, content="Database not ready")
         return {"status": "ready"}
     except Exception:
@@ -148,13 +110,9 @@ async def readiness_check():
 @app.get("/metrics")
 async def metrics():
     """Prometheus指标端点"""
-    try:
-        return PlainTextResponse(
-            MetricsCollector.get_metrics(), media_type=CONTENT_TYPE_LATEST
-        )
-    except Exception:
-        # 降级到基本指标
-        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    return PlainTextResponse(
+        MetricsCollector.get_metrics(), media_type=CONTENT_TYPE_LATEST
+    )
 
 
 # 性能统计端点 (调试用)
@@ -191,13 +149,31 @@ def root():
 
 
 # 事件处理
+@app.on_event("startup")
+async def on_startup():
+    """启动后台任务"""
+    performance_monitor.start()
+    media_url_cache.start()
+    media_gc.start()
+    call_sweeper.start()
+    health_sampler.start()
+
+
 @app.on_event("shutdown")
 async def on_shutdown():
     """优雅关闭"""
     logger.info("Shutting down AIIM service...")
     try:
+        await media_url_cache.stop()
         if hasattr(pubsub, "close"):
             await pubsub.close()  # type: ignore
+        await media_gc.stop()
+        await call_sweeper.stop()
+        await health_sampler.stop()
+        performance_monitor.stop()
+        await call_state_store.close()
+        async_media_storage.shutdown()
+        media_processor.shutdown()
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
     logger.info("AIIM service stopped.")
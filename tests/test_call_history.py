@@ -0,0 +1,62 @@
+"""通话历史：游标分页"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import im as im_model
+from app.services.call_service import CallManagementService as Calls
+
+
+def _calls(db, count, conversation_id="c1"):
+    base = datetime(2026, 1, 1, 12, 0, 0, 123456)
+    for i in range(count):
+        db.add(
+            im_model.CallLog(
+                call_id=f"call_{i:02d}",
+                conversation_id=conversation_id,
+                initiator_id="u1",
+                status="completed",
+                # 两两相同的开始时间，按 call_id 区分先后
+                start_time=base + timedelta(seconds=i // 2),
+            )
+        )
+    db.commit()
+
+
+def test_cursor_round_trip(db):
+    _calls(db, 1)
+    call = db.get(im_model.CallLog, "call_00")
+    cursor = Calls.encode_history_cursor(call)
+    assert Calls.decode_history_cursor(cursor) == (call.start_time, call.call_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "bm8gc2VwYXJhdG9y"])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        Calls.decode_history_cursor(cursor)
+
+
+def test_pages_cover_history_without_gaps_or_duplicates(db):
+    _calls(db, 7)
+    db.add(
+        im_model.CallLog(
+            call_id="call_other",
+            conversation_id="c2",
+            initiator_id="u1",
+            status="completed",
+            start_time=datetime(2026, 1, 1),
+        )
+    )
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        calls, cursor = Calls.get_call_history(db, "c1", limit=3, cursor=cursor)
+        seen.extend(c.call_id for c in calls)
+        if cursor is None:
+            break
+
+    assert seen == [f"call_{i:02d}" for i in reversed(range(7))]
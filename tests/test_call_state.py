@@ -0,0 +1,149 @@
+"""通话状态存储：状态转换与终态持久化"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services import call_state
+from app.services.call_state import SQLCallStateStore as SQLStore
+
+
+# --- 数据库存储 ---
+
+
+def test_sql_call_answered_then_completed(db):
+    call = SQLStore._create(db, "c1", "u1")
+    assert call.status == "initiated" and call.changed
+    assert call.active_participants == ["u1"]
+    # 同一会话只允许一个活跃通话
+    assert SQLStore._create(db, "c1", "u9") is None
+
+    joined = SQLStore._join(db, call.call_id, "u2")
+    assert joined.status == "answered" and joined.changed
+    assert joined.answer_time is not None
+    assert not SQLStore._join(db, call.call_id, "u2").changed
+    assert not SQLStore._set_status(db, call.call_id, "answered").changed
+    assert SQLStore._expire(db, call.call_id) is None
+
+    assert SQLStore._leave(db, call.call_id, "u1").status == "answered"
+    ended = SQLStore._leave(db, call.call_id, "u2")
+    assert ended.status == "completed" and ended.changed
+    assert ended.end_time is not None and ended.duration_sec is not None
+    assert ended.active_participants == []
+    assert SQLStore._leave(db, call.call_id, "u2") is None
+
+    # 终态不再变化，会话可以发起新的通话
+    again = SQLStore._set_status(db, call.call_id, "rejected")
+    assert again.status == "completed" and not again.changed
+    assert SQLStore._load_active(db, "c1") is None
+    assert SQLStore._create(db, "c1", "u1") is not None
+
+
+def test_sql_call_rejected_and_missed(db):
+    rejected = SQLStore._create(db, "c1", "u1")
+    first = SQLStore._set_status(db, rejected.call_id, "rejected")
+    assert first.status == "rejected" and first.changed
+    assert first.end_time is not None and first.duration_sec is None
+    assert not SQLStore._set_status(db, rejected.call_id, "rejected").changed
+
+    missed = SQLStore._create(db, "c1", "u1")
+    SQLStore._set_status(db, missed.call_id, "ringing")
+    expired = SQLStore._expire(db, missed.call_id)
+    assert expired.status == "missed" and expired.changed
+    assert SQLStore._expire(db, missed.call_id) is None
+
+
+# --- Redis 存储 ---
+
+
+@pytest.fixture
+def redis_store(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        call_state.aioredis,
+        "from_url",
+        lambda url: fakeredis.aioredis.FakeRedis(server=server),
+    )
+    return call_state.RedisCallStateStore("redis://fake")
+
+
+class FakeWriter:
+    """替换 call_logs 写入；fail 为真时模拟数据库故障"""
+
+    def __init__(self):
+        self.written = []
+        self.fail = False
+
+    def __call__(self, state):
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.written.append(state)
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = FakeWriter()
+    monkeypatch.setattr(call_state.RedisCallStateStore, "_write", staticmethod(writer))
+    return writer
+
+
+def test_redis_call_transitions_and_persist_queue(redis_store):
+    async def scenario():
+        redis = redis_store._redis
+        call = await redis_store.create("c1", "u1")
+        assert call.status == "initiated"
+        assert await redis_store.create("c1", "u9") is None
+        assert (await redis_store.get_active("c1")).call_id == call.call_id
+
+        joined = await redis_store.join(call.call_id, "u2")
+        assert joined.status == "answered" and joined.changed
+        assert not (await redis_store.join(call.call_id, "u2")).changed
+        assert await redis_store.expire_unanswered(call.call_id) is None
+        assert await redis.zscore("call:persist", call.call_id) is None
+
+        await redis_store.leave(call.call_id, "u1")
+        ended = await redis_store.leave(call.call_id, "u2")
+        assert ended.status == "completed" and ended.changed
+        assert ended.active_participants == []
+        assert await redis.zscore("call:persist", call.call_id) is not None
+        assert await redis_store.get_active("c1") is None
+
+        # 重复的拒绝不改变终态，调用方据 changed 跳过持久化与广播
+        repeat = await redis_store.set_status(call.call_id, "rejected")
+        assert repeat.status == "completed" and not repeat.changed
+
+        missed = await redis_store.create("c1", "u1")
+        expired = await redis_store.expire_unanswered(missed.call_id)
+        assert expired.status == "missed" and expired.end_time is not None
+        await redis_store.close()
+
+    asyncio.run(scenario())
+
+
+def test_failed_persist_keeps_state_until_retry(monkeypatch, redis_store, writer):
+    monkeypatch.setattr(settings, "CALL_PERSIST_RETRY_SECONDS", 0)
+
+    async def scenario():
+        redis = redis_store._redis
+        call = await redis_store.create("c1", "u1")
+        key = f"call:{call.call_id}"
+        ended = await redis_store.set_status(call.call_id, "rejected")
+
+        writer.fail = True
+        await redis_store._persist(ended)
+        # 写入失败：哈希不过期，队列项保留
+        assert await redis.ttl(key) == -1
+        assert await redis.zscore("call:persist", call.call_id) is not None
+
+        writer.fail = False
+        assert await redis_store.retry_persist(10) == 1
+        assert [s.status for s in writer.written] == ["rejected"]
+        assert 0 < await redis.ttl(key) <= settings.CALL_STATE_ENDED_TTL_SECONDS
+        assert await redis.zscore("call:persist", call.call_id) is None
+        await redis_store.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,130 @@
+"""内容寻址存储：共享对象的引用与释放"""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.api import media_api
+from app.services import media_service
+
+SHA = "ab" * 32
+
+
+class FakeStorage:
+    """记录调用的对象存储替身，verify_content_hash 返回预设结果"""
+
+    def __init__(self, hash_ok: bool):
+        self.hash_ok = hash_ok
+        self.calls = []
+
+    async def verify_content_hash(self, object_key, expected_hash):
+        self.calls.append(("verify", object_key))
+        return self.hash_ok
+
+    async def copy_object(self, source_key, dest_key):
+        self.calls.append(("copy", source_key, dest_key))
+
+    async def remove_object(self, object_key):
+        self.calls.append(("remove", object_key))
+
+    async def invalidate(self, media_id, conversation_id):
+        self.calls.append(("invalidate", media_id))
+
+
+def _ready_media(db, media_id, uploader_id="u1", sha256=SHA):
+    media = media_service.create_pending_media(
+        db,
+        media_id=media_id,
+        conversation_id="c1",
+        uploader_id=uploader_id,
+        object_key=f"conversations/c1/media/{media_id}",
+        filename=media_id,
+        content_type="audio/aac",
+        file_size=10,
+    )
+    return media_service.complete_media(db, media, file_hash=sha256, file_size=10)
+
+
+@pytest.fixture
+def blob(db):
+    """已被 m_owner 引用的共享对象"""
+    owner = _ready_media(db, "m_owner")
+    blob = media_service.create_blob(
+        db, SHA, media_api.media_storage.build_blob_key(SHA), 10, "audio/aac"
+    )
+    assert media_service.attach_blob(db, owner, blob)
+    return blob
+
+
+def _store(monkeypatch, db, media, hash_ok, **kwargs):
+    storage = FakeStorage(hash_ok)
+    monkeypatch.setattr(media_api, "async_media_storage", storage)
+    asyncio.run(media_api._store_as_blob(db, media, **kwargs))
+    return storage
+
+
+def test_attach_and_release_track_ref_count(db, blob):
+    other = _ready_media(db, "m_other")
+    assert media_service.attach_blob(db, other, blob)
+    db.refresh(blob)
+    assert blob.ref_count == 2
+    assert other.object_key == blob.object_key
+
+    assert media_service.release_blob(db, other) is None
+    db.refresh(blob)
+    assert blob.ref_count == 1
+
+    blob_key = blob.object_key
+    owner = media_service.get_media(db, "m_owner", "c1")
+    assert media_service.release_blob(db, owner) == blob_key
+    assert media_service.get_blob(db, SHA) is None
+
+
+def test_mismatched_hash_never_attaches_to_existing_blob(monkeypatch, db, blob):
+    media = _ready_media(db, "m_claim", uploader_id="u2")
+    upload_key = media.object_key
+
+    storage = _store(monkeypatch, db, media, hash_ok=False)
+
+    db.refresh(media)
+    db.refresh(blob)
+    assert media.blob_sha256 is None
+    assert media.object_key == upload_key
+    assert blob.ref_count == 1
+    assert storage.calls == [("verify", upload_key)]
+
+
+def test_mismatched_hash_never_creates_blob(monkeypatch, db):
+    media = _ready_media(db, "m_new")
+
+    storage = _store(monkeypatch, db, media, hash_ok=False)
+
+    assert media_service.get_blob(db, SHA) is None
+    assert media.blob_sha256 is None
+    assert [c[0] for c in storage.calls] == ["verify"]
+
+
+def test_confirmed_hash_attaches_and_removes_upload(monkeypatch, db, blob):
+    media = _ready_media(db, "m_dup", uploader_id="u2")
+    upload_key = media.object_key
+
+    storage = _store(monkeypatch, db, media, hash_ok=True)
+
+    db.refresh(blob)
+    assert media.blob_sha256 == SHA
+    assert media.object_key == blob.object_key
+    assert blob.ref_count == 2
+    # 缓存的URL指向上传副本，须在移除前失效
+    assert storage.calls[-2:] == [("invalidate", "m_dup"), ("remove", upload_key)]
+
+
+def test_hash_verified_skips_recomputation(monkeypatch, db):
+    media = _ready_media(db, "m_mp")
+
+    storage = _store(monkeypatch, db, media, hash_ok=False, hash_verified=True)
+
+    assert media.blob_sha256 == SHA
+    assert not any(c[0] == "verify" for c in storage.calls)
+    assert media_service.get_blob(db, SHA).ref_count == 1
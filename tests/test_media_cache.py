@@ -0,0 +1,34 @@
+"""媒体URL缓存：失效广播到其他 worker 的进程内缓存"""
+
+from __future__ import annotations
+
+import asyncio
+
+from app.core import media_cache
+from app.core.media_cache import MediaURLCache
+from app.core.pubsub import InMemoryPubSub
+
+
+def test_invalidate_clears_other_workers_local_cache(monkeypatch):
+    monkeypatch.setattr(media_cache, "pubsub", InMemoryPubSub())
+
+    async def scenario():
+        workers = [MediaURLCache(redis_client=None) for _ in range(2)]
+        for cache in workers:
+            cache.start()
+            await cache.set_download("c1", "m1", "https://old", "2026-01-01T00:00:00")
+            await cache.set_metadata("c1", "m1", {"size": 1})
+        await asyncio.sleep(0)  # 等待监听任务完成订阅
+
+        await workers[0].invalidate("c1", "m1")
+        await asyncio.sleep(0.01)
+
+        try:
+            for cache in workers:
+                assert await cache.get_download("c1", "m1") is None
+                assert await cache.get_metadata("c1", "m1") is None
+        finally:
+            for cache in workers:
+                await cache.stop()
+
+    asyncio.run(scenario())
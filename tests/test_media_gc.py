@@ -0,0 +1,121 @@
+"""孤立媒体回收：候选对象与记录的选择"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.models import im as im_model
+from app.services import media_service
+from app.services.media_gc import MediaGarbageCollector
+
+
+class FakeStorage:
+    def __init__(self):
+        self.aborted = []
+
+    def abort_multipart_upload(self, object_key, upload_id):
+        self.aborted.append(upload_id)
+        return True
+
+
+def _gc() -> MediaGarbageCollector:
+    return MediaGarbageCollector(storage=FakeStorage(), batch_interval=0)
+
+
+def _message(db, message_id, conversation_id, content):
+    db.add(
+        im_model.IMMessage(
+            message_id=message_id,
+            conversation_id=conversation_id,
+            sender_id="u1",
+            type="audio",
+            content=content,
+        )
+    )
+    db.commit()
+
+
+def _media(db, media_id, conversation_id="c1", **kwargs):
+    media = media_service.create_pending_media(
+        db,
+        media_id=media_id,
+        conversation_id=conversation_id,
+        uploader_id="u1",
+        object_key=f"conversations/{conversation_id}/media/{media_id}",
+        filename=media_id,
+        content_type="audio/aac",
+        file_size=10,
+        **kwargs,
+    )
+    media.created_at = datetime.utcnow() - timedelta(days=2)
+    db.commit()
+    return media
+
+
+def _objects(*names):
+    return [SimpleNamespace(object_name=name) for name in names]
+
+
+def test_orphan_media_keys_skip_rows_and_message_references(db):
+    _media(db, "m_row")
+    _message(db, "msg1", "c1", {"media_id": "m_legacy"})
+    _message(db, "msg2", "c2", {"media_id": "m_other_conv"})
+
+    orphans = _gc()._orphan_media_keys(
+        db,
+        _objects(
+            "conversations/c1/media/m_row",  # 有记录
+            "conversations/c1/media/m_legacy",  # 无记录，消息引用
+            "conversations/c1/media/m_other_conv",  # 引用在其他会话
+            "conversations/c1/media/m_orphan",
+            "conversations/c1/thumbs/m_orphan",  # 非媒体键
+        ),
+    )
+
+    assert orphans == {
+        "conversations/c1/media/m_other_conv",
+        "conversations/c1/media/m_orphan",
+    }
+
+
+def test_orphan_blob_keys_keep_registered_and_referenced(db):
+    sha_registered, sha_referenced, sha_orphan = "aa" * 32, "bb" * 32, "cc" * 32
+    media_service.create_blob(db, sha_registered, f"blobs/{sha_registered}", 1, "x")
+    media = _media(db, "m1")
+    media.blob_sha256 = sha_referenced
+    db.commit()
+
+    orphans = _gc()._orphan_blob_keys(
+        db,
+        _objects(
+            *(f"blobs/{sha}" for sha in (sha_registered, sha_referenced, sha_orphan))
+        ),
+    )
+
+    assert orphans == {f"blobs/{sha_orphan}"}
+
+
+def test_sweep_rows_backfills_message_references(db):
+    gc = _gc()
+    _media(db, "m_sent")
+    _media(db, "m_unsent")
+    _media(db, "m_multipart", upload_id="up1")
+    _media(db, "m_linked").message_id = "msg0"
+    db.commit()
+    _message(db, "msg1", "c1", {"media_id": "m_sent", "duration_ms": 1000})
+
+    removed = gc.sweep_rows(db, datetime.utcnow() - timedelta(days=1))
+
+    assert removed == 2
+    assert gc.storage.aborted == ["up1"]
+    remaining = {m.media_id: m.message_id for m in db.query(im_model.MediaObject)}
+    assert remaining == {"m_sent": "msg1", "m_linked": "msg0"}
+
+
+def test_sweep_rows_keeps_recent_uploads(db):
+    media = _media(db, "m_recent")
+    media.created_at = datetime.utcnow()
+    db.commit()
+
+    assert _gc().sweep_rows(db, datetime.utcnow() - timedelta(days=1)) == 0
@@ -0,0 +1,89 @@
+"""媒体内容类型校验：libmagic 检测结果与声明类型按容器族比较"""
+
+from __future__ import annotations
+
+import io
+
+from app.core.media_storage import MediaStorageService
+from app.core.security import ContentValidation
+
+
+def _ebml(element_id: bytes, payload: bytes) -> bytes:
+    return element_id + bytes([0x80 | len(payload)]) + payload
+
+
+def webm_header() -> bytes:
+    """EBML 头（DocType=webm）+ 未知长度的 Segment"""
+    body = b"".join(
+        [
+            _ebml(b"\x42\x86", b"\x01"),  # EBMLVersion
+            _ebml(b"\x42\xf7", b"\x01"),  # EBMLReadVersion
+            _ebml(b"\x42\xf2", b"\x04"),  # EBMLMaxIDLength
+            _ebml(b"\x42\xf3", b"\x08"),  # EBMLMaxSizeLength
+            _ebml(b"\x42\x82", b"webm"),  # DocType
+            _ebml(b"\x42\x87", b"\x04"),  # DocTypeVersion
+            _ebml(b"\x42\x85", b"\x02"),  # DocTypeReadVersion
+        ]
+    )
+    segment = b"\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff"
+    info = b"\x15\x49\xa9\x66\x80"
+    return b"\x1a\x45\xdf\xa3" + bytes([0x80 | len(body)]) + body + segment + info
+
+
+def adts_stream(frames: int = 50, frame_length: int = 64) -> bytes:
+    """AAC-LC 44.1kHz 双声道 ADTS 帧序列"""
+    header = bytes(
+        [
+            0xFF,
+            0xF1,
+            (1 << 6) | (4 << 2),
+            (2 << 6) | ((frame_length >> 11) & 0x3),
+            (frame_length >> 3) & 0xFF,
+            ((frame_length & 0x7) << 5) | 0x1F,
+            0xFC,
+        ]
+    )
+    return (header + b"\x00" * (frame_length - len(header))) * frames
+
+
+def test_webm_detected_as_video_is_accepted():
+    ok, detected = MediaStorageService.validate_file_content(
+        webm_header(), "audio/webm"
+    )
+    assert ok, detected
+    assert detected == "video/webm"
+
+
+def test_adts_aac_is_accepted():
+    ok, detected = MediaStorageService.validate_file_content(adts_stream(), "audio/aac")
+    assert ok, detected
+    assert detected == "audio/x-hx-aac-adts"
+
+
+def test_family_mismatch_is_rejected():
+    ok, _ = MediaStorageService.validate_file_content(webm_header(), "audio/aac")
+    assert not ok
+    ok, _ = MediaStorageService.validate_file_content(adts_stream(), "audio/webm")
+    assert not ok
+
+
+def test_non_audio_is_rejected():
+    ok, _ = MediaStorageService.validate_file_content(
+        b"%PDF-1.4\n" + b"\x00" * 64, "audio/aac"
+    )
+    assert not ok
+
+
+def test_stream_validation_accepts_webm_and_adts():
+    for data, content_type in (
+        (webm_header(), "audio/webm"),
+        (adts_stream(), "audio/aac"),
+    ):
+        result = ContentValidation.validate_media_stream(
+            io.BytesIO(data), len(data), content_type
+        )
+        assert result["valid"] and not result["issues"], result
+    result = ContentValidation.validate_media_stream(
+        io.BytesIO(adts_stream()), len(adts_stream()), "audio/aac"
+    )
+    assert result["channels"] == 2
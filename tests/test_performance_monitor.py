@@ -0,0 +1,28 @@
+"""性能监控：多进程模式下由后台线程写出统计文件"""
+
+from __future__ import annotations
+
+import os
+import time
+
+from app.core.monitoring import PerformanceMonitor
+
+
+def test_request_path_does_not_write_and_writer_thread_does(tmp_path):
+    monitor = PerformanceMonitor(multiproc_dir=str(tmp_path), dump_interval=0.05)
+    path = tmp_path / f"perf_{os.getpid()}.json"
+
+    monitor.record_request_time(0.01, "/a")
+    assert not path.exists()
+
+    monitor.start()
+    try:
+        deadline = time.time() + 2
+        while not path.exists() and time.time() < deadline:
+            time.sleep(0.01)
+        assert path.exists()
+    finally:
+        monitor.stop()
+
+    assert monitor._writer is None
+    assert "/a" in path.read_text()